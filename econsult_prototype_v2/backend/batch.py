@@ -0,0 +1,215 @@
+"""
+Offline batch analysis of consultation CSVs, without the web server
+
+    python -m backend.batch analyze input.csv --out results.parquet --workers 8
+
+Rows stream through the same CSV parsing, PII redaction and analysis code
+as /upload_csv and /analyze, in blocks, on a pool of worker processes, and
+are written in input order to CSV, JSON Lines or Parquet (needs pyarrow),
+chosen by the --out extension. Nothing touches the database.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .config import ANALYSIS_CHUNK_SIZE, ANALYSIS_CHUNK_TIMEOUT, ANALYSIS_WORKER_MEMORY_MB
+from .utils import comment_from_csv_row, redact_pii
+from .workers import AnalysisPool
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is unavailable
+    pa = None
+
+# Rows read, analyzed and written per step; bounds memory for any input size
+DEFAULT_BLOCK_SIZE = 20000
+FORMATS = ("csv", "jsonl", "parquet")
+FIELDS = [
+    "row", "comment_id", "clause", "stakeholder_type", "created_at",
+    "text", "sentiment", "score", "summary", "keywords"
+]
+
+
+class CsvWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS)
+        self._writer.writeheader()
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._writer.writerows({**row, "keywords": json.dumps(row["keywords"])} for row in rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class JsonlWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._file.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path: str):
+        if pa is None:
+            raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow")
+        self._schema = pa.schema([
+            ("row", pa.int64()),
+            ("comment_id", pa.string()),
+            ("clause", pa.string()),
+            ("stakeholder_type", pa.string()),
+            ("created_at", pa.string()),
+            ("text", pa.string()),
+            ("sentiment", pa.string()),
+            ("score", pa.float64()),
+            ("summary", pa.string()),
+            ("keywords", pa.list_(pa.string()))
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        # One row group per block
+        self._writer.write_table(pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+def output_format(path: str, fmt: Optional[str] = None) -> str:
+    """Format named explicitly or by the file extension"""
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt == "json":
+        fmt = "jsonl"
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format {fmt!r}; use one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def read_comments(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Redacted comments from CSV text, numbered by data row"""
+    for number, row in enumerate(csv.DictReader(lines)):
+        comment = comment_from_csv_row(row)
+        if comment is None:
+            continue
+        created_at = comment.get("created_at")
+        yield {
+            "row": number,
+            "comment_id": comment["comment_id"] or None,
+            "clause": comment["clause"],
+            "stakeholder_type": comment["stakeholder_type"] or None,
+            "created_at": created_at.date().isoformat() if created_at else None,
+            "text": redact_pii(comment["text"])
+        }
+
+
+def analyze_block(pool: AnalysisPool, comments: List[Dict[str, Any]], timings: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Analyze a block of comments and return output rows in input order"""
+    results: Dict[int, Dict[str, Any]] = {}
+    for rows, chunk_timings in pool.run([(i, c["text"]) for i, c in enumerate(comments)]):
+        for stage, seconds in chunk_timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+        for row in rows:
+            results[row["comment_id"]] = row
+    output = []
+    for i, comment in enumerate(comments):
+        result = results[i]
+        output.append({
+            **comment,
+            "sentiment": result["sentiment"],
+            "score": round(result["sentiment_score"], 6),
+            "summary": result["summary"],
+            "keywords": json.loads(result["keywords_json"])
+        })
+    return output
+
+
+def analyze(
+    input_path: str,
+    out_path: str,
+    workers: int,
+    fmt: Optional[str] = None,
+    chunk_size: int = ANALYSIS_CHUNK_SIZE,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    quiet: bool = False
+) -> Dict[str, Any]:
+    """Analyze a CSV file (or '-' for stdin) into out_path; returns run statistics"""
+    writer = WRITERS[output_format(out_path, fmt)](out_path)
+    pool = AnalysisPool(
+        workers=workers,
+        chunk_size=chunk_size,
+        max_in_flight=max(1, workers) * 2,
+        timeout=ANALYSIS_CHUNK_TIMEOUT,
+        memory_mb=ANALYSIS_WORKER_MEMORY_MB
+    )
+    source = sys.stdin if input_path == "-" else open(input_path, newline="", encoding="utf-8", errors="ignore")
+    timings: Dict[str, float] = {}
+    total = 0
+    started = time.perf_counter()
+    try:
+        comments = read_comments(source)
+        while True:
+            block = list(islice(comments, block_size))
+            if not block:
+                break
+            writer.write(analyze_block(pool, block, timings))
+            total += len(block)
+            if not quiet:
+                elapsed = time.perf_counter() - started
+                print(f"{total} comments, {total / elapsed:.0f}/s", file=sys.stderr)
+    finally:
+        pool.shutdown()
+        writer.close()
+        if source is not sys.stdin:
+            source.close()
+    seconds = time.perf_counter() - started
+    return {
+        "comments": total,
+        "seconds": round(seconds, 3),
+        "comments_per_s": round(total / seconds, 1) if seconds else None,
+        "stage_seconds": {stage: round(value, 3) for stage, value in timings.items()}
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.batch", description="Offline batch analysis")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("analyze", help="classify, summarize and extract keywords for a CSV of comments")
+    run.add_argument("input", help="CSV with Comment and optional Clause, Date, comment_id, "
+                                   "targets_comment_id, stakeholder_type columns ('-' reads stdin)")
+    run.add_argument("--out", required=True, help="output file: .csv, .jsonl or .parquet")
+    run.add_argument("--format", choices=FORMATS, default=None, help="override the format implied by --out")
+    run.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                     help="worker processes (default: all CPUs, 0 runs in this process)")
+    run.add_argument("--chunk-size", type=int, default=ANALYSIS_CHUNK_SIZE, help="comments per worker task")
+    run.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="comments held in memory at once")
+    run.add_argument("--quiet", action="store_true", help="no progress output")
+    args = parser.parse_args(argv)
+
+    try:
+        stats = analyze(
+            args.input, args.out, args.workers, args.format, args.chunk_size, args.block_size, args.quiet
+        )
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    print(json.dumps(stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
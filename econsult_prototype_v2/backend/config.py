@@ -4,18 +4,49 @@ from pathlib import Path
 # Base directory
 BASE_DIR = Path(__file__).parent
 
-# Database configuration
-DATABASE_URL = "sqlite:///./comments.db"
+# Database configuration (absolute, so every process opens the same file
+# whatever its working directory)
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{(BASE_DIR.parent / 'comments.db').as_posix()}")
+
+# Consultation that pre-existing data and unscoped API calls belong to
+DEFAULT_CONSULTATION_ID = 1
+DEFAULT_CONSULTATION_NAME = "Default consultation"
+
+# Background purge of cleared data: rows deleted per transaction, pause
+# between batches so readers get the database, pages freed per vacuum step
+PURGE_BATCH_SIZE = 5000
+PURGE_PAUSE_SECONDS = 0.05
+VACUUM_PAGES_PER_STEP = 2000
 
 # Model paths
 MODELS_DIR = BASE_DIR / "models"
 INTENT_MODEL_PATH = MODELS_DIR / "intent_model.pkl"
+# Where training writes; promoted over INTENT_MODEL_PATH once it scores better
+INTENT_CANDIDATE_PATH = MODELS_DIR / "intent_model.candidate.pkl"
 SENTIMENT_MODEL_PATH = MODELS_DIR / "sklearn_sentiment.pkl"
+TOPIC_MODEL_PATH = MODELS_DIR / "topic_model.pkl"
 
 # Static files
 STATIC_DIR = BASE_DIR / "static"
 WORDCLOUD_PATH = STATIC_DIR / "wordcloud.png"
 
+# Mutable state outside the comment tables: generated word clouds and topic
+# models (artifacts) and job locks such as one analysis per consultation.
+# "local" keeps artifacts under ARTIFACTS_DIR and locks in memory, which is
+# right for one API process; "database" keeps both in DATABASE_URL so any
+# number of API nodes sharing that database behave as one.
+STATE_BACKEND = os.getenv("STATE_BACKEND", "local")
+ARTIFACTS_DIR = Path(os.getenv("ARTIFACTS_DIR", str(BASE_DIR)))
+# A node that dies mid-job frees its lock after this long; running jobs renew it
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_LOCK_POLL_SECONDS = 0.05
+
+# Opt-in profiling of /analyze (or pass ?profile=true per request); profiles
+# are stored under "profiles/" in the state backend
+ANALYSIS_PROFILE = os.getenv("ANALYSIS_PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_SUMMARY_LIMIT = 40
+PROFILES_KEEP = 20
+
 # API configuration
 API_TITLE = "eConsultation – Pie Chart Dashboard"
 API_VERSION = "0.34"
@@ -27,6 +58,78 @@ CORS_CREDENTIALS = True
 CORS_METHODS = ["*"]
 CORS_HEADERS = ["*"]
 
+# Response compression (Brotli when brotli-asgi is installed, GZip otherwise)
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_COMPRESSION_LEVEL = int(os.getenv("GZIP_COMPRESSION_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Server-Sent Events (/events)
+EVENTS_QUEUE_SIZE = 100
+EVENTS_REPLAY_SIZE = 256
+EVENTS_KEEPALIVE_SECONDS = 15.0
+# With STATE_BACKEND=database, how often each node checks the events table
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "0.25"))
+ANALYSIS_PROGRESS_EVERY = 100
+
+# Ingestion backpressure: comments waiting for the writer, comments per
+# group commit, and the largest single request or CSV upload accepted
+INGEST_QUEUE_CAPACITY = int(os.getenv("INGEST_QUEUE_CAPACITY", "200000"))
+INGEST_GROUP_COMMIT_MAX = 20000
+INGEST_LINGER_SECONDS = 0.002
+INGEST_MAX_REQUEST_COMMENTS = 100000
+INGEST_MAX_UPLOAD_BYTES = int(os.getenv("INGEST_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+# Per-client token bucket in comments per second (0 disables) and burst size
+INGEST_RATE_PER_SECOND = float(os.getenv("INGEST_RATE_PER_SECOND", "5000"))
+INGEST_RATE_BURST = int(os.getenv("INGEST_RATE_BURST", str(INGEST_MAX_REQUEST_COMMENTS)))
+INGEST_RATE_MAX_CLIENTS = 10000
+# Header identifying the client behind a proxy (e.g. X-Forwarded-For); peer address otherwise
+INGEST_CLIENT_HEADER = os.getenv("INGEST_CLIENT_HEADER", "")
+INGEST_BATCH_BUCKETS = [1, 2, 5, 10, 50, 100, 1000, 10000, 100000]
+
+# Analysis worker processes (0 runs analysis inside the API process)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+ANALYSIS_CHUNK_SIZE = 100
+# Chunks queued or running across all concurrent analyses
+ANALYSIS_MAX_IN_FLIGHT = int(os.getenv("ANALYSIS_MAX_IN_FLIGHT", str(max(1, ANALYSIS_WORKERS) * 2)))
+ANALYSIS_CHUNK_TIMEOUT = float(os.getenv("ANALYSIS_CHUNK_TIMEOUT", "120"))
+ANALYSIS_CHUNK_RETRIES = 2
+# Address-space cap per worker (0 disables); workers are recycled after this many chunks
+ANALYSIS_WORKER_MEMORY_MB = int(os.getenv("ANALYSIS_WORKER_MEMORY_MB", "2048"))
+ANALYSIS_WORKER_MAX_TASKS = 200
+
+# In-process NumPy copy of comments and labels that answers /metrics, the
+# cube and counts (READ_MODEL=0 queries the database instead). Writes in
+# this process show up at once, other processes' within the max age.
+READ_MODEL_ENABLED = os.getenv("READ_MODEL", "1").lower() not in ("0", "false", "no")
+READ_MODEL_MAX_AGE_SECONDS = float(os.getenv("READ_MODEL_MAX_AGE_SECONDS", "1.0"))
+READ_MODEL_LOAD_BATCH = 50000
+
+# Review queue (/review): predictions below this confidence or top-2 margin
+# are queued by /analyze, least certain first
+REVIEW_CONFIDENCE_THRESHOLD = float(os.getenv("REVIEW_CONFIDENCE_THRESHOLD", "0.6"))
+REVIEW_MARGIN_THRESHOLD = float(os.getenv("REVIEW_MARGIN_THRESHOLD", "0.15"))
+REVIEW_PAGE_MAX = 500
+
+# Vectorized intent features per comment text, memory-mapped from disk;
+# FEATURE_CACHE=0 vectorizes every comment on every analysis
+FEATURE_CACHE_ENABLED = os.getenv("FEATURE_CACHE", "1").lower() not in ("0", "false", "no")
+FEATURE_CACHE_DIR = Path(os.getenv("FEATURE_CACHE_DIR", str(BASE_DIR / "feature_cache")))
+FEATURE_CACHE_MAX_SEGMENTS = 16
+# Past this size a version's oldest segments are deleted; only the most
+# recently used vectorizer versions keep a directory
+FEATURE_CACHE_MAX_BYTES = int(os.getenv("FEATURE_CACHE_MAX_MB", "1024")) * 1024 * 1024
+FEATURE_CACHE_KEEP_VERSIONS = 2
+
+# HTTP caching of read endpoints: ETags from the consultation's data version,
+# and rendered bodies kept in memory up to this many bytes
+HTTP_CACHE_CONTROL = "no-cache"
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Internal instrumentation (/metrics/internal)
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+DB_QUERY_BUCKETS = [0, 1, 2, 5, 10, 25, 50, 100, 250, 1000]
+INSTRUMENTATION_EXCLUDED_PATHS = ["/events", "/static"]
+
 # PII regex pattern
 PII_REGEX_PATTERN = r"(?:\b\d{10}\b)|(?:[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})"
 
@@ -35,6 +138,31 @@ WORDCLOUD_WIDTH = 900
 WORDCLOUD_HEIGHT = 500
 WORDCLOUD_BACKGROUND_COLOR = "white"
 WORDCLOUD_TOP_KEYWORDS = 30
+# Image variants drawn on demand from the layout of the last analysis: size -> pixel width
+WORDCLOUD_SIZES = {"full": WORDCLOUD_WIDTH, "medium": 450, "thumb": 240}
+WORDCLOUD_FORMATS = ("png", "webp")
+WORDCLOUD_WEBP_QUALITY = 80
+
+# Normalized, tokenized comments kept per process and shared by the analysis stages
+TEXT_CACHE_SIZE = int(os.getenv("TEXT_CACHE_SIZE", "20000"))
+
+# Extractive summaries (/summary)
+SUMMARY_MAX_SENTENCES = 3
+SUMMARY_REDUNDANCY_THRESHOLD = 0.6
+SUMMARY_CACHE_SIZE = 256
+
+# Topic clustering (/topics)
+TOPICS_COUNT = 12
+TOPICS_HASH_FEATURES = 2 ** 16
+TOPICS_BATCH_SIZE = 1024
+TOPICS_TOP_TERMS = 8
+TOPICS_MAX_VOCABULARY = 200000
+
+# Characters of comment text in each /comments row; the full text comes from /comments/{id}
+COMMENT_PREVIEW_CHARS = 100
+
+# Stakeholder label used when a comment has no stakeholder_type
+UNKNOWN_STAKEHOLDER = "unknown"
 
 # Intent classification colors
 INTENT_COLORS = {
@@ -1,15 +1,93 @@
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
-from .config import DATABASE_URL
-from .models import Base
+from .config import (
+    DATABASE_URL,
+    DEFAULT_CONSULTATION_ID,
+    DEFAULT_CONSULTATION_NAME,
+    PURGE_PAUSE_SECONDS,
+    VACUUM_PAGES_PER_STEP
+)
+from .models import Base, Consultation
+from .instrumentation import instrument_engine
 
 # Create database engine
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def create_tables():
     """Create all database tables"""
+    if engine.dialect.name == "sqlite":
+        # Only takes effect on a new database file; lets purges hand pages back
+        # with PRAGMA incremental_vacuum instead of a blocking VACUUM
+        with engine.begin() as conn:
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    assign_default_consultation()
+
+# Indexes replaced by consultation-scoped ones
+OBSOLETE_INDEXES = ["ix_metric_cube_cell", "ix_metric_cube_consultation_cell"]
+
+def add_missing_columns():
+    """Add nullable columns introduced after a database file was created"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+                if column.index:
+                    conn.execute(text(
+                        f'CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} ON {table.name} ("{column.name}")'
+                    ))
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+def assign_default_consultation():
+    """Create the default consultation and move unscoped rows into it"""
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM consultations WHERE id = :id"), {"id": DEFAULT_CONSULTATION_ID}
+        ).first()
+        if not exists:
+            conn.execute(Consultation.__table__.insert().values(
+                id=DEFAULT_CONSULTATION_ID, name=DEFAULT_CONSULTATION_NAME
+            ))
+        for table in Base.metadata.sorted_tables:
+            if "consultation_id" in table.columns:
+                conn.execute(text(
+                    f"UPDATE {table.name} SET consultation_id = :id WHERE consultation_id IS NULL"
+                ), {"id": DEFAULT_CONSULTATION_ID})
+            if "epoch" in table.columns:
+                conn.execute(text(f"UPDATE {table.name} SET epoch = 0 WHERE epoch IS NULL"))
+
+def vacuum_incremental(pages_per_step: int = VACUUM_PAGES_PER_STEP, pause: float = PURGE_PAUSE_SECONDS) -> int:
+    """Return free pages to the filesystem in small steps; no-op unless auto_vacuum is INCREMENTAL"""
+    if engine.dialect.name != "sqlite":
+        return 0
+    freed = 0
+    with engine.connect() as conn:
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+            return 0
+        while True:
+            free = conn.execute(text("PRAGMA freelist_count")).scalar() or 0
+            if not free:
+                break
+            step = min(free, pages_per_step)
+            # execute() steps the pragma once (one page); a script runs it to completion
+            conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({step});")
+            freed += step
+            time.sleep(pause)
+    return freed
 
 def get_db():
     """Dependency to get database session"""
@@ -0,0 +1,221 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from .config import (
+    EVENTS_KEEPALIVE_SECONDS, EVENTS_POLL_SECONDS, EVENTS_QUEUE_SIZE, EVENTS_REPLAY_SIZE, STATE_BACKEND
+)
+from .database import engine
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+Message = Tuple[int, str, Dict[str, Any]]
+
+
+def format_sse(event_id: int, event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events message"""
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+
+class EventBroker:
+    """
+    In-process fan-out of dashboard update events to SSE subscribers.
+
+    Sync route handlers run in the threadpool, so publish() hands each event
+    to the subscriber's event loop with call_soon_threadsafe. Recent events
+    are kept in a ring buffer so reconnecting clients can resume from their
+    Last-Event-ID; a client that falls too far behind is sent "resync" and
+    reloads everything once.
+    """
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, replay_size: int = EVENTS_REPLAY_SIZE):
+        self.queue_size = queue_size
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._history: Deque[Message] = deque(maxlen=replay_size)
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: str, data: Dict[str, Any]) -> Optional[int]:
+        """Publish an event to all subscribers; safe to call from any thread"""
+        with self._lock:
+            event_id = next(self._ids)
+            message = (event_id, event, data)
+            self._history.append(message)
+        self._fan_out(message)
+        return event_id
+
+    def _fan_out(self, message: Message) -> None:
+        """Hand a message to every subscriber of this process"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # Subscriber's loop already closed; it is removed on disconnect
+                continue
+
+    def _deliver(self, queue: asyncio.Queue, message: Message) -> None:
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and ask it to reload once
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait((message[0], "resync", {}))
+
+    def _replay(self, last_event_id: Optional[int]) -> List[Message]:
+        if last_event_id is None:
+            return []
+        with self._lock:
+            history = list(self._history)
+        if history and history[0][0] > last_event_id + 1:
+            return [(history[-1][0], "resync", {})]
+        return [m for m in history if m[0] > last_event_id]
+
+    def _start(self) -> None:
+        """Called on each subscribe; in-process delivery needs nothing started"""
+
+    async def subscribe(
+        self,
+        last_event_id: Optional[int] = None,
+        keepalive: float = EVENTS_KEEPALIVE_SECONDS
+    ) -> AsyncIterator[str]:
+        """Yield formatted SSE messages until the consumer stops iterating"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.append(entry)
+        self._start()
+        try:
+            yield "retry: 3000\n\n"
+            # The replay may also be queued, as the subscriber is registered first
+            sent = last_event_id or 0
+            for message in await asyncio.get_running_loop().run_in_executor(None, self._replay, last_event_id):
+                sent = message[0]
+                yield format_sse(*message)
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message[0] <= sent and message[1] != "resync":
+                    continue
+                sent = message[0]
+                yield format_sse(*message)
+        finally:
+            with self._lock:
+                self._subscribers.remove(entry)
+
+
+class DatabaseEventBroker(EventBroker):
+    """
+    Events as rows of the events table, so subscribers on every API node
+    get what any node published. Ids come from the table, so a client can
+    resume with Last-Event-ID on any node. One thread per process polls for
+    new rows and fans them out to that process's subscribers; the newest
+    replay_size rows are kept for replay.
+    """
+
+    def __init__(
+        self,
+        bind=engine,
+        queue_size: int = EVENTS_QUEUE_SIZE,
+        replay_size: int = EVENTS_REPLAY_SIZE,
+        poll: float = EVENTS_POLL_SECONDS
+    ):
+        super().__init__(queue_size, replay_size)
+        self.bind = bind
+        self.replay_size = replay_size
+        self.poll = poll
+        self._poller: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    def publish(self, event: str, data: Dict[str, Any]) -> Optional[int]:
+        """Store an event for every node's subscribers; None if it could not be stored"""
+        payload = json.dumps(data, separators=(",", ":"))
+        try:
+            with self.bind.begin() as conn:
+                event_id = conn.execute(
+                    insert(Event).values(event=event, data=payload, created_at=time.time())
+                ).inserted_primary_key[0]
+                conn.execute(delete(Event).where(Event.id <= event_id - self.replay_size))
+        except SQLAlchemyError as e:
+            # The write the event announces already succeeded; clients resync on reconnect
+            logger.warning("Could not publish %s event: %s", event, e)
+            return None
+        return event_id
+
+    def _fetch(self, after: int) -> List[Message]:
+        with self.bind.connect() as conn:
+            rows = conn.execute(
+                select(Event.id, Event.event, Event.data).where(Event.id > after).order_by(Event.id)
+            ).all()
+        return [(event_id, event, json.loads(data)) for event_id, event, data in rows]
+
+    def _latest_id(self) -> int:
+        with self.bind.connect() as conn:
+            return conn.execute(select(func.max(Event.id))).scalar() or 0
+
+    def _replay(self, last_event_id: Optional[int]) -> List[Message]:
+        if last_event_id is None:
+            return []
+        with self.bind.connect() as conn:
+            oldest, newest = conn.execute(select(func.min(Event.id), func.max(Event.id))).one()
+        if oldest is not None and oldest > last_event_id + 1:
+            return [(newest, "resync", {})]
+        return self._fetch(last_event_id)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._poller is not None:
+                return
+            # Taken now, so the first subscriber gets everything published after it subscribed
+            try:
+                cursor = self._latest_id()
+            except SQLAlchemyError:
+                cursor = None
+            self._poller = threading.Thread(
+                target=self._poll_forever, args=(cursor,), name="event-poller", daemon=True
+            )
+        self._poller.start()
+
+    def close(self) -> None:
+        """Stop polling; subscribers get no further events"""
+        self._closed.set()
+
+    def _poll_forever(self, cursor: Optional[int]) -> None:
+        while not self._closed.is_set():
+            try:
+                if cursor is None:
+                    cursor = self._latest_id()
+                for message in self._fetch(cursor):
+                    cursor = message[0]
+                    self._fan_out(message)
+            except SQLAlchemyError as e:
+                logger.warning("Could not poll events: %s", e)
+            self._closed.wait(self.poll)
+
+
+EVENT_BROKERS = {
+    "local": EventBroker,
+    "database": DatabaseEventBroker,
+}
+
+# Shared broker for the API process; stores.py rejects an unknown STATE_BACKEND
+event_broker = EVENT_BROKERS.get(STATE_BACKEND, EventBroker)()
@@ -0,0 +1,301 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import unicodedata
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import scipy.sparse as sp
+from joblib import hash as joblib_hash
+from sklearn import __version__ as sklearn_version
+
+from . import textproc
+from .config import (
+    FEATURE_CACHE_DIR,
+    FEATURE_CACHE_ENABLED,
+    FEATURE_CACHE_KEEP_VERSIONS,
+    FEATURE_CACHE_MAX_BYTES,
+    FEATURE_CACHE_MAX_SEGMENTS
+)
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; segments are never merged
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARRAYS = ("keys", "data", "indices", "indptr")
+
+
+def text_key(text: str) -> int:
+    """64-bit hash of a comment's text"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+@lru_cache(maxsize=1)
+def text_processing_version() -> str:
+    """
+    Hash of the tokenization code the vectorizer calls into. Pickling the
+    pipeline captures a callable analyzer such as textproc.intent_terms by
+    name only, so edits to it would otherwise keep serving old rows.
+    """
+    source = Path(textproc.__file__).read_bytes()
+    extra = f"{unicodedata.unidata_version}:{sklearn_version}".encode("utf-8")
+    return hashlib.blake2b(source + extra, digest_size=8).hexdigest()
+
+
+def vectorizer_version(pipeline) -> Optional[str]:
+    """Hash of every step before the classifier, or None if the model is not a multi-step Pipeline"""
+    steps = getattr(pipeline, "steps", None)
+    if not steps or len(steps) < 2:
+        return None
+    return joblib_hash((text_processing_version(), pipeline[:-1]))
+
+
+class Segment:
+    """One immutable block of CSR rows on disk, sorted by text key"""
+
+    def __init__(self, path: Path):
+        self.name = path.name
+        # Plain ndarray views of the maps; slicing np.memmap objects is slow
+        self.keys, self.data, self.indices, self.indptr = (
+            np.asarray(np.load(path / f"{array}.npy", mmap_mode="r")) for array in ARRAYS
+        )
+
+    def find(self, keys: np.ndarray) -> np.ndarray:
+        """Row of each key in this segment, or -1"""
+        if not len(self.keys):
+            return np.full(len(keys), -1)
+        positions = np.searchsorted(self.keys, keys)
+        positions[positions >= len(self.keys)] = 0
+        return np.where(self.keys[positions] == keys, positions, -1)
+
+    def rows(self, rows: np.ndarray, n_features: int) -> sp.csr_matrix:
+        """CSR matrix of the given rows, gathered without a Python loop"""
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        # Position of every stored value: its row's start plus its offset in the row
+        gather = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return sp.csr_matrix((self.data[gather], self.indices[gather], indptr), shape=(len(rows), n_features))
+
+
+class FeatureCache:
+    """
+    Vectorized feature rows of comments, stored on disk by text hash.
+
+    Each directory under root/<vectorizer version> is a segment written
+    once: the text keys, sorted, and the CSR data, indices and indptr of
+    their rows, all memory-mapped, so worker processes share the pages and
+    hold no per-comment index in memory. Processes add a segment for the
+    texts they had to vectorize and pick up each other's on the next
+    lookup. Retraining the classifier keeps the cache; a different
+    vectorizer gets a new directory. When there are more than max_segments,
+    one process merges the smaller half under a file lock, so each row is
+    rewritten a logarithmic number of times. Past max_bytes, the segments
+    written longest ago are deleted under the same lock.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        version: str,
+        max_segments: int = FEATURE_CACHE_MAX_SEGMENTS,
+        max_bytes: int = FEATURE_CACHE_MAX_BYTES
+    ):
+        self.directory = Path(root) / version
+        self.max_segments = max_segments
+        self.max_bytes = max_bytes
+        self.segments: Dict[str, Segment] = {}
+        self.n_features: Optional[int] = None
+        self.dtype = None
+        self._lock = threading.Lock()
+
+    def _segment_names(self) -> List[str]:
+        try:
+            return sorted(p.name for p in self.directory.iterdir() if p.is_dir() and not p.name.startswith("."))
+        except FileNotFoundError:
+            return []
+
+    def _refresh(self) -> None:
+        names = self._segment_names()
+        for name in set(self.segments) - set(names):
+            del self.segments[name]  # merged away
+        for name in names:
+            if name not in self.segments:
+                try:
+                    self.segments[name] = Segment(self.directory / name)
+                except (OSError, ValueError):
+                    pass  # removed by a merge while listing
+
+    def _write_segment(self, keys: np.ndarray, data, indices, indptr) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = uuid.uuid4().hex
+        # Written under a hidden name and renamed, so readers never see part of a segment
+        tmp = self.directory / f".{name}"
+        tmp.mkdir()
+        for array, values in zip(ARRAYS, (keys, data, indices, indptr)):
+            np.save(tmp / f"{array}.npy", values)
+        os.replace(tmp, self.directory / name)
+        return name
+
+    def store(self, keys: Sequence[int], matrix: sp.csr_matrix) -> None:
+        """Persist freshly vectorized rows (one per key) as a new segment"""
+        if not len(keys):
+            return
+        keys = np.array(keys, dtype=np.uint64)
+        keys, first = np.unique(keys, return_index=True)
+        matrix = matrix[first]
+        self._write_segment(keys, matrix.data, matrix.indices, matrix.indptr)
+        if len(self._segment_names()) > self.max_segments:
+            self.compact()
+        if self._size() > self.max_bytes:
+            self.evict()
+
+    def _size(self) -> int:
+        return sum(
+            file.stat().st_size
+            for name in self._segment_names()
+            for file in (self.directory / name).glob("*.npy")
+        )
+
+    def _remove_segment(self, name: str) -> None:
+        # Processes that mapped the old files keep reading them until they refresh
+        shutil.rmtree(self.directory / name, ignore_errors=True)
+
+    def _try_lock(self, lock) -> bool:
+        """Take the directory's maintenance lock without waiting"""
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def evict(self) -> None:
+        """Delete the segments written longest ago until the rest fit in max_bytes"""
+        if fcntl is None:
+            return
+        with open(self.directory / ".lock", "w") as lock:
+            if not self._try_lock(lock):
+                return
+            paths = sorted(
+                (self.directory / name for name in self._segment_names()),
+                key=lambda path: path.stat().st_mtime,
+                reverse=True
+            )
+            kept, evicted = 0, 0
+            for index, path in enumerate(paths):
+                kept += sum(file.stat().st_size for file in path.glob("*.npy"))
+                # The newest segment stays even if it alone is too big
+                if index and kept > self.max_bytes:
+                    self._remove_segment(path.name)
+                    evicted += 1
+        if evicted:
+            logger.info("Evicted %d feature cache segments over %d bytes", evicted, self.max_bytes)
+
+    def compact(self) -> None:
+        """Merge the smaller segments into one; skipped if another process is already merging"""
+        if fcntl is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".lock", "w") as lock:
+            if not self._try_lock(lock):
+                return
+            segments = sorted(
+                (Segment(self.directory / name) for name in self._segment_names()), key=lambda s: len(s.keys)
+            )
+            segments = segments[:max(2, len(segments) - self.max_segments // 2)]
+            if len(segments) < 2:
+                return
+            width = max((int(s.indices.max()) + 1 if len(s.indices) else 1) for s in segments)
+            matrix = sp.vstack([
+                sp.csr_matrix((s.data, s.indices, s.indptr), shape=(len(s.keys), width)) for s in segments
+            ], format="csr")
+            keys = np.concatenate([s.keys for s in segments])
+            keys, first = np.unique(keys, return_index=True)
+            matrix = matrix[first]
+            self._write_segment(keys, matrix.data, matrix.indices, matrix.indptr)
+            for segment in segments:
+                self._remove_segment(segment.name)
+        logger.info("Merged %d feature cache segments into %d rows", len(segments), len(keys))
+
+    def transform(self, transformer, texts: List[str]) -> Optional[sp.csr_matrix]:
+        """
+        transformer.transform(texts), vectorizing only texts not cached and
+        caching those; None if the transformer's output is not sparse.
+        """
+        if self.n_features is None:
+            probe = transformer.transform([""])
+            if not sp.issparse(probe):
+                return None
+            self.n_features, self.dtype = probe.shape[1], probe.dtype
+        keys = np.array([text_key(text) for text in texts], dtype=np.uint64)
+        with self._lock:
+            self._refresh()
+            segments = list(self.segments.values())
+
+        parts, positions = [], []
+        pending = np.arange(len(texts))
+        for segment in segments:
+            if not len(pending):
+                break
+            rows = segment.find(keys[pending])
+            hit = rows >= 0
+            if hit.any():
+                parts.append(segment.rows(rows[hit], self.n_features))
+                positions.append(pending[hit])
+                pending = pending[~hit]
+        if len(pending) or not parts:
+            fresh = sp.csr_matrix(transformer.transform([texts[i] for i in pending.tolist()]))
+            fresh.sort_indices()
+            self.store(keys[pending], fresh)
+            parts.append(fresh)
+            positions.append(pending)
+
+        matrix = sp.vstack(parts, format="csr") if len(parts) > 1 else parts[0]
+        order = np.argsort(np.concatenate(positions), kind="stable")
+        return matrix[order].astype(self.dtype, copy=False)
+
+
+_caches: Dict[str, FeatureCache] = {}
+_caches_lock = threading.Lock()
+
+
+def prune_versions(root: Path, current: str, keep: int = FEATURE_CACHE_KEEP_VERSIONS) -> None:
+    """Delete the directories of all but the keep most recently used vectorizer versions"""
+    root = Path(root)
+    (root / current).mkdir(parents=True, exist_ok=True)
+    os.utime(root / current)
+    try:
+        versions = sorted(
+            (p for p in root.iterdir() if p.is_dir() and not p.name.startswith(".")),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True
+        )
+    except OSError:
+        return
+    for path in versions[max(1, keep):]:
+        if path.name != current:
+            logger.info("Removing feature cache of vectorizer version %s", path.name)
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def feature_cache(version: Optional[str]) -> Optional[FeatureCache]:
+    """This process's cache for a vectorizer version, or None when caching is off"""
+    if not FEATURE_CACHE_ENABLED or version is None:
+        return None
+    with _caches_lock:
+        cache = _caches.get(version)
+        if cache is None:
+            try:
+                prune_versions(FEATURE_CACHE_DIR, version)
+            except OSError as e:
+                logger.warning("Could not prune the feature cache: %s", e)
+            cache = _caches[version] = FeatureCache(FEATURE_CACHE_DIR, version)
+        return cache
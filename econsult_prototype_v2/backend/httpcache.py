@@ -0,0 +1,116 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .config import HTTP_CACHE_CONTROL, RESPONSE_CACHE_MAX_BYTES
+from .instrumentation import RESPONSE_CACHE
+from .responses import FastJSONResponse
+
+# Response headers replayed from the cache along with the body
+CACHED_HEADERS = ("content-type",)
+
+
+class ResponseCache:
+    """
+    Rendered response bodies by (route, query, data version), least
+    recently used first out once max_bytes is reached. Entries of an older
+    version are never asked for again and age out.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Tuple, Tuple[bytes, Dict[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: Tuple, body: bytes, headers: Dict[str, str]) -> None:
+        # One huge body (a full /comments export) must not flush everything else
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self._entries[key] = (body, headers)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (old, _) = self._entries.popitem(last=False)
+                self.size -= len(old)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+response_cache = ResponseCache()
+
+
+def data_tag(consultation: Any) -> str:
+    """Identifies one state of a consultation's data; a recreated consultation id gets a new tag"""
+    created = int(consultation.created_at.timestamp()) if consultation.created_at else 0
+    return f"{consultation.id}.{created}.{consultation.data_version or 0}"
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    etag = etag[2:] if etag.startswith("W/") else etag
+    tags = (tag.strip() for tag in header.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+
+def cached_response(request: Request, build: Callable[[], Any]) -> Response:
+    """
+    Answer a read request from its consultation's data version.
+
+    A client that already holds the current version gets 304 Not Modified;
+    otherwise the rendered body comes from the response cache, or from
+    build() once per (route, query, version). Every answer carries an
+    ETag and Cache-Control: no-cache, so browsers revalidate on each
+    dashboard refresh and only download what changed. The ETag is weak:
+    the compression middleware sends the same content as identity, gzip
+    or br bytes, which are equivalent but not byte-identical.
+    """
+    route = request.url.path
+    query = tuple(sorted(request.query_params.multi_items()))
+    key = (route, query, request.state.data_tag)
+    etag = 'W/"' + hashlib.blake2b(repr(key).encode("utf-8"), digest_size=12).hexdigest() + '"'
+    # Also on 304s and bodies too small to compress, which have no Vary from the middleware
+    headers = {"ETag": etag, "Cache-Control": HTTP_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        RESPONSE_CACHE.inc(route, "not_modified")
+        return Response(status_code=304, headers=headers)
+
+    entry = response_cache.get(key)
+    if entry is not None:
+        RESPONSE_CACHE.inc(route, "hit")
+        body, cached_headers = entry
+        return Response(body, headers={**cached_headers, **headers})
+
+    RESPONSE_CACHE.inc(route, "miss")
+    response = build()
+    if not isinstance(response, Response):
+        response = FastJSONResponse(response)
+    if response.status_code != 200:
+        return response
+    response.headers.update(headers)
+    body = getattr(response, "body", None)
+    if isinstance(body, bytes):
+        response_cache.set(key, body, {h: response.headers[h] for h in CACHED_HEADERS if h in response.headers})
+    return response
@@ -0,0 +1,216 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .config import (
+    INGEST_QUEUE_CAPACITY,
+    INGEST_GROUP_COMMIT_MAX,
+    INGEST_LINGER_SECONDS,
+    INGEST_RATE_PER_SECOND,
+    INGEST_RATE_BURST,
+    INGEST_RATE_MAX_CLIENTS
+)
+from .database import SessionLocal
+from .instrumentation import INGEST_BATCH_SIZE, INGEST_REJECTED
+from .readmodel import read_models
+from .services import CommentService, ThreadService
+
+logger = logging.getLogger(__name__)
+
+
+class IngestRejectedError(Exception):
+    """Raised when a client must back off; retry_after is in seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Ingestion {reason}, retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills at rate tokens per second up to capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float) -> float:
+        """Spend cost tokens; returns 0, or the seconds until they are available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # A request larger than the burst waits for a full bucket instead of forever
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Per-client token buckets, in comments per second; rate 0 disables limiting"""
+
+    def __init__(self, rate: float = INGEST_RATE_PER_SECOND, burst: float = INGEST_RATE_BURST,
+                 max_clients: int = INGEST_RATE_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, client: str, cost: int) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.pop(client, None) or TokenBucket(self.rate, self.burst)
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                # Least recently seen clients start again with a full bucket
+                self._buckets.popitem(last=False)
+            wait = bucket.take(cost)
+        if wait:
+            INGEST_REJECTED.inc("rate_limited")
+            raise IngestRejectedError("rate limited", wait)
+
+
+class _Submission:
+    __slots__ = ("consultation_id", "items", "future")
+
+    def __init__(self, consultation_id: int, items: List[Dict[str, Any]]):
+        self.consultation_id = consultation_id
+        self.items = items
+        self.future: Future = Future()
+
+
+class IngestQueue:
+    """
+    Bounded write queue drained by a single writer thread.
+
+    Requests enqueue their comments and wait for the ids. The writer takes
+    everything queued so far (up to max_batch comments) and inserts it in
+    one transaction, so concurrent requests share one commit instead of
+    each paying for its own, and the database sees a single writer. When
+    capacity comments are already waiting, submit() rejects with an
+    estimate of how long the backlog takes to drain.
+    """
+
+    def __init__(self, capacity: int = INGEST_QUEUE_CAPACITY, max_batch: int = INGEST_GROUP_COMMIT_MAX,
+                 linger: float = INGEST_LINGER_SECONDS, session_factory: Callable = SessionLocal):
+        self.capacity = capacity
+        self.max_batch = max_batch
+        self.linger = linger
+        self.session_factory = session_factory
+        self._pending: Deque[_Submission] = deque()
+        self._queued = 0
+        self._cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+        # Comments written per second, smoothed; seeds the Retry-After estimate
+        self._throughput = 1000.0
+        self._last_batch = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queued
+
+    def submit(self, consultation_id: int, items: List[Dict[str, Any]]) -> Future:
+        """Queue comments for writing; the future resolves to their ids"""
+        submission = _Submission(consultation_id, items)
+        size = max(1, len(items))
+        with self._cond:
+            if self._queued and self._queued + size > self.capacity:
+                INGEST_REJECTED.inc("queue_full")
+                raise IngestRejectedError("queue full", max(1.0, self._queued / self._throughput))
+            self._pending.append(submission)
+            self._queued += size
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+                self._writer.start()
+            self._cond.notify()
+        return submission.future
+
+    def _take_batch(self) -> List[_Submission]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+        if self.linger and self._last_batch > 1:
+            # Under concurrent load, let requests about to arrive share this commit
+            time.sleep(self.linger)
+        with self._cond:
+            batch = [self._pending.popleft()]
+            size = len(batch[0].items)
+            while self._pending and size + len(self._pending[0].items) <= self.max_batch:
+                submission = self._pending.popleft()
+                size += len(submission.items)
+                batch.append(submission)
+        self._last_batch = len(batch)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            size = sum(max(1, len(s.items)) for s in batch)
+            started = time.perf_counter()
+            try:
+                self._write(batch)
+            except Exception as e:  # never let the writer thread die
+                logger.exception("Ingestion writer failed")
+                for submission in batch:
+                    if not submission.future.done():
+                        submission.future.set_exception(e)
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            self._throughput = 0.8 * self._throughput + 0.2 * (size / elapsed)
+            INGEST_BATCH_SIZE.observe(size)
+            with self._cond:
+                self._queued -= size
+
+    def _write(self, batch: List[_Submission]) -> None:
+        db = self.session_factory()
+        try:
+            staged = []
+            services: Dict[int, CommentService] = {}
+            try:
+                for submission in batch:
+                    cid = submission.consultation_id
+                    service = services.get(cid) or services.setdefault(cid, CommentService(db, cid))
+                    ids, threaded = service.stage_comments(submission.items)
+                    staged.append((submission, ids, threaded))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                if len(batch) == 1:
+                    batch[0].future.set_exception(e)
+                    return
+                # One bad payload must not fail the rest: write them one by one
+                for submission in batch:
+                    self._write([submission])
+                return
+
+            for cid in services:
+                read_models.invalidate(cid)
+            for submission, ids, threaded in staged:
+                if threaded:
+                    try:
+                        ThreadService(db, submission.consultation_id).index_comments(ids)
+                    except Exception:
+                        db.rollback()
+                        logger.exception("Indexing reply threads failed for %d comments", len(ids))
+                submission.future.set_result(ids)
+        finally:
+            db.close()
+
+
+ingest_limiter = RateLimiter()
+ingest_queue = IngestQueue()
+
+
+def ingest_comments(consultation_id: int, items: List[Dict[str, Any]], client: str) -> List[int]:
+    """Rate-limit, enqueue and wait for comments to be written; returns their ids"""
+    ingest_limiter.acquire(client, len(items))
+    return ingest_queue.submit(consultation_id, items).result()
@@ -0,0 +1,257 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from .config import LATENCY_BUCKETS, DB_QUERY_BUCKETS, INGEST_BATCH_BUCKETS, INSTRUMENTATION_EXCLUDED_PATHS
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_float(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_float(v)}" for k, v in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition model"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = sorted(buckets) + [float("inf")]
+        # label values -> [per-bucket counts, sum, count]
+        self._series: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for label_values, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = f'le="{_format_float(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_float(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {n}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "econsult_http_requests_total", "HTTP requests handled", ("method", "route", "status")
+))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "econsult_http_request_duration_seconds", "HTTP request latency", LATENCY_BUCKETS, ("method", "route")
+))
+DB_QUERIES_PER_REQUEST = REGISTRY.register(Histogram(
+    "econsult_db_queries_per_request", "Database queries issued per HTTP request", DB_QUERY_BUCKETS, ("route",)
+))
+DB_TIME_PER_REQUEST = REGISTRY.register(Histogram(
+    "econsult_db_query_duration_seconds_per_request", "Database time spent per HTTP request", LATENCY_BUCKETS, ("route",)
+))
+DB_QUERIES = REGISTRY.register(Counter(
+    "econsult_db_queries_total", "Database queries issued"
+))
+ANALYSIS_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "econsult_analysis_stage_duration_seconds", "Time per analyze_comments stage per run", LATENCY_BUCKETS, ("stage",)
+))
+INGEST_BATCH_SIZE = REGISTRY.register(Histogram(
+    "econsult_ingest_group_commit_comments", "Comments written per ingestion group commit", INGEST_BATCH_BUCKETS
+))
+INGEST_REJECTED = REGISTRY.register(Counter(
+    "econsult_ingest_rejected_total", "Ingestion requests answered with 429", ("reason",)
+))
+RESPONSE_CACHE = REGISTRY.register(Counter(
+    "econsult_response_cache_total", "Cacheable read requests by outcome", ("route", "outcome")
+))
+DB_LOCK_ERRORS = REGISTRY.register(Counter(
+    "econsult_db_lock_errors_total", "Statements that failed because SQLite was locked", ("statement",)
+))
+
+
+def is_lock_error(error: BaseException) -> bool:
+    """True for SQLite's "database is locked" and "database table is locked" errors"""
+    return "is locked" in str(getattr(error, "orig", None) or error)
+
+
+class QueryStats:
+    """Per-request database query accounting"""
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Shared by reference with threadpool workers, which run in a copy of the context
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def instrument_engine(engine) -> None:
+    """Count and time every statement executed through the engine"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERIES.inc()
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if context.statement is not None and conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()  # after_cursor_execute is not called for a failed statement
+        # Counted here rather than per response so background jobs' lock errors show up too
+        if is_lock_error(context.original_exception):
+            statement = (context.statement or "COMMIT").split(None, 1)[0].upper()
+            DB_LOCK_ERRORS.inc(statement)
+
+
+class StageTimer:
+    """Accumulates time per pipeline stage across a run, then records it once"""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - t0
+
+    def add(self, timings: Dict[str, float]) -> None:
+        """Merge stage times measured elsewhere, e.g. in a worker process"""
+        for name, seconds in timings.items():
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def observe(self) -> Dict[str, float]:
+        for name, seconds in self.totals.items():
+            ANALYSIS_STAGE_SECONDS.observe(seconds, name)
+        return {name: round(seconds, 4) for name, seconds in self.totals.items()}
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and DB usage"""
+
+    def __init__(self, app, excluded_paths: Sequence[str] = INSTRUMENTATION_EXCLUDED_PATHS):
+        self.app = app
+        self.excluded_paths = tuple(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _query_stats.reset(token)
+            route = scope.get("route")
+            # Label by route template to keep cardinality bounded
+            route_name = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "GET")
+            HTTP_REQUESTS.inc(method, route_name, str(status["code"]))
+            HTTP_LATENCY.observe(elapsed, method, route_name)
+            DB_QUERIES_PER_REQUEST.observe(stats.count, route_name)
+            DB_TIME_PER_REQUEST.observe(stats.seconds, route_name)
+
+
+def render_metrics() -> str:
+    """Render all registered metrics in Prometheus text format"""
+    return REGISTRY.render()
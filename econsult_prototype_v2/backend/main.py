@@ -1,8 +1,11 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
+import threading
+from sqlalchemy.exc import OperationalError
 
 from .config import (
     API_TITLE, 
@@ -11,19 +14,52 @@ from .config import (
     CORS_ORIGINS,
     CORS_CREDENTIALS,
     CORS_METHODS,
-    CORS_HEADERS
+    CORS_HEADERS,
+    COMPRESSION_MINIMUM_SIZE,
+    GZIP_COMPRESSION_LEVEL,
+    BROTLI_QUALITY
 )
 from .database import create_tables
+from .responses import FastJSONResponse
+from .instrumentation import MetricsMiddleware, is_lock_error
 from .routes import router
+from .services import purge_stale_data
 from .frontend import get_dashboard_html
 
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
 # Create FastAPI app
 app = FastAPI(
     title=API_TITLE,
     version=API_VERSION,
-    description=API_DESCRIPTION
+    description=API_DESCRIPTION,
+    default_response_class=FastJSONResponse
 )
 
+# Compress responses above the size threshold; Brotli falls back to GZip
+# for clients that do not advertise "br"
+if BrotliMiddleware is not None:
+    app.add_middleware(
+        BrotliMiddleware,
+        quality=BROTLI_QUALITY,
+        minimum_size=COMPRESSION_MINIMUM_SIZE,
+        gzip_fallback=True,
+        excluded_handlers=["/events"]
+    )
+else:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=COMPRESSION_MINIMUM_SIZE,
+        compresslevel=GZIP_COMPRESSION_LEVEL
+    )
+
+# Per-route latency and DB query accounting, exposed at /metrics/internal.
+# Added last so it is outermost and includes compression time.
+app.add_middleware(MetricsMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +72,13 @@ app.add_middleware(
 # Include API routes
 app.include_router(router)
 
+@app.exception_handler(OperationalError)
+async def database_error(request: Request, exc: OperationalError):
+    """Report SQLite lock timeouts as a retryable 503 instead of a bare 500"""
+    if is_lock_error(exc):
+        return JSONResponse({"error": "database is locked"}, status_code=503, headers={"Retry-After": "1"})
+    raise exc
+
 # Mount static files
 frontend_dir = Path(__file__).parent.parent / "frontend"
 if frontend_dir.exists():
@@ -44,6 +87,9 @@ if frontend_dir.exists():
 # Create database tables
 create_tables()
 
+# Finish purges interrupted by a restart without delaying startup
+threading.Thread(target=purge_stale_data, name="purge-stale-data", daemon=True).start()
+
 @app.get("/ui", response_class=HTMLResponse)
 def dashboard():
     """Serve the main dashboard UI"""
@@ -1,23 +1,103 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Index, LargeBinary, text
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 
+class Consultation(Base):
+    """Model for a consultation (draft) whose comments are analyzed together"""
+    __tablename__ = "consultations"
+    # Never hand a deleted consultation's id to a new one
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(200), nullable=False)
+    description = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped by /clear; rows of older epochs are hidden and purged in the background
+    epoch = Column(Integer, default=0)
+    # Bumped by every write that changes what read endpoints return; part of their ETags
+    data_version = Column(Integer, default=0)
+
 class Comment(Base):
     """Model for storing consultation comments"""
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_consultation_clause", "consultation_id", "clause"),
+        Index("ix_comments_consultation_external", "consultation_id", "external_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    consultation_id = Column(Integer, index=True)
+    epoch = Column(Integer, default=0)
     text = Column(Text, nullable=False)
     clause = Column(String(100), default="overall")
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Source dataset ids (comment_id / targets_comment_id) for reply threads
+    external_id = Column(String(64), index=True)
+    parent_external_id = Column(String(64), index=True)
+    stakeholder_type = Column(String(100))
+
+class CommentThread(Base):
+    """Model for the precomputed reply-thread position of each comment"""
+    __tablename__ = "comment_threads"
+    
+    comment_id = Column(Integer, primary_key=True)
+    consultation_id = Column(Integer, index=True)
+    epoch = Column(Integer, default=0)
+    parent_id = Column(Integer, index=True)
+    root_id = Column(Integer, index=True)
+    depth = Column(Integer, default=0)
+    descendants = Column(Integer, default=0)
+
+class ThreadStats(Base):
+    """Model for precomputed per-root reply-thread statistics"""
+    __tablename__ = "thread_stats"
+    __table_args__ = (
+        Index("ix_thread_stats_consultation_contested", "consultation_id", "contested_score"),
+    )
+    
+    root_id = Column(Integer, primary_key=True)
+    consultation_id = Column(Integer, index=True)
+    epoch = Column(Integer, default=0)
+    size = Column(Integer, default=0)
+    max_depth = Column(Integer, default=0)
+    agree = Column(Integer, default=0)
+    disagree = Column(Integer, default=0)
+    agree_ratio = Column(Float, default=0.0)
+    disagree_ratio = Column(Float, default=0.0)
+    contested_score = Column(Float, default=0.0, index=True)
+
+class CommentTopic(Base):
+    """Model for storing the topic cluster assigned to each comment"""
+    __tablename__ = "comment_topics"
+    __table_args__ = (
+        Index("ix_comment_topics_consultation_topic", "consultation_id", "topic_id", "distance"),
+    )
+    
+    comment_id = Column(Integer, primary_key=True)
+    consultation_id = Column(Integer, index=True)
+    epoch = Column(Integer, default=0)
+    topic_id = Column(Integer, index=True)
+    distance = Column(Float)
 
 class Prediction(Base):
     """Model for storing AI predictions and analysis results"""
     __tablename__ = "predictions"
+    __table_args__ = (
+        Index("ix_predictions_consultation_comment", "consultation_id", "comment_id"),
+        # Review queue in uncertainty order; only queued predictions are indexed
+        Index(
+            "ix_predictions_review_queue",
+            "consultation_id", "epoch", "review_priority",
+            sqlite_where=text("review_priority IS NOT NULL"),
+            postgresql_where=text("review_priority IS NOT NULL")
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    consultation_id = Column(Integer, index=True)
+    epoch = Column(Integer, default=0)
     comment_id = Column(Integer)
     sentiment = Column(String(20))
     sentiment_score = Column(Float)
@@ -25,3 +105,75 @@ class Prediction(Base):
     keywords_json = Column(Text)
     clause = Column(String(100), default="overall")
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Top-1 minus top-2 class probability
+    margin = Column(Float)
+    # Set while the prediction awaits review; lower is less certain
+    review_priority = Column(Float)
+
+class Correction(Base):
+    """Model for analyst corrections of predicted labels, kept for retraining"""
+    __tablename__ = "corrections"
+    __table_args__ = (
+        Index("ix_corrections_consultation_comment", "consultation_id", "epoch", "comment_id", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    consultation_id = Column(Integer, index=True)
+    epoch = Column(Integer, default=0)
+    comment_id = Column(Integer)
+    # Copied so corrections outlive /clear and can train the next model
+    text = Column(Text, nullable=False)
+    predicted_label = Column(String(40))
+    predicted_score = Column(Float)
+    label = Column(String(40), nullable=False)
+    note = Column(Text)
+    reviewer = Column(String(100))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class MetricCube(Base):
+    """Model for precomputed prediction counts by clause x stakeholder x label"""
+    __tablename__ = "metric_cube"
+    __table_args__ = (
+        Index(
+            "ix_metric_cube_consultation_epoch_cell",
+            "consultation_id", "epoch", "clause", "stakeholder", "label",
+            unique=True
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    consultation_id = Column(Integer, index=True)
+    epoch = Column(Integer, default=0)
+    clause = Column(String(100))
+    stakeholder = Column(String(100))
+    label = Column(String(40))
+    count = Column(Integer, default=0)
+    score_sum = Column(Float, default=0.0)
+
+class Artifact(Base):
+    """Model for a generated file (word cloud, topic model) shared by every API node"""
+    __tablename__ = "artifacts"
+    
+    key = Column(String(255), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    # time.time() of the last write; image variants older than their layout are redrawn
+    updated_at = Column(Float, nullable=False)
+
+class Event(Base):
+    """Model for a dashboard update event, streamed by /events on every API node"""
+    __tablename__ = "events"
+    # Ids are SSE event ids; one must never be handed out twice
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = Column(Integer, primary_key=True)
+    event = Column(String(50), nullable=False)
+    data = Column(Text, nullable=False)
+    created_at = Column(Float, nullable=False)
+
+class JobLease(Base):
+    """Model for a job lock (e.g. one analysis per consultation) held by one API node"""
+    __tablename__ = "job_leases"
+    
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(64), nullable=False)
+    expires_at = Column(Float, nullable=False)
@@ -0,0 +1,137 @@
+import cProfile
+import json
+import marshal
+import pstats
+import re
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import PROFILE_SUMMARY_LIMIT, PROFILES_KEEP
+from .stores import artifact_store
+
+PROFILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# cProfile cannot run two profilers at once in one process
+_profile_lock = threading.Lock()
+# Set while fn runs under profile_call, so work it would hand to other
+# processes can run in this thread where the profiler sees it
+_profiling: ContextVar[bool] = ContextVar("profiling", default=False)
+
+
+def is_profiling() -> bool:
+    """True inside a profile_call"""
+    return _profiling.get()
+
+
+def summarize_stats(stats: pstats.Stats, limit: int = PROFILE_SUMMARY_LIMIT) -> List[Dict[str, Any]]:
+    """Top functions by cumulative time"""
+    rows = []
+    for (filename, line, func), (cc, nc, tottime, cumtime, _callers) in stats.stats.items():
+        rows.append({
+            "function": func,
+            "file": filename,
+            "line": line,
+            "ncalls": nc,
+            "primitive_calls": cc,
+            "tottime": round(tottime, 6),
+            "cumtime": round(cumtime, 6)
+        })
+    rows.sort(key=lambda r: r["cumtime"], reverse=True)
+    return rows[:limit]
+
+
+def profile_key(profile_id: str, suffix: str) -> str:
+    """Artifact store key of a profile's .prof or .json"""
+    return f"profiles/{profile_id}{suffix}"
+
+
+def _summaries() -> List[Dict[str, Any]]:
+    """Stored profile summaries, newest first"""
+    summaries = []
+    for key in artifact_store.keys("profiles/"):
+        if not key.endswith(".json"):
+            continue
+        try:
+            summaries.append(json.loads(artifact_store.get(key)))
+        except (TypeError, ValueError):
+            # Deleted meanwhile, or not a summary
+            continue
+    summaries.sort(key=lambda s: s.get("started_at") or "", reverse=True)
+    return summaries
+
+
+def _prune_profiles(keep: int = PROFILES_KEEP) -> None:
+    for old in _summaries()[keep:]:
+        artifact_store.delete(profile_key(old["id"], ".json"))
+        artifact_store.delete(profile_key(old["id"], ".prof"))
+
+
+def profile_call(fn: Callable[[], Any], label: str) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """
+    Run fn under cProfile and store the .prof artifact plus a JSON summary
+    in the artifact store, where every API node can serve them.
+
+    Returns (fn result, profile info). If another profile is already running
+    the call is executed unprofiled and the info says so.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return fn(), {"error": "another profile is already running"}
+
+    try:
+        profiler = cProfile.Profile()
+        started = datetime.utcnow()
+        token = _profiling.set(True)
+        profiler.enable()
+        try:
+            result = fn()
+        finally:
+            profiler.disable()
+            _profiling.reset(token)
+    finally:
+        _profile_lock.release()
+
+    profile_id = f"{label}-{started.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    stats = pstats.Stats(profiler)
+    # The bytes Stats.dump_stats() would write to a .prof file
+    artifact_store.put(profile_key(profile_id, ".prof"), marshal.dumps(stats.stats))
+
+    summary = {
+        "id": profile_id,
+        "label": label,
+        "started_at": started.isoformat(),
+        "total_time": round(stats.total_tt, 6),
+        "functions": summarize_stats(stats)
+    }
+    artifact_store.put(profile_key(profile_id, ".json"), json.dumps(summary, indent=2).encode("utf-8"))
+    _prune_profiles()
+
+    return result, {
+        "id": profile_id,
+        "total_time": summary["total_time"],
+        "summary_url": f"/profiles/{profile_id}",
+        "download_url": f"/profiles/{profile_id}/download"
+    }
+
+
+def get_profile(profile_id: str, suffix: str) -> Optional[bytes]:
+    """A stored profile artifact, rejecting anything but plain ids"""
+    if not PROFILE_ID_PATTERN.match(profile_id or ""):
+        return None
+    return artifact_store.get(profile_key(profile_id, suffix))
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Stored profiles, newest first"""
+    return [
+        {
+            "id": summary["id"],
+            "label": summary.get("label"),
+            "started_at": summary.get("started_at"),
+            "total_time": summary.get("total_time"),
+            "summary_url": f"/profiles/{summary['id']}"
+        }
+        for summary in _summaries()
+    ]
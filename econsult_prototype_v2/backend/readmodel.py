@@ -0,0 +1,301 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from .config import (
+    READ_MODEL_ENABLED,
+    READ_MODEL_MAX_AGE_SECONDS,
+    READ_MODEL_LOAD_BATCH,
+    UNKNOWN_STAKEHOLDER
+)
+from .models import Comment, Prediction
+
+try:
+    import numpy as np
+except ImportError:  # every query falls back to the database
+    np = None
+
+# Label code of comments without a prediction
+UNANALYZED = -1
+# Code that no row has, for filter values never seen
+MISSING = -2
+UNKNOWN_LABEL = "UNKNOWN"
+
+DIMENSIONS = ("clause", "stakeholder", "label")
+# Group-bys with at most this many possible cells count into a dense array
+DENSE_GROUP_CELLS = 1 << 20
+
+
+class Interner:
+    """Dense integer codes for repeated strings"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def find(self, value: str) -> int:
+        return self.codes.get(value, MISSING)
+
+
+class ReadModel:
+    """
+    Struct-of-arrays copy of one consultation epoch's comments and labels.
+
+    Each comment is a row of NumPy arrays: id, clause, stakeholder and label
+    codes (strings are interned), score and creation time; a million rows
+    take about 40 MB. refresh() appends comments and applies predictions
+    with ids above those already loaded, so staying current costs a few
+    indexed range queries. Analysis rewrites predictions wholesale; when
+    the first loaded prediction is gone or replaced, labels are reloaded.
+    """
+
+    def __init__(self, consultation_id: int, epoch: int, capacity: int = 1024):
+        self.consultation_id = consultation_id
+        self.epoch = epoch
+        self.size = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.clauses = np.zeros(capacity, dtype=np.int32)
+        self.stakeholders = np.zeros(capacity, dtype=np.int32)
+        self.labels = np.full(capacity, UNANALYZED, dtype=np.int16)
+        self.scores = np.zeros(capacity, dtype=np.float64)
+        self.created = np.full(capacity, np.datetime64("NaT"), dtype="datetime64[us]")
+        self.interners = {dim: Interner() for dim in DIMENSIONS}
+        self.max_comment_id = 0
+        self.max_prediction_id = 0
+        # (id, created_at) of the oldest prediction, to notice rewrites
+        self.first_prediction: Optional[Tuple[int, Any]] = None
+        self.refreshed_at = 0.0
+        self.dirty = True
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.ids, self.clauses, self.stakeholders, self.labels, self.scores, self.created))
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self.ids)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name in ("ids", "clauses", "stakeholders", "labels", "scores", "created"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def refresh(self, db: Session, max_age: float = 0.0) -> None:
+        """Load what changed since the last refresh if marked dirty or older than max_age"""
+        with self._lock:
+            if not self.dirty and time.monotonic() - self.refreshed_at < max_age:
+                return
+            # Cleared first so a write during the refresh marks it again
+            self.dirty = False
+            self.refreshed_at = time.monotonic()
+            self._load_comments(db)
+            self._load_predictions(db)
+
+    def _load_comments(self, db: Session) -> None:
+        scope = and_(Comment.consultation_id == self.consultation_id, Comment.epoch == self.epoch)
+        while True:
+            rows = db.query(Comment.id, Comment.clause, Comment.stakeholder_type, Comment.created_at).filter(
+                scope, Comment.id > self.max_comment_id
+            ).order_by(Comment.id).limit(READ_MODEL_LOAD_BATCH).all()
+            if not rows:
+                return
+            ids, clauses, stakeholders, created = zip(*rows)
+            start, end = self.size, self.size + len(rows)
+            self._reserve(end)
+            clause_codes = self.interners["clause"]
+            stakeholder_codes = self.interners["stakeholder"]
+            self.ids[start:end] = ids
+            self.clauses[start:end] = [clause_codes.code(c or "overall") for c in clauses]
+            self.stakeholders[start:end] = [stakeholder_codes.code(s or UNKNOWN_STAKEHOLDER) for s in stakeholders]
+            self.labels[start:end] = UNANALYZED
+            self.scores[start:end] = 0.0
+            self.created[start:end] = np.array(created, dtype="datetime64[us]")
+            self.size = end
+            self.max_comment_id = ids[-1]
+            if len(rows) < READ_MODEL_LOAD_BATCH:
+                return
+
+    def _load_predictions(self, db: Session) -> None:
+        scope = and_(Prediction.consultation_id == self.consultation_id, Prediction.epoch == self.epoch)
+        first = db.query(Prediction.id, Prediction.created_at).filter(scope).order_by(Prediction.id).first()
+        first = tuple(first) if first is not None else None
+        if first != self.first_prediction:
+            # Predictions were rewritten or removed since they were loaded
+            self.labels[:self.size] = UNANALYZED
+            self.scores[:self.size] = 0.0
+            self.max_prediction_id = 0
+            self.first_prediction = first
+        if first is None:
+            return
+
+        label_codes = self.interners["label"]
+        while True:
+            rows = db.query(
+                Prediction.id, Prediction.comment_id, Prediction.sentiment, Prediction.sentiment_score
+            ).filter(
+                scope, Prediction.id > self.max_prediction_id
+            ).order_by(Prediction.id).limit(READ_MODEL_LOAD_BATCH).all()
+            if not rows:
+                return
+            prediction_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+            comment_ids = np.fromiter((r[1] or 0 for r in rows), dtype=np.int64, count=len(rows))
+            positions = np.searchsorted(self.ids[:self.size], comment_ids)
+            found = positions < self.size
+            found[found] = self.ids[positions[found]] == comment_ids[found]
+            # A prediction can be committed between loading comments and
+            # loading predictions; retry it once its comment is loaded
+            waiting = ~found & (comment_ids > self.max_comment_id)
+            keep = np.flatnonzero(found)
+            if waiting.any():
+                cutoff = prediction_ids[waiting].min()
+                keep = keep[prediction_ids[keep] < cutoff]
+            self.labels[positions[keep]] = [label_codes.code(rows[i][2] or UNKNOWN_LABEL) for i in keep]
+            self.scores[positions[keep]] = [rows[i][3] or 0.0 for i in keep]
+            if waiting.any():
+                self.max_prediction_id = int(cutoff) - 1
+                return
+            self.max_prediction_id = int(prediction_ids[-1])
+            if len(rows) < READ_MODEL_LOAD_BATCH:
+                return
+
+    def _column(self, dim: str):
+        return {"clause": self.clauses, "stakeholder": self.stakeholders, "label": self.labels}[dim][:self.size]
+
+    def _mask(
+        self,
+        filters: Optional[Dict[str, str]] = None,
+        analyzed: bool = False,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ):
+        mask = self.labels[:self.size] >= 0 if analyzed else np.ones(self.size, dtype=bool)
+        for dim, value in (filters or {}).items():
+            mask &= self._column(dim) == self.interners[dim].find(value)
+        if since is not None:
+            mask &= self.created[:self.size] >= np.datetime64(since, "us")
+        if until is not None:
+            mask &= self.created[:self.size] < np.datetime64(until, "us")
+        return mask
+
+    def group(self, dims: Sequence[str], filters: Optional[Dict[str, str]] = None) -> List[Tuple]:
+        """(dim values..., count, score sum) for each non-empty cell of analyzed comments"""
+        with self._lock:
+            mask = self._mask(filters, analyzed=True)
+            if not mask.any():
+                return []
+            # Views instead of copies when every comment is selected
+            rows = slice(None) if mask.all() else mask
+            key = np.zeros(int(mask.sum()), dtype=np.int64)
+            cards = [max(1, len(self.interners[dim].values)) for dim in dims]
+            for dim, card in zip(dims, cards):
+                key *= card
+                key += self._column(dim)[rows]
+            weights = self.scores[:self.size][rows]
+            space = int(np.prod(cards))
+            if space <= max(len(key), DENSE_GROUP_CELLS):
+                # Few enough possible cells to count them all directly
+                counts = np.bincount(key, minlength=space)
+                sums = np.bincount(key, weights=weights, minlength=space)
+                cells = np.flatnonzero(counts)
+                counts, sums = counts[cells], sums[cells]
+            else:
+                cells, inverse = np.unique(key, return_inverse=True)
+                counts = np.bincount(inverse)
+                sums = np.bincount(inverse, weights=weights)
+            columns = []
+            for dim, card in zip(reversed(dims), reversed(cards)):
+                values = self.interners[dim].values
+                columns.append([values[c] for c in (cells % card).tolist()])
+                cells = cells // card
+            columns.reverse()
+            return [
+                (*(column[i] for column in columns), int(counts[i]), float(sums[i]))
+                for i in range(len(counts))
+            ]
+
+    def count(
+        self,
+        filters: Optional[Dict[str, str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> int:
+        """Comments matching the filters; a label filter only matches analyzed comments"""
+        with self._lock:
+            return int(self._mask(filters, "label" in (filters or {}), since, until).sum())
+
+    def metrics(self) -> Dict[str, Any]:
+        """Same shape as AnalysisService.get_metrics()"""
+        overall: Dict[str, int] = {}
+        by_clause: Dict[str, Dict[str, int]] = {}
+        analyzed = 0
+        for clause, label, count, _score in self.group(["clause", "label"]):
+            overall[label] = overall.get(label, 0) + count
+            cell = by_clause.setdefault(clause, {"count": 0})
+            cell["count"] += count
+            cell[label] = count
+            analyzed += count
+        return {
+            "overall": overall,
+            "by_clause": by_clause,
+            "total": analyzed,
+            "total_comments": self.size,
+            "analyzed_comments": analyzed
+        }
+
+
+class ReadModelRegistry:
+    """One ReadModel per consultation, rebuilt when the consultation is cleared"""
+
+    def __init__(self, enabled: bool = READ_MODEL_ENABLED, max_age: float = READ_MODEL_MAX_AGE_SECONDS):
+        self.enabled = enabled and np is not None
+        self.max_age = max_age
+        self._models: Dict[int, ReadModel] = {}
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, consultation_id: int, epoch: int) -> Optional[ReadModel]:
+        """Current read model of a consultation, or None to query the database"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            model = self._models.get(consultation_id)
+            if model is not None and epoch < model.epoch:
+                return None  # a request that started before /clear
+            if model is None or model.epoch != epoch:
+                model = self._models[consultation_id] = ReadModel(consultation_id, epoch)
+        model.refresh(db, self.max_age)
+        return model
+
+    def invalidate(self, consultation_id: int) -> None:
+        """Make the next read pick up rows this process just committed"""
+        model = self._models.get(consultation_id)
+        if model is not None:
+            model.dirty = True
+
+    def observe_version(self, consultation_id: int, data_version: int) -> None:
+        """Refresh on the next read once any process has changed the consultation's data"""
+        if self._versions.get(consultation_id) != data_version:
+            self._versions[consultation_id] = data_version
+            self.invalidate(consultation_id)
+
+    def drop(self, consultation_id: int) -> None:
+        with self._lock:
+            self._models.pop(consultation_id, None)
+
+
+read_models = ReadModelRegistry()
@@ -0,0 +1,26 @@
+from typing import Any
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson when it is installed.
+
+    Routes returning large lists of plain dicts should return an instance of
+    this class directly: that skips FastAPI's jsonable_encoder pass over every
+    row, and orjson serializes the same output several times faster than the
+    stdlib encoder. Falls back to the standard JSONResponse rendering.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(
+            content,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
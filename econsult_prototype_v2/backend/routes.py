@@ -1,17 +1,107 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, Body, HTTPException
-from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, Form, Body, HTTPException, Header, Request
+from fastapi.responses import Response, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from pydantic import BaseModel, field_validator
+from typing import List, Dict, Any, Optional, Union
 import csv
 import io
-from datetime import datetime
+import math
+from datetime import datetime, timezone
 
 from .database import get_db
-from .services import CommentService, AnalysisService
-from .config import STATIC_DIR, WORDCLOUD_PATH
+from .services import (
+    CommentService,
+    AnalysisService,
+    TopicService,
+    ThreadService,
+    ReviewService,
+    ConsultationService,
+    AnalysisInProgressError,
+    purge_stale_data,
+    CUBE_DIMENSIONS,
+    CUBE_MEASURES
+)
+from .config import (
+    STATIC_DIR,
+    ANALYSIS_PROFILE,
+    SUMMARY_MAX_SENTENCES,
+    DEFAULT_CONSULTATION_ID,
+    WORDCLOUD_SIZES,
+    WORDCLOUD_FORMATS,
+    INGEST_MAX_REQUEST_COMMENTS,
+    INGEST_MAX_UPLOAD_BYTES,
+    INGEST_CLIENT_HEADER,
+    REVIEW_PAGE_MAX
+)
+from .responses import FastJSONResponse
+from .events import event_broker
+from .instrumentation import render_metrics
+from .profiling import profile_call, get_profile, list_profiles
+from .summarizer import SUMMARY_METHODS, summary_cache
+from .workers import WorkerPoolError
+from .ingestion import ingest_comments, IngestRejectedError
+from .httpcache import cached_response, data_tag
+from .readmodel import read_models
+from .utils import comment_from_csv_row, wordcloud_key, wordcloud_image, load_wordcloud_layout, render_wordcloud_svg
 
 router = APIRouter()
 
+class CommentIn(BaseModel):
+    """One comment of an /ingest_json body; unknown fields are ignored"""
+    text: str
+    clause: Optional[str] = None
+    stakeholder_type: Optional[str] = None
+    comment_id: Optional[Union[int, str]] = None
+    targets_comment_id: Optional[Union[int, str]] = None
+    created_at: Optional[datetime] = None
+    
+    @field_validator("created_at")
+    @classmethod
+    def naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored like the column default, datetime.utcnow()
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+def get_consultation_id(
+    request: Request, consultation_id: int = DEFAULT_CONSULTATION_ID, db: Session = Depends(get_db)
+) -> int:
+    """Resolve the consultation a request is scoped to"""
+    consultation = ConsultationService(db).get_consultation(consultation_id)
+    if consultation is None:
+        raise HTTPException(status_code=404, detail="Consultation not found")
+    request.state.data_tag = data_tag(consultation)
+    # A body cached under this version must not come from an older read model or summary
+    read_models.observe_version(consultation_id, consultation.data_version or 0)
+    summary_cache.observe_version(consultation_id, consultation.data_version or 0)
+    return consultation_id
+
+def _client_key(request: Request) -> str:
+    """Identity that ingestion rate limits apply to"""
+    if INGEST_CLIENT_HEADER:
+        value = request.headers.get(INGEST_CLIENT_HEADER)
+        if value:
+            return value.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def _ingest(request: Request, db: Session, cid: int, items: List[Dict[str, Any]]) -> List[int]:
+    """Hand comments to the ingestion queue; 413 when too many, 429 when the client must back off"""
+    if len(items) > INGEST_MAX_REQUEST_COMMENTS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {INGEST_MAX_REQUEST_COMMENTS} comments per request"
+        )
+    # Do not hold a pooled connection while waiting for the writer
+    db.close()
+    try:
+        ids = ingest_comments(cid, items, _client_key(request))
+    except IngestRejectedError as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    if ids:
+        event_broker.publish("comments", {"consultation_id": cid, "ids": ids, "count": len(ids)})
+    return ids
+
 @router.get("/", include_in_schema=False)
 def home():
     """Redirect root to UI dashboard"""
@@ -19,117 +109,380 @@ def home():
 
 @router.post("/ingest")
 def ingest_comment(
+    request: Request,
     text: str = Form(...), 
     clause: str = Form("overall"), 
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
 ):
     """Ingest a single comment"""
-    service = CommentService(db)
-    comment = service.create_comment(text, clause)
-    return {"ok": True, "id": comment.id}
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="text must not be empty")
+    ids = _ingest(request, db, cid, [{"text": text, "clause": clause}])
+    return {"ok": True, "id": ids[0]}
 
 @router.post("/ingest_json")
 def ingest_comments_json(
-    payload: List[Dict[str, str]] = Body(...), 
-    db: Session = Depends(get_db)
+    request: Request,
+    payload: List[CommentIn] = Body(...), 
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
 ):
     """Ingest multiple comments via JSON"""
-    service = CommentService(db)
-    ids = service.create_comments_bulk(payload)
+    ids = _ingest(request, db, cid, [item.model_dump() for item in payload])
     return {"ok": True, "ids": ids}
 
 @router.post("/upload_csv")
-def upload_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def upload_csv(
+    request: Request,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
     """Upload and process CSV file with comments"""
+    raw = file.file.read(INGEST_MAX_UPLOAD_BYTES + 1)
+    if len(raw) > INGEST_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"CSV uploads are limited to {INGEST_MAX_UPLOAD_BYTES} bytes")
     try:
-        content = file.file.read().decode("utf-8", errors="ignore")
+        content = raw.decode("utf-8", errors="ignore")
         reader = csv.DictReader(io.StringIO(content))
-        
-        comments_data = []
-        for row in reader:
-            text = row.get("Comment", "").strip()
-            clause = row.get("Clause", "overall") or "overall"
-            date_str = row.get("Date")
-            
-            if not text:
-                continue
-            
-            comment_data = {"text": text, "clause": clause}
-            
-            # Handle optional date
-            if date_str:
-                try:
-                    parsed_date = datetime.strptime(date_str.strip(), "%Y-%m-%d")
-                    comment_data["created_at"] = parsed_date
-                except ValueError:
-                    pass  # Use default date
-            
-            comments_data.append(comment_data)
-        
-        if not comments_data:
-            return {"ok": True, "ingested": 0}
-        
-        service = CommentService(db)
-        # For CSV upload, we need to handle dates differently
-        # This is a simplified version - in production you'd want to modify the service
-        ids = service.create_comments_bulk(comments_data)
-        return {"ok": True, "ingested": len(ids)}
-        
+        comments_data = [c for c in map(comment_from_csv_row, reader) if c is not None]
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"CSV processing error: {str(e)}")
+    
+    if not comments_data:
+        return {"ok": True, "ingested": 0}
+    
+    ids = _ingest(request, db, cid, comments_data)
+    return {"ok": True, "ingested": len(ids)}
 
 @router.post("/analyze")
-def analyze_comments(db: Session = Depends(get_db)):
-    """Run AI analysis on all comments"""
-    service = AnalysisService(db)
-    result = service.analyze_comments()
+def analyze_comments(profile: bool = False, db: Session = Depends(get_db), cid: int = Depends(get_consultation_id)):
+    """Run AI analysis on all comments, optionally under cProfile"""
+    service = AnalysisService(db, cid)
+    try:
+        if profile or ANALYSIS_PROFILE:
+            result, profile_info = profile_call(service.analyze_comments, label="analyze")
+            result["profile"] = profile_info
+        else:
+            result = service.analyze_comments()
+    except AnalysisInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except WorkerPoolError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    # Push the new aggregates once instead of every client re-querying them
+    event_broker.publish("metrics", {"consultation_id": cid, **service.get_metrics()})
+    event_broker.publish("analysis", {"consultation_id": cid, "status": "done", **result})
     return {"ok": True, **result}
 
 @router.get("/metrics")
-def get_metrics(db: Session = Depends(get_db)):
+def get_metrics(request: Request, db: Session = Depends(get_db), cid: int = Depends(get_consultation_id)):
     """Get analysis metrics and statistics"""
-    service = AnalysisService(db)
-    return service.get_metrics()
+    return cached_response(request, lambda: AnalysisService(db, cid).get_metrics())
+
+@router.get("/metrics/cube")
+def get_metrics_cube(
+    dims: str = "clause,stakeholder",
+    measure: str = "count",
+    clause: Optional[str] = None,
+    stakeholder: Optional[str] = None,
+    label: Optional[str] = None,
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
+    """Slice and dice precomputed counts by clause, stakeholder type and label"""
+    dim_list = [d.strip() for d in dims.split(",") if d.strip()]
+    unknown = [d for d in dim_list if d not in CUBE_DIMENSIONS]
+    if unknown or len(set(dim_list)) != len(dim_list):
+        raise HTTPException(status_code=400, detail=f"dims must be distinct values from {', '.join(CUBE_DIMENSIONS)}")
+    if measure not in CUBE_MEASURES:
+        raise HTTPException(status_code=400, detail=f"measure must be one of {', '.join(CUBE_MEASURES)}")
+    filters = {k: v for k, v in {"clause": clause, "stakeholder": stakeholder, "label": label}.items() if v}
+    service = AnalysisService(db, cid)
+    return service.query_cube(dim_list, measure, filters)
+
+@router.get("/metrics/internal", include_in_schema=False)
+def get_internal_metrics():
+    """Expose request, database and analysis timings in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@router.get("/profiles")
+def get_profiles():
+    """List stored analysis profiles"""
+    return {"items": list_profiles()}
+
+@router.get("/profiles/{profile_id}")
+def get_profile_summary(profile_id: str):
+    """Get the per-function summary of a stored profile"""
+    data = get_profile(profile_id, ".json")
+    if data is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(data, media_type="application/json")
+
+@router.get("/profiles/{profile_id}/download")
+def download_profile(profile_id: str):
+    """Download the raw cProfile artifact (open with pstats or snakeviz)"""
+    data = get_profile(profile_id, ".prof")
+    if data is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        data, media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'}
+    )
 
 @router.get("/comments")
-def get_comments(db: Session = Depends(get_db)):
-    """Get all comments with predictions"""
-    service = AnalysisService(db)
-    comments = service.get_comments_with_predictions()
-    return {"items": comments}
+def get_comments(
+    request: Request,
+    q: Optional[str] = None,
+    full: bool = False,
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
+    """List analyzed comments as slim rows with a text preview (full=true adds text, summary and keywords)"""
+    service = AnalysisService(db, cid)
+    if full:
+        return cached_response(request, lambda: {"items": service.get_comments_with_predictions(q)})
+    return cached_response(request, lambda: {"items": service.get_comment_rows(q)})
 
-@router.get("/wordcloud")
-def get_wordcloud_image():
-    """Get wordcloud image"""
-    if not WORDCLOUD_PATH.exists():
-        return JSONResponse(
-            {"error": "Run /analyze first to generate wordcloud.png"}, 
-            status_code=400
+@router.get("/comments/count")
+def count_comments(
+    clause: Optional[str] = None,
+    stakeholder: Optional[str] = None,
+    label: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
+    """Count comments by clause, stakeholder type, label and creation time"""
+    filters = {k: v for k, v in {"clause": clause, "stakeholder": stakeholder, "label": label}.items() if v}
+    service = AnalysisService(db, cid)
+    return {"filters": filters, "count": service.count_comments(filters, since, until)}
+
+# Declared after /comments/count, which would otherwise be read as a comment id
+@router.get("/comments/{comment_id}")
+def get_comment(
+    comment_id: int, request: Request, db: Session = Depends(get_db), cid: int = Depends(get_consultation_id)
+):
+    """Get one comment with its full text, prediction, summary and keywords"""
+    def build():
+        comment = AnalysisService(db, cid).get_comment(comment_id)
+        if comment is None:
+            raise HTTPException(status_code=404, detail="Comment not found")
+        return comment
+    return cached_response(request, build)
+
+@router.get("/summary")
+def get_summary(
+    clause: Optional[str] = None,
+    intent: Optional[str] = None,
+    max_sentences: int = SUMMARY_MAX_SENTENCES,
+    method: str = "tfidf",
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
+    """Get an extractive digest of comments for a clause and/or intent"""
+    if method not in SUMMARY_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(SUMMARY_METHODS)}")
+    service = AnalysisService(db, cid)
+    return service.summarize_scope(clause, intent, max(1, max_sentences), method)
+
+@router.get("/comments/{comment_id}/summary")
+def get_comment_summary(
+    comment_id: int,
+    max_sentences: int = SUMMARY_MAX_SENTENCES,
+    method: str = "tfidf",
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
+    """Get an extractive summary of a single comment"""
+    if method not in SUMMARY_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(SUMMARY_METHODS)}")
+    service = AnalysisService(db, cid)
+    result = service.summarize_comment(comment_id, max(1, max_sentences), method)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    return result
+
+@router.get("/topics")
+def get_topics(db: Session = Depends(get_db), cid: int = Depends(get_consultation_id)):
+    """Get topic clusters with sizes and top terms"""
+    service = TopicService(db, cid)
+    return {"items": service.get_topics()}
+
+@router.post("/topics/update")
+def update_topics(rebuild: bool = False, db: Session = Depends(get_db), cid: int = Depends(get_consultation_id)):
+    """Cluster comments not yet assigned to a topic, or rebuild from scratch"""
+    service = TopicService(db, cid)
+    return {"ok": True, **service.update_topics(rebuild=rebuild)}
+
+@router.get("/topics/{topic_id}/comments")
+def get_topic_comments(
+    topic_id: int,
+    limit: int = 50,
+    offset: int = 0,
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
+    """Get comments assigned to a topic, closest to its centroid first"""
+    service = TopicService(db, cid)
+    comments = service.get_topic_comments(topic_id, limit=min(max(limit, 1), 1000), offset=max(offset, 0))
+    return FastJSONResponse({"topic_id": topic_id, "items": comments, "count": len(comments)})
+
+@router.get("/threads/contested")
+def get_contested_threads(limit: int = 10, db: Session = Depends(get_db), cid: int = Depends(get_consultation_id)):
+    """Get the reply threads with the most evenly split agree/disagree replies"""
+    service = ThreadService(db, cid)
+    return {"items": service.get_contested_threads(limit=min(max(limit, 1), 100))}
+
+@router.get("/threads/{comment_id}")
+def get_thread(comment_id: int, db: Session = Depends(get_db), cid: int = Depends(get_consultation_id)):
+    """Get the reply thread containing a comment, with precomputed stats"""
+    service = ThreadService(db, cid)
+    thread = service.get_thread(comment_id)
+    if thread is None:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    return FastJSONResponse(thread)
+
+@router.get("/review")
+def get_review_queue(
+    limit: int = 50,
+    offset: int = 0,
+    label: Optional[str] = None,
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
+    """Get predictions awaiting review, least certain first"""
+    service = ReviewService(db, cid)
+    items = service.get_queue(limit=min(max(limit, 1), REVIEW_PAGE_MAX), offset=max(offset, 0), label=label)
+    return FastJSONResponse({"items": items, "pending": service.pending_count()})
+
+@router.get("/review/corrections")
+def get_corrections(
+    limit: int = 100,
+    offset: int = 0,
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
+    """Get analyst corrections, newest first"""
+    service = ReviewService(db, cid)
+    items = service.list_corrections(limit=min(max(limit, 1), REVIEW_PAGE_MAX), offset=max(offset, 0))
+    return FastJSONResponse({"items": items})
+
+@router.post("/review/{comment_id}")
+def correct_prediction(
+    comment_id: int,
+    payload: Dict[str, Any] = Body(...),
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
+    """Record the correct label for a comment and take it off the review queue"""
+    service = ReviewService(db, cid)
+    try:
+        correction = service.correct(
+            comment_id, str(payload.get("label") or ""), payload.get("note"), payload.get("reviewer")
         )
-    return FileResponse(WORDCLOUD_PATH, media_type="image/png")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if correction is None:
+        raise HTTPException(status_code=404, detail="Comment has no prediction")
+    return {"ok": True, **correction}
+
+@router.get("/wordcloud")
+def get_wordcloud_image(
+    request: Request, size: str = "full", format: str = "png", cid: int = Depends(get_consultation_id)
+):
+    """Get wordcloud image as PNG, WebP or SVG; size is one of full, medium, thumb"""
+    if size not in WORDCLOUD_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {', '.join(WORDCLOUD_SIZES)}")
+    if format not in WORDCLOUD_FORMATS + ("svg",):
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(WORDCLOUD_FORMATS)}, svg")
+    return cached_response(request, lambda: _wordcloud_image(cid, size, format))
+
+def _wordcloud_image(cid: int, size: str, format: str) -> Response:
+    if format == "svg":
+        # Vector output scales itself, so every size is drawn from the full layout
+        layout = load_wordcloud_layout(wordcloud_key(cid, fmt="json"))
+        if layout is not None:
+            return Response(render_wordcloud_svg(layout), media_type="image/svg+xml")
+    else:
+        image = wordcloud_image(cid, size, format)
+        if image is not None:
+            return Response(image, media_type=f"image/{format}")
+    return JSONResponse(
+        {"error": "Run /analyze first to generate wordcloud.png"}, 
+        status_code=400
+    )
 
 @router.get("/wordcloud_map")
-def get_wordcloud_map(db: Session = Depends(get_db)):
+def get_wordcloud_map(request: Request, db: Session = Depends(get_db), cid: int = Depends(get_consultation_id)):
     """Get wordcloud layout data for interactive visualization"""
     try:
-        service = AnalysisService(db)
-        return service.get_wordcloud_data()
+        return cached_response(request, lambda: AnalysisService(db, cid).get_wordcloud_data())
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
 @router.get("/comments_by_keyword")
-def get_comments_by_keyword(word: str, db: Session = Depends(get_db)):
+def get_comments_by_keyword(word: str, db: Session = Depends(get_db), cid: int = Depends(get_consultation_id)):
     """Get comments filtered by keyword"""
     if not word or not word.strip():
-        return {"items": [], "word": word, "count": 0}
+        return FastJSONResponse({"items": [], "word": word, "count": 0})
     
-    service = CommentService(db)
+    service = CommentService(db, cid)
     comments = service.get_comments_by_keyword(word.strip())
-    return {"items": comments, "word": word, "count": len(comments)}
+    return FastJSONResponse({"items": comments, "word": word, "count": len(comments)})
 
 @router.post("/clear")
-def clear_all_data(db: Session = Depends(get_db)):
-    """Clear all comments and predictions"""
-    service = CommentService(db)
+def clear_all_data(
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    cid: int = Depends(get_consultation_id)
+):
+    """Clear all comments and predictions; old rows are purged after the response"""
+    service = CommentService(db, cid)
     service.clear_all_data()
+    background_tasks.add_task(purge_stale_data, [cid])
+    event_broker.publish("clear", {"consultation_id": cid})
     return {"ok": True, "message": "All comments and predictions cleared."}
+
+@router.get("/consultations")
+def list_consultations(db: Session = Depends(get_db)):
+    """List consultations with their comment counts"""
+    service = ConsultationService(db)
+    return {"items": service.list_consultations()}
+
+@router.post("/consultations")
+def create_consultation(payload: Dict[str, Any] = Body(...), db: Session = Depends(get_db)):
+    """Create a consultation; its id scopes every other endpoint via ?consultation_id="""
+    name = str(payload.get("name") or "").strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="name is required")
+    service = ConsultationService(db)
+    consultation = service.create_consultation(name, payload.get("description"))
+    return {"ok": True, "id": consultation.id, "name": consultation.name}
+
+@router.delete("/consultations/{consultation_id}")
+def delete_consultation(consultation_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """Delete a consultation and all of its comments and analysis"""
+    if consultation_id == DEFAULT_CONSULTATION_ID:
+        raise HTTPException(status_code=400, detail="The default consultation cannot be deleted")
+    service = ConsultationService(db)
+    if service.get_consultation(consultation_id) is None:
+        raise HTTPException(status_code=404, detail="Consultation not found")
+    service.delete_consultation(consultation_id)
+    background_tasks.add_task(purge_stale_data, [consultation_id])
+    event_broker.publish("clear", {"consultation_id": consultation_id})
+    return {"ok": True}
+
+@router.get("/events")
+def stream_events(last_event_id: Optional[str] = Header(None)):
+    """Stream incremental dashboard updates as Server-Sent Events"""
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        resume_from = None
+    return StreamingResponse(
+        event_broker.subscribe(resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,72 +1,193 @@
-from typing import List, Dict, Any, Optional
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
-from .models import Comment, Prediction
+from sqlalchemy import func, case, and_
+from .models import (
+    Consultation, Comment, Prediction, Correction, CommentTopic, CommentThread, ThreadStats, MetricCube
+)
+from .config import (
+    ANALYSIS_PROGRESS_EVERY,
+    COMMENT_PREVIEW_CHARS,
+    SUMMARY_MAX_SENTENCES,
+    TOPICS_BATCH_SIZE,
+    UNKNOWN_STAKEHOLDER,
+    DEFAULT_CONSULTATION_ID,
+    PURGE_BATCH_SIZE,
+    PURGE_PAUSE_SECONDS,
+    REVIEW_CONFIDENCE_THRESHOLD,
+    REVIEW_MARGIN_THRESHOLD,
+    INTENT_COLORS,
+    WORDCLOUD_WIDTH,
+    WORDCLOUD_HEIGHT
+)
+from .database import SessionLocal, vacuum_incremental
+from .events import event_broker
+from .readmodel import read_models
+from .stores import Lease, job_locks
+from .instrumentation import StageTimer
+from .profiling import is_profiling
+from .summarizer import summarize_texts, summary_cache
+from .topics import get_topic_model, save_topic_model, reset_topic_model, topic_model_lock
+from .threads import compute_thread_layout, contested_score
+from .workers import analysis_pool
 from .utils import (
     redact_pii, 
-    simple_summarize, 
-    classify_intent, 
-    classify_sentiment,
     extract_keywords,
+    delete_wordcloud,
     generate_wordcloud,
-    get_wordcloud_layout
+    get_wordcloud_layout,
+    load_wordcloud_layout,
+    layout_words,
+    wordcloud_key
 )
 import json
-try:
-    import yake
-except ImportError:
-    yake = None
 
-class CommentService:
-    """Service for managing comments and predictions"""
+logger = logging.getLogger(__name__)
+
+# Dimensions of the metric cube as exposed by /metrics/cube
+CUBE_DIMENSIONS = {
+    "clause": MetricCube.clause,
+    "stakeholder": MetricCube.stakeholder,
+    "label": MetricCube.label
+}
+CUBE_MEASURES = ("count", "avg_score", "share")
+
+class AnalysisInProgressError(RuntimeError):
+    """Raised when a consultation is already being analyzed"""
+
+# Stay well under SQLite's bound-parameter limit in IN (...) clauses
+IN_CLAUSE_CHUNK = 900
+
+def _chunks(items: List[Any], size: int = IN_CLAUSE_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _optional_id(value: Any) -> Optional[str]:
+    """Normalize a dataset comment id (int, float-like or string) to text"""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if text.endswith(".0") and text[:-2].isdigit():
+        text = text[:-2]
+    return text or None
+
+def review_priority(score: float, margin: float) -> Optional[float]:
+    """Queue position of an uncertain prediction (smallest margin first), or None"""
+    if score < REVIEW_CONFIDENCE_THRESHOLD or margin < REVIEW_MARGIN_THRESHOLD:
+        return round(margin, 6)
+    return None
+
+class ScopedService:
+    """Base for services that read and write the current epoch of one consultation"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, consultation_id: int = DEFAULT_CONSULTATION_ID):
         self.db = db
+        self.consultation_id = consultation_id
+        self.epoch = current_epoch(db, consultation_id)
+    
+    def _scope(self, model):
+        """Filter clause selecting this consultation's live rows of a table"""
+        return and_(model.consultation_id == self.consultation_id, model.epoch == self.epoch)
+
+def current_epoch(db: Session, consultation_id: int) -> int:
+    return db.query(Consultation.epoch).filter(Consultation.id == consultation_id).scalar() or 0
+
+def bump_data_version(db: Session, consultation_id: int) -> None:
+    """Mark the consultation's data as changed; commits with the caller's transaction"""
+    db.query(Consultation).filter(Consultation.id == consultation_id).update(
+        {Consultation.data_version: func.coalesce(Consultation.data_version, 0) + 1}, synchronize_session=False
+    )
+
+class CommentService(ScopedService):
+    """Service for managing comments and predictions"""
     
     def create_comment(self, text: str, clause: str = "overall") -> Comment:
         """Create a new comment with PII redaction"""
         redacted_text = redact_pii(text)
-        comment = Comment(text=redacted_text, clause=clause or "overall")
+        comment = Comment(
+            text=redacted_text,
+            clause=clause or "overall",
+            consultation_id=self.consultation_id,
+            epoch=self.epoch
+        )
         self.db.add(comment)
+        bump_data_version(self.db, self.consultation_id)
         self.db.commit()
+        read_models.invalidate(self.consultation_id)
         self.db.refresh(comment)
         return comment
     
-    def create_comments_bulk(self, comments_data: List[Dict[str, str]]) -> List[int]:
+    def create_comments_bulk(self, comments_data: List[Dict[str, Any]]) -> List[int]:
         """Create multiple comments in bulk"""
+        ids, threaded = self.stage_comments(comments_data)
+        if not ids:
+            return []
+        self.db.commit()
+        read_models.invalidate(self.consultation_id)
+        
+        if threaded:
+            ThreadService(self.db, self.consultation_id).index_comments(ids)
+        
+        return ids
+    
+    def stage_comments(self, comments_data: List[Dict[str, Any]]) -> Tuple[List[int], bool]:
+        """
+        Insert comments without committing, so a caller can commit several
+        batches at once. Returns the new ids and whether any is a reply.
+        """
         comments = []
+        threaded = False
         for item in comments_data:
-            text = item.get("text", "").strip()
+            text = (item.get("text") or "").strip()
             clause = item.get("clause", "overall") or "overall"
             if not text:
                 continue
-            comments.append(Comment(text=redact_pii(text), clause=clause))
+            comment = Comment(
+                consultation_id=self.consultation_id,
+                epoch=self.epoch,
+                text=redact_pii(text),
+                clause=clause,
+                external_id=_optional_id(item.get("comment_id")),
+                parent_external_id=_optional_id(item.get("targets_comment_id")),
+                stakeholder_type=(item.get("stakeholder_type") or "").strip() or None
+            )
+            if item.get("created_at"):
+                comment.created_at = item["created_at"]
+            threaded = threaded or bool(comment.external_id or comment.parent_external_id)
+            comments.append(comment)
         
         if not comments:
-            return []
+            return [], False
         
-        self.db.bulk_save_objects(comments)
-        self.db.commit()
-        
-        # Get the created comment IDs
-        n = len(comments)
-        rows = self.db.query(Comment).order_by(Comment.id.desc()).limit(n).all()
-        return [r.id for r in reversed(rows)]
+        # Batched INSERT ... RETURNING gives each comment its own id, which
+        # stays correct while other consultations ingest concurrently
+        self.db.add_all(comments)
+        self.db.flush()
+        bump_data_version(self.db, self.consultation_id)
+        return [c.id for c in comments], threaded
     
     def get_all_comments(self) -> List[Comment]:
         """Get all comments"""
-        return self.db.query(Comment).all()
+        return self.db.query(Comment).filter(self._scope(Comment)).all()
     
     def get_comments_by_keyword(self, keyword: str) -> List[Dict[str, Any]]:
         """Get comments filtered by keyword"""
         keyword_lower = keyword.lower()
-        predictions = self.db.query(Prediction).all()
+        # One join; matching stays in Python, where lower() folds non-ASCII
+        # text and the JSON-escaped keywords are decoded
+        rows = (
+            self.db.query(Comment, Prediction)
+            .join(Prediction, Prediction.comment_id == Comment.id)
+            .filter(self._scope(Prediction), self._scope(Comment))
+            .order_by(Comment.id)
+            .all()
+        )
         results = []
         
-        for pred in predictions:
-            comment = self.db.query(Comment).filter(Comment.id == pred.comment_id).first()
-            if not comment:
-                continue
-            
+        for comment, pred in rows:
             text = comment.text or ""
             try:
                 keywords = json.loads(pred.keywords_json or "[]")
@@ -89,71 +210,136 @@ class CommentService:
         return results
     
     def clear_all_data(self) -> None:
-        """Clear all comments and predictions"""
-        self.db.query(Prediction).delete()
-        self.db.query(Comment).delete()
+        """
+        Clear all comments and predictions of the consultation.
+        
+        Moving the consultation to a new epoch hides the old rows at once;
+        purge_stale_data() deletes them later in small batches.
+        """
+        self.db.query(Consultation).filter(Consultation.id == self.consultation_id).update(
+            {
+                Consultation.epoch: func.coalesce(Consultation.epoch, 0) + 1,
+                Consultation.data_version: func.coalesce(Consultation.data_version, 0) + 1
+            },
+            synchronize_session=False
+        )
         self.db.commit()
+        self.epoch = current_epoch(self.db, self.consultation_id)
+        summary_cache.invalidate(self.consultation_id)
+        read_models.drop(self.consultation_id)
+        reset_topic_model(self.consultation_id)
+        delete_wordcloud(self.consultation_id)
 
-class AnalysisService:
+class AnalysisService(ScopedService):
     """Service for AI analysis and predictions"""
     
-    def __init__(self, db: Session):
-        self.db = db
-    
     def analyze_comments(self) -> Dict[str, Any]:
-        """Run AI analysis on all comments - Updated"""
-        comments = self.db.query(Comment).all()
+        """Run AI analysis on all comments of the consultation"""
+        # One analysis run at a time per consultation, on any node; different consultations run concurrently
+        lease = job_locks.acquire(f"analysis:{self.consultation_id}")
+        if lease is None:
+            raise AnalysisInProgressError(f"Consultation {self.consultation_id} is already being analyzed")
+        with lease:
+            return self._analyze_comments(lease)
+    
+    def _analyze_comments(self, lease: Lease) -> Dict[str, Any]:
+        cid = self.consultation_id
+        timer = StageTimer()
+        with timer.stage("load"):
+            comments = self.db.query(Comment).filter(self._scope(Comment)).all()
+            # Comments an analyst already labelled stay out of the review queue
+            corrected = {r[0] for r in self.db.query(Correction.comment_id).filter(self._scope(Correction)).all()}
+            
+            # Clear existing predictions
+            self.db.query(Prediction).filter(self._scope(Prediction)).delete(synchronize_session=False)
+            bump_data_version(self.db, cid)
+            self.db.commit()
         
-        # Clear existing predictions
-        self.db.query(Prediction).delete()
-        self.db.commit()
+        total = len(comments)
+        event_broker.publish("analysis", {"consultation_id": cid, "status": "running", "processed": 0, "total": total})
         
-        texts = []
-        for comment in comments:
-            # Classify intent
-            intent_label, intent_score = classify_intent(comment.text)
-            
-            # Generate summary
-            summary = simple_summarize(comment.text)
-            
-            # Extract keywords
-            if yake is not None:
-                try:
-                    kw_extractor = yake.KeywordExtractor(lan="en", n=1, top=5)
-                    keywords = kw_extractor.extract_keywords(comment.text or "")
-                    keywords_json = json.dumps([k for k, s in keywords])
-                except Exception as e:
-                    # Fallback to simple keyword extraction
-                    keywords = extract_keywords([comment.text or ""], topk=5)
-                    keywords_json = json.dumps([k for k, s in keywords])
-            else:
-                # Use simple keyword extraction if yake is not available
-                keywords = extract_keywords([comment.text or ""], topk=5)
-                keywords_json = json.dumps([k for k, s in keywords])
-            
-            # Create prediction record
-            prediction = Prediction(
-                comment_id=comment.id,
-                sentiment=intent_label,
-                sentiment_score=intent_score,
-                summary=summary,
-                keywords_json=keywords_json,
-                clause=comment.clause
-            )
-            self.db.add(prediction)
-            texts.append(comment.text or "")
+        # Inference runs in worker processes; rows stream back per chunk
+        by_id = {comment.id: comment for comment in comments}
+        texts = [comment.text or "" for comment in comments]
+        cube: Dict[tuple, List[float]] = {}
+        processed = 0
+        with timer.stage("inference"):
+            # A profiled run analyzes in this thread; the profiler does not see worker processes
+            items = [(comment.id, comment.text or "") for comment in comments]
+            for rows, timings in analysis_pool.run(items, inline=is_profiling()):
+                timer.add(timings)
+                for row in rows:
+                    comment = by_id[row.pop("comment_id")]
+                    self.db.add(Prediction(
+                        consultation_id=cid,
+                        epoch=self.epoch,
+                        comment_id=comment.id,
+                        clause=comment.clause,
+                        review_priority=(
+                            None if comment.id in corrected
+                            else review_priority(row["sentiment_score"], row["margin"])
+                        ),
+                        **row
+                    ))
+                    
+                    cell = cube.setdefault(
+                        (comment.clause, comment.stakeholder_type or UNKNOWN_STAKEHOLDER, row["sentiment"]), [0, 0.0]
+                    )
+                    cell[0] += 1
+                    cell[1] += row["sentiment_score"]
+                
+                lease.renew()
+                previous, processed = processed, processed + len(rows)
+                if processed // ANALYSIS_PROGRESS_EVERY > previous // ANALYSIS_PROGRESS_EVERY:
+                    event_broker.publish("analysis", {
+                        "consultation_id": cid, "status": "running", "processed": processed, "total": total
+                    })
         
-        self.db.commit()
+        with timer.stage("commit"):
+            # Predictions are rewritten wholesale, so the cube is replaced with them
+            self.db.query(MetricCube).filter(self._scope(MetricCube)).delete(synchronize_session=False)
+            self.db.bulk_insert_mappings(MetricCube, [
+                {
+                    "consultation_id": cid,
+                    "epoch": self.epoch,
+                    "clause": clause,
+                    "stakeholder": stakeholder,
+                    "label": label,
+                    "count": n,
+                    "score_sum": score
+                }
+                for (clause, stakeholder, label), (n, score) in cube.items()
+            ])
+            bump_data_version(self.db, cid)
+            self.db.commit()
+        summary_cache.invalidate(cid)
+        read_models.invalidate(cid)
+        
+        # Agree/disagree ratios per thread depend on the new labels
+        with timer.stage("threads"):
+            ThreadService(self.db, cid).refresh_thread_stats()
+        
+        # Absorb comments not yet clustered into the topic model
+        with timer.stage("topics"):
+            TopicService(self.db, cid).update_topics()
         
         # Generate wordcloud
-        freqs = extract_keywords(texts, topk=30)
-        generate_wordcloud(freqs)
+        with timer.stage("wordcloud"):
+            freqs = extract_keywords(texts, topk=30)
+            generate_wordcloud(freqs, cid)
+        # The word cloud files changed outside the database
+        bump_data_version(self.db, cid)
+        self.db.commit()
         
-        return {"processed": len(texts)}
+        return {"processed": len(texts), "timings": timer.observe()}
     
     def get_metrics(self) -> Dict[str, Any]:
         """Get analysis metrics and statistics"""
-        predictions = self.db.query(Prediction).all()
+        model = read_models.get(self.db, self.consultation_id, self.epoch)
+        if model is not None:
+            return model.metrics()
+        
+        predictions = self.db.query(Prediction).filter(self._scope(Prediction)).all()
         summary = {}
         by_clause = {}
         
@@ -169,46 +355,696 @@ class AnalysisService:
         return {
             "overall": summary,
             "by_clause": by_clause,
-            "total": len(predictions)
+            "total": len(predictions),
+            "total_comments": self.db.query(Comment).filter(self._scope(Comment)).count(),
+            "analyzed_comments": len(predictions)
         }
     
-    def get_comments_with_predictions(self) -> List[Dict[str, Any]]:
-        """Get all comments with their AI predictions"""
-        predictions = self.db.query(Prediction).all()
-        results = []
+    def query_cube(
+        self,
+        dims: List[str],
+        measure: str = "count",
+        filters: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Slice and dice the clause x stakeholder x label cube"""
+        model = read_models.get(self.db, self.consultation_id, self.epoch)
+        if model is not None:
+            rows = model.group(dims, filters)
+        else:
+            columns = [CUBE_DIMENSIONS[d] for d in dims]
+            query = self.db.query(*columns, func.sum(MetricCube.count), func.sum(MetricCube.score_sum)).filter(
+                self._scope(MetricCube)
+            )
+            for dim, value in (filters or {}).items():
+                query = query.filter(CUBE_DIMENSIONS[dim] == value)
+            if columns:
+                query = query.group_by(*columns)
+            rows = query.all()
         
-        for pred in predictions:
-            comment = self.db.query(Comment).filter(Comment.id == pred.comment_id).first()
-            if not comment:
+        total = sum(row[-2] or 0 for row in rows)
+        cells = []
+        for row in rows:
+            count, score_sum = row[-2] or 0, row[-1] or 0.0
+            if not count:
                 continue
-            
-            try:
-                keywords = json.loads(pred.keywords_json or "[]")
-            except Exception:
-                keywords = []
-            
-            results.append({
-                "id": comment.id,
-                "text": comment.text,
-                "clause": comment.clause,
-                "sentiment": pred.sentiment,
-                "score": round(pred.sentiment_score, 3),
-                "summary": pred.summary,
-                "keywords": keywords,
-                "created_at": comment.created_at.isoformat()
-            })
+            if measure == "avg_score":
+                value = round(score_sum / count, 4)
+            elif measure == "share":
+                value = round(count / total, 4) if total else 0.0
+            else:
+                value = count
+            cells.append({**dict(zip(dims, row[:len(dims)])), "count": count, "value": value})
+        cells.sort(key=lambda c: -c["count"])
+        return {"dims": dims, "measure": measure, "filters": filters or {}, "total": total, "cells": cells}
+    
+    def count_comments(
+        self,
+        filters: Optional[Dict[str, str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> int:
+        """Count comments by clause, stakeholder, label and creation time (since inclusive, until exclusive)"""
+        filters = filters or {}
+        # Stored timestamps are naive UTC
+        since, until = (
+            d.astimezone(timezone.utc).replace(tzinfo=None) if d is not None and d.tzinfo else d
+            for d in (since, until)
+        )
+        model = read_models.get(self.db, self.consultation_id, self.epoch)
+        if model is not None:
+            return model.count(filters, since, until)
         
-        return results
+        query = self.db.query(func.count(Comment.id)).filter(self._scope(Comment))
+        if "clause" in filters:
+            query = query.filter(Comment.clause == filters["clause"])
+        if "stakeholder" in filters:
+            stakeholder = filters["stakeholder"]
+            query = query.filter(
+                Comment.stakeholder_type.is_(None) | (Comment.stakeholder_type == "")
+                if stakeholder == UNKNOWN_STAKEHOLDER else Comment.stakeholder_type == stakeholder
+            )
+        if "label" in filters:
+            query = query.join(Prediction, Prediction.comment_id == Comment.id).filter(
+                self._scope(Prediction), Prediction.sentiment == filters["label"]
+            )
+        if since is not None:
+            query = query.filter(Comment.created_at >= since)
+        if until is not None:
+            query = query.filter(Comment.created_at < until)
+        return query.scalar() or 0
+    
+    def get_comments_with_predictions(self, q: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get all analyzed comments with their full text and analysis"""
+        query = self._analyzed(self.db.query(Comment, Prediction), q)
+        return [self._comment_dict(comment, pred) for comment, pred in query.order_by(Comment.id).all()]
+    
+    def get_comment_rows(self, q: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Slim rows of analyzed comments for the list; q matches anywhere in the text"""
+        # Only the preview's characters leave the database
+        preview = func.substr(Comment.text, 1, COMMENT_PREVIEW_CHARS + 1)
+        query = self._analyzed(
+            self.db.query(Comment.id, Comment.clause, preview, Prediction.sentiment, Prediction.sentiment_score), q
+        )
+        return [
+            {
+                "id": comment_id,
+                "clause": clause,
+                "sentiment": sentiment,
+                "score": round(score, 3),
+                "preview": text if len(text) <= COMMENT_PREVIEW_CHARS else text[:COMMENT_PREVIEW_CHARS].rstrip() + "…"
+            }
+            for comment_id, clause, text, sentiment, score in query.order_by(Comment.id).all()
+        ]
+    
+    def get_comment(self, comment_id: int) -> Optional[Dict[str, Any]]:
+        """One comment with its full text and analysis, or None if it is not in the consultation"""
+        row = (
+            self.db.query(Comment, Prediction)
+            .outerjoin(Prediction, and_(Prediction.comment_id == Comment.id, self._scope(Prediction)))
+            .filter(self._scope(Comment), Comment.id == comment_id)
+            .first()
+        )
+        if row is None:
+            return None
+        comment, pred = row
+        return {**self._comment_dict(comment, pred), "stakeholder_type": comment.stakeholder_type}
+    
+    def _analyzed(self, query, q: Optional[str]):
+        query = query.join(Prediction, Prediction.comment_id == Comment.id).filter(self._scope(Prediction))
+        if q:
+            query = query.filter(Comment.text.icontains(q, autoescape=True))
+        return query
+    
+    def _comment_dict(self, comment: Comment, pred: Optional[Prediction]) -> Dict[str, Any]:
+        try:
+            keywords = json.loads(pred.keywords_json or "[]") if pred else []
+        except Exception:
+            keywords = []
+        return {
+            "id": comment.id,
+            "text": comment.text,
+            "clause": comment.clause,
+            "sentiment": pred.sentiment if pred else None,
+            "score": round(pred.sentiment_score, 3) if pred else None,
+            "summary": pred.summary if pred else None,
+            "keywords": keywords,
+            "created_at": comment.created_at.isoformat()
+        }
+    
+    def summarize_scope(
+        self,
+        clause: Optional[str] = None,
+        intent: Optional[str] = None,
+        max_sentences: int = SUMMARY_MAX_SENTENCES,
+        method: str = "tfidf"
+    ) -> Dict[str, Any]:
+        """Extractive digest of all analyzed comments for a clause and/or intent"""
+        key = (self.consultation_id, clause, intent, max_sentences, method)
+        cached = summary_cache.get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+        
+        query = self.db.query(Comment.id, Comment.text).join(
+            Prediction, Prediction.comment_id == Comment.id
+        ).filter(self._scope(Comment))
+        if clause:
+            query = query.filter(Comment.clause == clause)
+        if intent:
+            query = query.filter(Prediction.sentiment == intent)
+        rows = query.all()
+        
+        sentences = summarize_texts(
+            [r.text or "" for r in rows],
+            max_sentences=max_sentences,
+            method=method,
+            ids=[r.id for r in rows]
+        )
+        result = {
+            "clause": clause,
+            "intent": intent,
+            "method": method,
+            "comments": len(rows),
+            "summary": " ".join(s["text"] for s in sentences),
+            "sentences": sentences
+        }
+        summary_cache.set(key, result)
+        return {**result, "cached": False}
+    
+    def summarize_comment(
+        self,
+        comment_id: int,
+        max_sentences: int = SUMMARY_MAX_SENTENCES,
+        method: str = "tfidf"
+    ) -> Optional[Dict[str, Any]]:
+        """Extractive summary of a single comment"""
+        comment = self.db.query(Comment).filter(
+            Comment.id == comment_id, self._scope(Comment)
+        ).first()
+        if not comment:
+            return None
+        sentences = summarize_texts(
+            [comment.text or ""],
+            max_sentences=max_sentences,
+            method=method,
+            ids=[comment.id],
+            in_order=True
+        )
+        return {
+            "id": comment.id,
+            "method": method,
+            "summary": " ".join(s["text"] for s in sentences),
+            "sentences": sentences
+        }
     
     def get_wordcloud_data(self) -> Dict[str, Any]:
         """Get wordcloud layout data for interactive visualization"""
-        comments = self.db.query(Comment).all()
+        # Reuse the layout /analyze drew the images from
+        layout = load_wordcloud_layout(wordcloud_key(self.consultation_id, fmt="json"))
+        if layout is not None:
+            return {"width": layout["width"], "height": layout["height"], "words": layout_words(layout)}
+        
+        comments = self.db.query(Comment).filter(self._scope(Comment)).all()
         texts = [(c.text or "") for c in comments]
         freqs = extract_keywords(texts, topk=30)
         words = get_wordcloud_layout(freqs)
         
         return {
-            "width": 900,
-            "height": 500,
+            "width": WORDCLOUD_WIDTH,
+            "height": WORDCLOUD_HEIGHT,
             "words": words
         }
+
+class ReviewService(ScopedService):
+    """Service for the queue of uncertain predictions and analyst corrections"""
+    
+    def get_queue(self, limit: int = 50, offset: int = 0, label: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Queued predictions, least certain first"""
+        # Walks ix_predictions_review_queue in order; no sort over all predictions
+        query = (
+            self.db.query(Prediction, Comment.text)
+            .join(Comment, Comment.id == Prediction.comment_id)
+            .filter(self._scope(Prediction), Prediction.review_priority.isnot(None))
+        )
+        if label:
+            query = query.filter(Prediction.sentiment == label)
+        rows = query.order_by(Prediction.review_priority, Prediction.id).offset(offset).limit(limit).all()
+        return [
+            {
+                "id": pred.comment_id,
+                "text": text,
+                "clause": pred.clause,
+                "sentiment": pred.sentiment,
+                "score": round(pred.sentiment_score or 0.0, 3),
+                "margin": round(pred.margin or 0.0, 3),
+                "summary": pred.summary
+            }
+            for pred, text in rows
+        ]
+    
+    def pending_count(self) -> int:
+        return self.db.query(func.count(Prediction.id)).filter(
+            self._scope(Prediction), Prediction.review_priority.isnot(None)
+        ).scalar() or 0
+    
+    def correct(
+        self,
+        comment_id: int,
+        label: str,
+        note: Optional[str] = None,
+        reviewer: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Record the right label for a comment and take it off the queue; None if it has no prediction"""
+        if label not in INTENT_COLORS:
+            raise ValueError(f"Unknown label {label!r}; use one of {', '.join(INTENT_COLORS)}")
+        row = (
+            self.db.query(Prediction, Comment.text)
+            .join(Comment, Comment.id == Prediction.comment_id)
+            .filter(self._scope(Prediction), Prediction.comment_id == comment_id)
+            .first()
+        )
+        if row is None:
+            return None
+        pred, text = row
+        
+        correction = self.db.query(Correction).filter(
+            self._scope(Correction), Correction.comment_id == comment_id
+        ).first()
+        if correction is None:
+            correction = Correction(consultation_id=self.consultation_id, epoch=self.epoch, comment_id=comment_id)
+            self.db.add(correction)
+        correction.text = text or ""
+        correction.predicted_label = pred.sentiment
+        correction.predicted_score = pred.sentiment_score
+        correction.label = label
+        correction.note = note
+        correction.reviewer = reviewer
+        correction.created_at = datetime.utcnow()
+        pred.review_priority = None
+        self.db.commit()
+        return self._correction_dict(correction)
+    
+    def list_corrections(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        corrections = (
+            self.db.query(Correction)
+            .filter(self._scope(Correction))
+            .order_by(Correction.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        return [self._correction_dict(c) for c in corrections]
+    
+    def _correction_dict(self, correction: Correction) -> Dict[str, Any]:
+        return {
+            "id": correction.comment_id,
+            "text": correction.text,
+            "predicted_label": correction.predicted_label,
+            "predicted_score": round(correction.predicted_score or 0.0, 3),
+            "label": correction.label,
+            "note": correction.note,
+            "reviewer": correction.reviewer,
+            "created_at": correction.created_at.isoformat() if correction.created_at else None
+        }
+
+class TopicService(ScopedService):
+    """Service for incremental topic clustering of comments"""
+    
+    def update_topics(self, rebuild: bool = False) -> Dict[str, Any]:
+        """Partially fit the topic model on unassigned comments and assign them"""
+        cid = self.consultation_id
+        # Nodes take turns: each fits the model the last one saved
+        with job_locks.acquire(f"topics:{cid}", blocking=True) as lease, topic_model_lock(cid):
+            if rebuild:
+                self.db.query(CommentTopic).filter(self._scope(CommentTopic)).delete(synchronize_session=False)
+                self.db.commit()
+                reset_topic_model(cid)
+            model = get_topic_model(cid)
+            
+            pending = (
+                self.db.query(Comment.id, Comment.text)
+                .outerjoin(CommentTopic, CommentTopic.comment_id == Comment.id)
+                .filter(self._scope(Comment), CommentTopic.comment_id.is_(None))
+                .order_by(Comment.id)
+                .all()
+            )
+            # The first fit needs at least one comment per topic
+            if not pending or (not model.fitted and len(pending) < model.n_topics):
+                return {"assigned": 0, "pending": len(pending)}
+            
+            for start in range(0, len(pending), TOPICS_BATCH_SIZE):
+                lease.renew()
+                batch = pending[start:start + TOPICS_BATCH_SIZE]
+                texts = [r.text or "" for r in batch]
+                model.partial_fit(texts)
+                labels, distances = model.assign(texts)
+                self.db.bulk_insert_mappings(CommentTopic, [
+                    {
+                        "comment_id": r.id,
+                        "consultation_id": cid,
+                        "epoch": self.epoch,
+                        "topic_id": int(label),
+                        "distance": float(dist)
+                    }
+                    for r, label, dist in zip(batch, labels, distances)
+                ])
+            self.db.commit()
+            save_topic_model(cid)
+        return {"assigned": len(pending), "pending": 0}
+    
+    def get_topics(self) -> List[Dict[str, Any]]:
+        """Get topic ids with their sizes and top terms"""
+        sizes = dict(
+            self.db.query(CommentTopic.topic_id, func.count(CommentTopic.comment_id))
+            .filter(self._scope(CommentTopic))
+            .group_by(CommentTopic.topic_id)
+            .all()
+        )
+        model = get_topic_model(self.consultation_id)
+        return [
+            {"id": topic_id, "size": size, "top_terms": model.top_terms(topic_id)}
+            for topic_id, size in sorted(sizes.items(), key=lambda kv: -kv[1])
+        ]
+    
+    def get_topic_comments(self, topic_id: int, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Get comments in a topic, most representative first"""
+        rows = (
+            self.db.query(Comment, CommentTopic.distance, Prediction.sentiment)
+            .join(CommentTopic, CommentTopic.comment_id == Comment.id)
+            .outerjoin(Prediction, Prediction.comment_id == Comment.id)
+            .filter(self._scope(CommentTopic), CommentTopic.topic_id == topic_id)
+            .order_by(CommentTopic.distance)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        return [
+            {
+                "id": comment.id,
+                "text": comment.text,
+                "clause": comment.clause,
+                "sentiment": sentiment,
+                "distance": round(distance, 4),
+                "created_at": comment.created_at.isoformat()
+            }
+            for comment, distance, sentiment in rows
+        ]
+
+class ThreadService(ScopedService):
+    """Service for the precomputed reply-thread index"""
+    
+    def _fetch_nodes(self, ids: List[int]) -> List[Any]:
+        rows = []
+        for chunk in _chunks(list(ids)):
+            rows.extend(
+                self.db.query(Comment.id, Comment.external_id, Comment.parent_external_id)
+                .filter(self._scope(Comment), Comment.id.in_(chunk))
+                .all()
+            )
+        return rows
+    
+    def _roots_of(self, ids: List[int]) -> set:
+        roots = set()
+        for chunk in _chunks(list(ids)):
+            roots.update(
+                r.root_id for r in
+                self.db.query(CommentThread.root_id).filter(CommentThread.comment_id.in_(chunk)).all()
+            )
+        return roots
+    
+    def index_comments(self, comment_ids: List[int]) -> None:
+        """
+        Place newly ingested comments into the thread index.
+        
+        Only the trees the new comments touch are recomputed: the trees of
+        their parents and of earlier replies that were waiting for them.
+        """
+        new_nodes = [r for r in self._fetch_nodes(comment_ids) if r.external_id or r.parent_external_id]
+        if not new_nodes:
+            return
+        new_ids = {r.id for r in new_nodes}
+        targets = list({r.parent_external_id for r in new_nodes if r.parent_external_id})
+        external_ids = list({r.external_id for r in new_nodes if r.external_id})
+        
+        scoped = self.db.query(Comment.id).filter(self._scope(Comment))
+        linked = set()
+        for chunk in _chunks(targets):
+            linked.update(r.id for r in scoped.filter(Comment.external_id.in_(chunk)).all())
+        for chunk in _chunks(external_ids):
+            linked.update(r.id for r in scoped.filter(Comment.parent_external_id.in_(chunk)).all())
+        linked -= new_ids
+        
+        old_roots = self._roots_of(list(linked))
+        members = set(new_ids) | linked
+        for root_chunk in _chunks(list(old_roots)):
+            members.update(
+                r.comment_id for r in
+                self.db.query(CommentThread.comment_id).filter(CommentThread.root_id.in_(root_chunk)).all()
+            )
+        
+        nodes = self._fetch_nodes(sorted(members))
+        # Latest comment wins when an external id was ingested more than once
+        by_external = {}
+        for node in sorted(nodes, key=lambda r: r.id):
+            if node.external_id:
+                by_external[node.external_id] = node.id
+        parents = {node.id: by_external.get(node.parent_external_id) for node in nodes}
+        layout = compute_thread_layout(parents)
+        
+        for chunk in _chunks(list(layout)):
+            self.db.query(CommentThread).filter(CommentThread.comment_id.in_(chunk)).delete(synchronize_session=False)
+        self.db.bulk_insert_mappings(CommentThread, [
+            {
+                "comment_id": node,
+                "consultation_id": self.consultation_id,
+                "epoch": self.epoch,
+                "parent_id": parents[node] if parents[node] in layout and root != node else None,
+                "root_id": root,
+                "depth": depth,
+                "descendants": descendants
+            }
+            for node, (root, depth, descendants) in layout.items()
+        ])
+        self.db.commit()
+        self.refresh_thread_stats(old_roots | {root for root, _, _ in layout.values()})
+    
+    def refresh_thread_stats(self, root_ids: Optional[set] = None) -> int:
+        """Recompute per-root size, depth and agree/disagree ratios"""
+        is_reply = CommentThread.depth > 0
+        query = (
+            self.db.query(
+                CommentThread.root_id,
+                func.count(CommentThread.comment_id),
+                func.max(CommentThread.depth),
+                func.sum(case((is_reply & (Prediction.sentiment == "AGREE"), 1), else_=0)),
+                func.sum(case((is_reply & (Prediction.sentiment == "DISAGREE"), 1), else_=0))
+            )
+            .outerjoin(Prediction, Prediction.comment_id == CommentThread.comment_id)
+            .filter(self._scope(CommentThread))
+            .group_by(CommentThread.root_id)
+            .having(func.count(CommentThread.comment_id) > 1)
+        )
+        
+        rows = []
+        if root_ids is None:
+            self.db.query(ThreadStats).filter(
+                self._scope(ThreadStats)
+            ).delete(synchronize_session=False)
+            rows = query.all()
+        else:
+            for chunk in _chunks(list(root_ids)):
+                self.db.query(ThreadStats).filter(ThreadStats.root_id.in_(chunk)).delete(synchronize_session=False)
+                rows.extend(query.filter(CommentThread.root_id.in_(chunk)).all())
+        
+        mappings = []
+        for root_id, size, max_depth, agree, disagree in rows:
+            replies = max(size - 1, 1)
+            mappings.append({
+                "root_id": root_id,
+                "consultation_id": self.consultation_id,
+                "epoch": self.epoch,
+                "size": size,
+                "max_depth": max_depth or 0,
+                "agree": agree or 0,
+                "disagree": disagree or 0,
+                "agree_ratio": round((agree or 0) / replies, 4),
+                "disagree_ratio": round((disagree or 0) / replies, 4),
+                "contested_score": contested_score(agree or 0, disagree or 0)
+            })
+        self.db.bulk_insert_mappings(ThreadStats, mappings)
+        self.db.commit()
+        return len(mappings)
+    
+    def _stats_dict(self, stats: Optional[ThreadStats]) -> Optional[Dict[str, Any]]:
+        if stats is None:
+            return None
+        return {
+            "root_id": stats.root_id,
+            "size": stats.size,
+            "max_depth": stats.max_depth,
+            "agree": stats.agree,
+            "disagree": stats.disagree,
+            "agree_ratio": stats.agree_ratio,
+            "disagree_ratio": stats.disagree_ratio,
+            "contested_score": stats.contested_score
+        }
+    
+    def get_thread(self, comment_id: int) -> Optional[Dict[str, Any]]:
+        """Get the whole reply thread containing a comment"""
+        comment = self.db.query(Comment).filter(
+            Comment.id == comment_id, self._scope(Comment)
+        ).first()
+        if not comment:
+            return None
+        position = self.db.query(CommentThread).filter(CommentThread.comment_id == comment_id).first()
+        root_id = position.root_id if position else comment.id
+        
+        rows = (
+            self.db.query(Comment, CommentThread, Prediction.sentiment)
+            .join(CommentThread, CommentThread.comment_id == Comment.id)
+            .outerjoin(Prediction, Prediction.comment_id == Comment.id)
+            .filter(CommentThread.root_id == root_id)
+            .order_by(CommentThread.depth, Comment.id)
+            .all()
+        )
+        if not rows:
+            rows = [(comment, None, None)]
+        
+        items = [
+            {
+                "id": c.id,
+                "external_id": c.external_id,
+                "parent_id": t.parent_id if t else None,
+                "depth": t.depth if t else 0,
+                "descendants": t.descendants if t else 0,
+                "text": c.text,
+                "clause": c.clause,
+                "sentiment": sentiment,
+                "created_at": c.created_at.isoformat()
+            }
+            for c, t, sentiment in rows
+        ]
+        stats = self.db.query(ThreadStats).filter(ThreadStats.root_id == root_id).first()
+        return {"root_id": root_id, "items": items, "stats": self._stats_dict(stats)}
+    
+    def get_contested_threads(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the roots whose replies are most evenly split between agree and disagree"""
+        rows = (
+            self.db.query(ThreadStats, Comment)
+            .join(Comment, Comment.id == ThreadStats.root_id)
+            .filter(self._scope(ThreadStats))
+            .order_by(ThreadStats.contested_score.desc(), ThreadStats.size.desc())
+            .limit(limit)
+            .all()
+        )
+        return [
+            {**self._stats_dict(stats), "text": root.text, "clause": root.clause}
+            for stats, root in rows
+        ]
+
+class ConsultationService:
+    """Service for managing consultations"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_consultation(self, consultation_id: int) -> Optional[Consultation]:
+        return self.db.query(Consultation).filter(Consultation.id == consultation_id).first()
+    
+    def list_consultations(self) -> List[Dict[str, Any]]:
+        """Get all consultations with their comment counts"""
+        counts = dict(
+            self.db.query(Comment.consultation_id, func.count(Comment.id))
+            .join(Consultation, and_(
+                Consultation.id == Comment.consultation_id,
+                Consultation.epoch == Comment.epoch
+            ))
+            .group_by(Comment.consultation_id)
+            .all()
+        )
+        return [
+            {
+                "id": c.id,
+                "name": c.name,
+                "description": c.description,
+                "comments": counts.get(c.id, 0),
+                "created_at": c.created_at.isoformat() if c.created_at else None
+            }
+            for c in self.db.query(Consultation).order_by(Consultation.id).all()
+        ]
+    
+    def create_consultation(self, name: str, description: Optional[str] = None) -> Consultation:
+        consultation = Consultation(name=name.strip(), description=description)
+        self.db.add(consultation)
+        self.db.commit()
+        self.db.refresh(consultation)
+        return consultation
+    
+    def delete_consultation(self, consultation_id: int) -> None:
+        """
+        Delete a consultation; its comment rows are left for purge_stale_data().
+        
+        Corrections go at once, since the review queue finds them by
+        consultation id and databases created before ids were never reused
+        can still hand this id to a new consultation.
+        """
+        self.db.query(Consultation).filter(Consultation.id == consultation_id).delete()
+        self.db.query(Correction).filter(Correction.consultation_id == consultation_id).delete(synchronize_session=False)
+        self.db.commit()
+        summary_cache.invalidate(consultation_id)
+        read_models.drop(consultation_id)
+        reset_topic_model(consultation_id)
+        delete_wordcloud(consultation_id)
+    
+    def purge_stale_data(
+        self,
+        consultation_id: int,
+        batch_size: int = PURGE_BATCH_SIZE,
+        pause: float = PURGE_PAUSE_SECONDS
+    ) -> int:
+        """
+        Delete rows of cleared epochs (or of a deleted consultation).
+        
+        Each batch commits separately and is followed by a short pause so
+        dashboard reads are never blocked for long.
+        """
+        epoch = self.db.query(Consultation.epoch).filter(Consultation.id == consultation_id).scalar()
+        deleted = 0
+        with _purge_lock:
+            for model in (Prediction, CommentTopic, CommentThread, ThreadStats, MetricCube, Comment):
+                stale = model.consultation_id == consultation_id
+                if epoch is not None:
+                    stale = and_(stale, model.epoch != epoch)
+                key = model.__table__.primary_key.columns.values()[0]
+                while True:
+                    ids = [r[0] for r in self.db.query(key).filter(stale).limit(batch_size).all()]
+                    if not ids:
+                        break
+                    for chunk in _chunks(ids):
+                        self.db.query(model).filter(key.in_(chunk)).delete(synchronize_session=False)
+                    self.db.commit()
+                    deleted += len(ids)
+                    time.sleep(pause)
+        return deleted
+
+_purge_lock = threading.Lock()
+
+def purge_stale_data(consultation_ids: Optional[List[int]] = None) -> int:
+    """Background task: purge hidden rows, then hand freed pages back to the OS"""
+    db = SessionLocal()
+    try:
+        if consultation_ids is None:
+            # Everything not in a live epoch, including deleted consultations
+            consultation_ids = [
+                r[0] for r in db.query(Comment.consultation_id).distinct().all() if r[0] is not None
+            ]
+        service = ConsultationService(db)
+        deleted = sum(service.purge_stale_data(cid) for cid in consultation_ids)
+    except Exception:
+        logger.exception("Purging cleared data failed")
+        return 0
+    finally:
+        db.close()
+    if deleted:
+        vacuum_incremental()
+        logger.info("Purged %d cleared rows", deleted)
+    return deleted
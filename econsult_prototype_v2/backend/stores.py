@@ -0,0 +1,210 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .config import ARTIFACTS_DIR, JOB_LEASE_SECONDS, JOB_LOCK_POLL_SECONDS, STATE_BACKEND
+from .database import engine
+from .models import Artifact, JobLease
+
+logger = logging.getLogger(__name__)
+
+
+class LocalArtifactStore:
+    """Artifacts as files under root, e.g. key 'static/wordcloud.png'"""
+
+    def __init__(self, root: Path = ARTIFACTS_DIR):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except OSError:
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Readers being served the previous file never see a half-written one
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def keys(self, prefix: str) -> List[str]:
+        """Stored keys starting with prefix, e.g. 'profiles/'"""
+        base = self._path(prefix.rpartition("/")[0])
+        if not base.is_dir():
+            return []
+        keys = (path.relative_to(self.root).as_posix() for path in base.rglob("*") if path.is_file())
+        # Skip files put() has not renamed into place yet
+        return sorted(k for k in keys if k.startswith(prefix) and not k.rpartition("/")[2].startswith("."))
+
+    def stamp(self, key: str) -> Optional[float]:
+        """When the key was last written, or None if it does not exist"""
+        try:
+            return self._path(key).stat().st_mtime
+        except OSError:
+            return None
+
+
+class DatabaseArtifactStore:
+    """Artifacts as rows of the artifacts table, shared by every node on the database"""
+
+    def __init__(self, bind=engine):
+        self.bind = bind
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.bind.connect() as conn:
+            return conn.execute(select(Artifact.data).where(Artifact.key == key)).scalar()
+
+    def put(self, key: str, data: bytes) -> None:
+        values = {"data": data, "updated_at": time.time()}
+        with self.bind.begin() as conn:
+            if conn.execute(update(Artifact).where(Artifact.key == key).values(**values)).rowcount:
+                return
+        try:
+            with self.bind.begin() as conn:
+                conn.execute(insert(Artifact).values(key=key, **values))
+        except IntegrityError:
+            # Another node inserted the key first; the later write wins
+            with self.bind.begin() as conn:
+                conn.execute(update(Artifact).where(Artifact.key == key).values(**values))
+
+    def delete(self, key: str) -> None:
+        with self.bind.begin() as conn:
+            conn.execute(delete(Artifact).where(Artifact.key == key))
+
+    def keys(self, prefix: str) -> List[str]:
+        with self.bind.connect() as conn:
+            return list(conn.execute(
+                select(Artifact.key).where(Artifact.key.startswith(prefix, autoescape=True)).order_by(Artifact.key)
+            ).scalars())
+
+    def stamp(self, key: str) -> Optional[float]:
+        with self.bind.connect() as conn:
+            return conn.execute(select(Artifact.updated_at).where(Artifact.key == key)).scalar()
+
+
+class Lease:
+    """A held job lock; release it when done, renew it while a long job runs"""
+
+    def __init__(self, locks, name: str, token: str):
+        self.locks = locks
+        self.name = name
+        self.token = token
+        self.renewed_at = time.monotonic()
+
+    def renew(self) -> None:
+        """Push the expiry out again; cheap to call often, as it writes at most every third of the lease"""
+        if time.monotonic() - self.renewed_at >= self.locks.ttl / 3:
+            self.renewed_at = time.monotonic()
+            self.locks.renew(self.name, self.token)
+
+    def release(self) -> None:
+        self.locks.release(self.name, self.token)
+
+    def __enter__(self) -> "Lease":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class LocalJobLocks:
+    """Job locks held in this process's memory"""
+
+    def __init__(self, ttl: float = JOB_LEASE_SECONDS):
+        self.ttl = ttl
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def acquire(self, name: str, blocking: bool = False) -> Optional[Lease]:
+        """The lock as a Lease, or None if it is held and blocking is False"""
+        with self._guard:
+            lock = self._locks.setdefault(name, threading.Lock())
+        if not lock.acquire(blocking=blocking):
+            return None
+        return Lease(self, name, "")
+
+    def renew(self, name: str, token: str) -> None:
+        pass
+
+    def release(self, name: str, token: str) -> None:
+        self._locks[name].release()
+
+
+class DatabaseJobLocks:
+    """
+    Job locks as rows of the job_leases table, so one node at a time holds
+    each. A lease expires ttl seconds after it was taken or last renewed;
+    after that any node may take it over, so a node that dies mid-job does
+    not block the consultation for good.
+    """
+
+    def __init__(self, bind=engine, ttl: float = JOB_LEASE_SECONDS, poll: float = JOB_LOCK_POLL_SECONDS):
+        self.bind = bind
+        self.ttl = ttl
+        self.poll = poll
+
+    def _try_acquire(self, name: str, token: str) -> bool:
+        now = time.time()
+        with self.bind.begin() as conn:
+            taken = conn.execute(
+                update(JobLease)
+                .where(JobLease.name == name, JobLease.expires_at < now)
+                .values(owner=token, expires_at=now + self.ttl)
+            ).rowcount
+        if taken:
+            return True
+        try:
+            with self.bind.begin() as conn:
+                conn.execute(insert(JobLease).values(name=name, owner=token, expires_at=now + self.ttl))
+            return True
+        except IntegrityError:
+            return False
+
+    def acquire(self, name: str, blocking: bool = False) -> Optional[Lease]:
+        token = uuid.uuid4().hex
+        while not self._try_acquire(name, token):
+            if not blocking:
+                return None
+            time.sleep(self.poll)
+        return Lease(self, name, token)
+
+    def renew(self, name: str, token: str) -> None:
+        with self.bind.begin() as conn:
+            renewed = conn.execute(
+                update(JobLease)
+                .where(JobLease.name == name, JobLease.owner == token)
+                .values(expires_at=time.time() + self.ttl)
+            ).rowcount
+        if not renewed:
+            logger.warning("Lease %s expired and was taken over while its job was still running", name)
+
+    def release(self, name: str, token: str) -> None:
+        with self.bind.begin() as conn:
+            conn.execute(delete(JobLease).where(JobLease.name == name, JobLease.owner == token))
+
+
+STATE_BACKENDS = {
+    "local": (LocalArtifactStore, LocalJobLocks),
+    "database": (DatabaseArtifactStore, DatabaseJobLocks),
+}
+
+if STATE_BACKEND not in STATE_BACKENDS:
+    raise ValueError(f"STATE_BACKEND must be one of {', '.join(STATE_BACKENDS)}, not {STATE_BACKEND!r}")
+
+artifact_store = STATE_BACKENDS[STATE_BACKEND][0]()
+job_locks = STATE_BACKENDS[STATE_BACKEND][1]()
@@ -0,0 +1,179 @@
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+except ImportError:
+    TfidfVectorizer = None
+
+from .config import SUMMARY_MAX_SENTENCES, SUMMARY_REDUNDANCY_THRESHOLD, SUMMARY_CACHE_SIZE
+from .textproc import content_terms, split_sentences
+
+SUMMARY_METHODS = ("tfidf", "textrank")
+
+
+def _collect_sentences(texts: Sequence[str], ids: Optional[Sequence[Any]]) -> Tuple[List[str], np.ndarray, List[Any]]:
+    """
+    Unique sentences across texts with their occurrence counts.
+
+    Consultation comments repeat a lot of boilerplate, so scoring unique
+    sentences weighted by frequency keeps the matrix small.
+    """
+    index: Dict[str, int] = {}
+    sentences: List[str] = []
+    counts: List[int] = []
+    first_source: List[Any] = []
+    for i, text in enumerate(texts):
+        for sentence in split_sentences(text):
+            key = sentence.lower()
+            pos = index.get(key)
+            if pos is None:
+                index[key] = len(sentences)
+                sentences.append(sentence)
+                counts.append(1)
+                first_source.append(ids[i] if ids is not None else i)
+            else:
+                counts[pos] += 1
+    return sentences, np.asarray(counts, dtype=np.float64), first_source
+
+
+def _centroid_scores(X, weights: np.ndarray) -> np.ndarray:
+    """Cosine of each sentence to the frequency-weighted corpus centroid"""
+    centroid = np.asarray(X.T @ weights).ravel()
+    norm = np.linalg.norm(centroid)
+    if norm == 0:
+        return np.zeros(X.shape[0])
+    return np.asarray(X @ (centroid / norm)).ravel()
+
+
+def _textrank_scores(X, weights: np.ndarray, damping: float = 0.85, iterations: int = 30) -> np.ndarray:
+    """PageRank over the sparse sentence-similarity graph"""
+    n = X.shape[0]
+    sim = (X @ X.T).tocsr()
+    sim.setdiag(0)
+    sim.data[sim.data < 0.1] = 0
+    sim.eliminate_zeros()
+    out_degree = np.asarray(sim.sum(axis=1)).ravel()
+    out_degree[out_degree == 0] = 1.0
+    # Column-stochastic transition matrix as sim.T scaled by source out-degree
+    transition = sim.multiply(1.0 / out_degree[:, None]).T.tocsr()
+    teleport = weights / weights.sum()
+    scores = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        scores = (1 - damping) * teleport + damping * (transition @ scores)
+    return scores
+
+
+def summarize_texts(
+    texts: Sequence[str],
+    max_sentences: int = SUMMARY_MAX_SENTENCES,
+    method: str = "tfidf",
+    ids: Optional[Sequence[Any]] = None,
+    in_order: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Extractive summary of one or many texts.
+
+    Sentences are TF-IDF vectors; "tfidf" ranks them by similarity to the
+    corpus centroid and "textrank" by PageRank over their similarity graph.
+    Near-duplicates of already selected sentences are skipped. Returns
+    [{"text", "source", "score", "count"}] in rank order, where source is the
+    id (or index) of the first text containing the sentence. in_order
+    returns the selected sentences in document order instead, which reads
+    better when summarizing a single comment.
+    """
+    if method not in SUMMARY_METHODS:
+        raise ValueError(f"Unknown summary method: {method}")
+
+    sentences, counts, sources = _collect_sentences(texts, ids)
+    if not sentences:
+        return []
+    if len(sentences) <= max_sentences or TfidfVectorizer is None:
+        order = list(range(min(len(sentences), max_sentences)))
+        return [{"text": sentences[i], "source": sources[i], "score": 1.0, "count": int(counts[i])} for i in order]
+
+    try:
+        X = TfidfVectorizer(sublinear_tf=True, analyzer=content_terms).fit_transform(sentences)
+    except ValueError:
+        # Only stop words; fall back to document order
+        X = None
+    if X is None or X.nnz == 0:
+        return [{"text": s, "source": sources[i], "score": 0.0, "count": int(counts[i])}
+                for i, s in enumerate(sentences[:max_sentences])]
+
+    if method == "textrank":
+        scores = _textrank_scores(X, counts)
+    else:
+        scores = _centroid_scores(X, counts)
+
+    selected: List[int] = []
+    for idx in np.argsort(-scores, kind="stable"):
+        if len(selected) >= max_sentences:
+            break
+        if selected:
+            overlap = (X[selected] @ X[idx].T).toarray().ravel()
+            if overlap.max() >= SUMMARY_REDUNDANCY_THRESHOLD:
+                continue
+        selected.append(int(idx))
+    if in_order:
+        selected.sort()
+
+    return [
+        {"text": sentences[i], "source": sources[i], "score": round(float(scores[i]), 6), "count": int(counts[i])}
+        for i in selected
+    ]
+
+
+class SummaryCache:
+    """
+    Bounded cache of scope-level summaries, partitioned by consultation.
+
+    Entries are tagged with their consultation's generation when computed;
+    writing new predictions calls invalidate(consultation_id), which bumps
+    that generation so the consultation's older entries are ignored and
+    eventually evicted while other consultations keep theirs. Writes by
+    other processes reach it through observe_version.
+    """
+
+    def __init__(self, max_entries: int = SUMMARY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._generations: Dict[int, int] = {}
+        self._versions: Dict[int, int] = {}
+        self._entries: Dict[Tuple, Tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _current(self, key: Tuple, entry: Tuple[int, Any]) -> bool:
+        return entry[0] == self._generations.get(key[0], 0)
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Look up a key whose first element is the consultation id"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._current(key, entry):
+                return None
+            return entry[1]
+
+    def set(self, key: Tuple, value: Any) -> None:
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if self._current(k, v)}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (self._generations.get(key[0], 0), value)
+
+    def invalidate(self, consultation_id: int) -> None:
+        with self._lock:
+            self._generations[consultation_id] = self._generations.get(consultation_id, 0) + 1
+
+    def observe_version(self, consultation_id: int, data_version: int) -> None:
+        """Drop the consultation's entries once any process has changed its data"""
+        with self._lock:
+            if self._versions.get(consultation_id) == data_version:
+                return
+            self._versions[consultation_id] = data_version
+        self.invalidate(consultation_id)
+
+
+summary_cache = SummaryCache()
@@ -0,0 +1,110 @@
+import re
+import sys
+import unicodedata
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+
+try:
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+except ImportError:
+    ENGLISH_STOP_WORDS = frozenset()
+
+from .config import TEXT_CACHE_SIZE
+
+# Zero-width characters only change how Indic conjuncts are drawn
+ZERO_WIDTH = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"))
+WHITESPACE = re.compile(r"\s+")
+# \w alone splits Devanagari words at every vowel sign and virama, so the
+# block's combining marks (and Latin combining accents) are word characters
+WORD = re.compile(r"[\w\u0300-\u036f\u0900-\u0963\u0966-\u097f\ua8e0-\ua8ff]+")
+# Full stops and the Devanagari danda / double danda end sentences
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|(?<=[\u0964\u0965])\s*")
+NON_LETTER = re.compile(r"[\d_]")
+DANDAS = str.maketrans({"\u0964": ".", "\u0965": "."})
+
+HINDI_STOP_WORDS = frozenset(unicodedata.normalize("NFC", w) for w in """
+    और अपना अपने अभी इस इसके इसकी इसमें इसे उस उसके उसकी उसे एक एवं कर करता करते करना करने करें
+    कहा का कि किया किसी की कुछ के को कोई गई गए गया जब जा जाता जाती जाने जो तक तथा तब तो था थी थे
+    दिया द्वारा न नहीं ने पर परंतु फिर बहुत भी मे में यदि यह यहाँ या रहा रही रहे लिए लेकिन वह वे सकता
+    सकती सकते सभी साथ से हम हि ही हुआ हुई हुए है हैं हो होता होती होने
+""".split())
+STOP_WORDS = frozenset(ENGLISH_STOP_WORDS) | HINDI_STOP_WORDS
+
+
+class TextFeatures(NamedTuple):
+    """Everything the analysis stages need from one comment"""
+    normalized: str
+    sentences: Tuple[str, ...]
+    tokens: Tuple[str, ...]
+    # Casefolded tokens of two or more characters that are not stop words
+    terms: Tuple[str, ...]
+    script: str
+
+
+def normalize_text(text: str) -> str:
+    """NFC, no zero-width characters, single spaces"""
+    text = unicodedata.normalize("NFC", text or "").translate(ZERO_WIDTH)
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def detect_script(text: str) -> str:
+    """'latin', 'devanagari', 'mixed', 'other' or 'none' by the letters used"""
+    latin = devanagari = other = 0
+    for char in text:
+        if "\u0900" <= char <= "\u097f" or "\ua8e0" <= char <= "\ua8ff":
+            devanagari += 1
+        elif char.isalpha():
+            if char < "\u0250":
+                latin += 1
+            else:
+                other += 1
+    if latin and devanagari:
+        return "mixed"
+    if devanagari:
+        return "devanagari"
+    if latin:
+        return "latin"
+    return "other" if other else "none"
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def process_text(text: str) -> TextFeatures:
+    """
+    Normalize and tokenize a comment once for every stage that reads it.
+
+    Results are cached by text, so the intent model, summaries, keyword
+    extraction and topic clustering share one pass per comment. Tokens are
+    interned: comments draw on a small vocabulary, so the cache holds one
+    copy of each word.
+    """
+    normalized = normalize_text(text)
+    sentences = tuple(s.strip() for s in SENTENCE_SPLIT.split(normalized) if s.strip())
+    tokens = tuple(sys.intern(t) for t in WORD.findall(normalized.casefold()))
+    terms = tuple(t for t in tokens if len(t) > 1 and t not in STOP_WORDS)
+    return TextFeatures(normalized, sentences, tokens, terms, detect_script(normalized))
+
+
+def split_sentences(text: str) -> List[str]:
+    return list(process_text(text or "").sentences)
+
+
+def content_terms(text: str) -> Tuple[str, ...]:
+    """Stop-word-free terms; the TF-IDF analyzer for extractive summaries"""
+    return process_text(text or "").terms
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def topic_terms(text: str) -> Tuple[str, ...]:
+    """Terms of three or more letters without digits; the topic model's analyzer"""
+    return tuple(t for t in process_text(text or "").terms if len(t) > 2 and not NON_LETTER.search(t))
+
+
+def keyword_text(text: str) -> str:
+    """Normalized text with dandas as full stops, which YAKE splits sentences on"""
+    return process_text(text or "").normalized.translate(DANDAS)
+
+
+def intent_terms(text: str) -> List[str]:
+    """Tokens and adjacent-token bigrams, stop words kept ('not agree'); the intent model's analyzer"""
+    tokens = process_text(text or "").tokens
+    return list(tokens) + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
@@ -0,0 +1,60 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+
+def compute_thread_layout(parents: Dict[int, Optional[int]]) -> Dict[int, Tuple[int, int, int]]:
+    """
+    Compute (root_id, depth, descendants) for every node of a reply forest.
+
+    `parents` maps comment id -> parent comment id (None for roots). Parents
+    outside the mapping are treated as missing, and reply cycles in bad data
+    are broken at their lowest id so every node lands in exactly one tree.
+    """
+    children: Dict[int, List[int]] = defaultdict(list)
+    roots: List[int] = []
+    for node, parent in parents.items():
+        if parent is None or parent == node or parent not in parents:
+            roots.append(node)
+        else:
+            children[parent].append(node)
+
+    layout: Dict[int, List[int]] = {}
+
+    def walk(root: int) -> None:
+        order: List[Tuple[int, Optional[int]]] = []
+        stack: List[Tuple[int, int, Optional[int]]] = [(root, 0, None)]
+        while stack:
+            node, depth, tree_parent = stack.pop()
+            if node in layout:
+                continue
+            layout[node] = [root, depth, 0]
+            order.append((node, tree_parent))
+            for child in children.get(node, ()):
+                if child not in layout:
+                    stack.append((child, depth + 1, node))
+        # Children are always visited after their parent, so reverse order
+        # accumulates descendant counts bottom-up
+        for node, tree_parent in reversed(order):
+            if tree_parent is not None:
+                layout[tree_parent][2] += layout[node][2] + 1
+
+    for root in sorted(roots):
+        walk(root)
+    for node in sorted(parents):
+        if node not in layout:
+            walk(node)
+
+    return {node: (v[0], v[1], v[2]) for node, v in layout.items()}
+
+
+def contested_score(agree: int, disagree: int) -> float:
+    """
+    How contested a thread is: balanced agree/disagree replies score highest,
+    and larger balanced threads outrank smaller ones.
+    """
+    stance = agree + disagree
+    if stance == 0:
+        return 0.0
+    balance = 2.0 * min(agree, disagree) / stance
+    return round(balance * math.log1p(stance), 6)
@@ -0,0 +1,177 @@
+import io
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from joblib import dump as joblib_dump, load as joblib_load
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.utils import murmurhash3_32
+
+from .config import (
+    TOPIC_MODEL_PATH,
+    DEFAULT_CONSULTATION_ID,
+    TOPICS_COUNT,
+    TOPICS_HASH_FEATURES,
+    TOPICS_BATCH_SIZE,
+    TOPICS_TOP_TERMS,
+    TOPICS_MAX_VOCABULARY
+)
+from .stores import artifact_store
+from .textproc import topic_terms
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalTopicModel:
+    """
+    Streaming topic clustering over hashed TF-IDF features.
+
+    Document frequencies are accumulated per hashed feature so IDF weights
+    improve as comments arrive, and MiniBatchKMeans.partial_fit moves the
+    centroids with each new batch instead of re-clustering the corpus.
+    Hashing is one-way, so a bounded reverse map from feature index to the
+    most frequent term seen is kept for labelling topics.
+    """
+
+    def __init__(
+        self,
+        n_topics: int = TOPICS_COUNT,
+        n_features: int = TOPICS_HASH_FEATURES,
+        batch_size: int = TOPICS_BATCH_SIZE
+    ):
+        self.n_topics = n_topics
+        self.n_features = n_features
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            alternate_sign=False,
+            norm=None,
+            # Shared, cached tokenization: partial_fit reads each text three times
+            analyzer=topic_terms
+        )
+        self.kmeans = MiniBatchKMeans(
+            n_clusters=n_topics,
+            batch_size=batch_size,
+            random_state=0,
+            n_init=3
+        )
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.terms: Dict[int, Tuple[str, int]] = {}
+        self.fitted = False
+
+    def _feature_index(self, term: str) -> int:
+        return abs(murmurhash3_32(term, seed=0)) % self.n_features
+
+    def _remember_terms(self, texts: Sequence[str]) -> None:
+        analyzer = self.vectorizer.build_analyzer()
+        for text in texts:
+            for term in set(analyzer(text)):
+                idx = self._feature_index(term)
+                current = self.terms.get(idx)
+                if current is None:
+                    if len(self.terms) < TOPICS_MAX_VOCABULARY:
+                        self.terms[idx] = (term, 1)
+                elif current[0] == term:
+                    self.terms[idx] = (term, current[1] + 1)
+
+    def _tfidf(self, texts: Sequence[str]):
+        X = self.vectorizer.transform(texts).tocsr()
+        X.data = np.log1p(X.data)
+        idf = np.log((1.0 + self.n_docs) / (1.0 + self.doc_freq)) + 1.0
+        return normalize(X.multiply(idf).tocsr())
+
+    def partial_fit(self, texts: Sequence[str]) -> None:
+        """Absorb a batch of new comments into the IDF statistics and centroids"""
+        counts = self.vectorizer.transform(texts).tocsr()
+        self.doc_freq += np.bincount(counts.indices, minlength=self.n_features)
+        self.n_docs += len(texts)
+        self._remember_terms(texts)
+        self.kmeans.partial_fit(self._tfidf(texts))
+        self.fitted = True
+
+    def assign(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Topic id and distance to its centroid for each text"""
+        X = self._tfidf(texts)
+        distances = self.kmeans.transform(X)
+        labels = distances.argmin(axis=1)
+        return labels, distances[np.arange(len(labels)), labels]
+
+    def top_terms(self, topic_id: int, n: int = TOPICS_TOP_TERMS) -> List[str]:
+        if not self.fitted:
+            return []
+        center = self.kmeans.cluster_centers_[topic_id]
+        terms = []
+        for idx in np.argsort(-center):
+            if center[idx] <= 0 or len(terms) >= n:
+                break
+            term = self.terms.get(int(idx))
+            if term is not None:
+                terms.append(term[0])
+        return terms
+
+
+_models: Dict[int, IncrementalTopicModel] = {}
+# Artifact stamp each loaded model was read at; a newer one was saved by another node
+_stamps: Dict[int, Optional[float]] = {}
+_model_locks: Dict[int, threading.RLock] = {}
+_registry_lock = threading.Lock()
+
+
+def topic_model_key(consultation_id: int) -> str:
+    """Artifact key of a consultation's topic model (the default keeps models/topic_model.pkl)"""
+    if consultation_id == DEFAULT_CONSULTATION_ID:
+        return f"models/{TOPIC_MODEL_PATH.name}"
+    return f"models/topic_model_{consultation_id}.pkl"
+
+
+def topic_model_lock(consultation_id: int) -> threading.RLock:
+    with _registry_lock:
+        return _model_locks.setdefault(consultation_id, threading.RLock())
+
+
+def _load_topic_model(key: str) -> Optional[IncrementalTopicModel]:
+    data = artifact_store.get(key)
+    if data is None:
+        return None
+    try:
+        return joblib_load(io.BytesIO(data))
+    except Exception as e:
+        logger.warning("Could not load topic model %s: %s", key, e)
+        return None
+
+
+def get_topic_model(consultation_id: int) -> IncrementalTopicModel:
+    """Topic model of a consultation, loaded from the artifact store on first use and when it changes"""
+    with topic_model_lock(consultation_id):
+        key = topic_model_key(consultation_id)
+        stamp = artifact_store.stamp(key)
+        model = _models.get(consultation_id)
+        if model is None or stamp != _stamps.get(consultation_id):
+            model = _load_topic_model(key) if stamp is not None else None
+            if model is None:
+                model = IncrementalTopicModel()
+            _models[consultation_id] = model
+            _stamps[consultation_id] = stamp
+        return model
+
+
+def save_topic_model(consultation_id: int) -> None:
+    with topic_model_lock(consultation_id):
+        model = _models.get(consultation_id)
+        if model is not None and model.fitted:
+            key = topic_model_key(consultation_id)
+            out = io.BytesIO()
+            joblib_dump(model, out)
+            artifact_store.put(key, out.getvalue())
+            _stamps[consultation_id] = artifact_store.stamp(key)
+
+
+def reset_topic_model(consultation_id: int) -> None:
+    """Discard the fitted model so the next update starts from scratch"""
+    with topic_model_lock(consultation_id):
+        _models[consultation_id] = IncrementalTopicModel()
+        _stamps[consultation_id] = None
+        artifact_store.delete(topic_model_key(consultation_id))
@@ -0,0 +1,398 @@
+"""
+Train and evaluate the intent model from labeled CSVs and analyst corrections
+
+    python -m backend.training train mca_intent_dataset_850.csv
+    python -m backend.training train --full data/*.csv
+    python -m backend.training train mca_intent_dataset_850.csv --promote
+    python -m backend.training evaluate mca_intent_dataset_850.csv --model a.pkl --model b.pkl
+
+Writes the {"pipeline", "labels"} artifact that classify_intent() loads.
+The pipeline hashes tokens and bigrams, so it has no vocabulary to refit,
+and the classifier learns with partial_fit. By default a run continues the
+existing artifact and only learns from CSV files and corrections it has not
+seen before; --full starts over. A fixed fifth of CSV rows, chosen by a hash
+of the text, is never trained on and reports held-out accuracy.
+
+Training writes a candidate next to the served model, never the served
+model itself. --promote replaces the served model with the candidate when
+the candidate is more accurate on the held-out rows (or always, with
+--force), keeping the replaced model as intent_model.pkl.bak.
+
+evaluate runs classify_intent() and classify_intents() over a labeled CSV
+and reports per-label precision and recall, the confusion matrix, latency
+percentiles and throughput per CPU core, one report per model, so a faster
+model can be weighed against what it costs in accuracy.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from joblib import dump as joblib_dump, load as joblib_load
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import confusion_matrix, precision_recall_fscore_support
+from sklearn.pipeline import Pipeline
+
+from . import utils
+from .config import ANALYSIS_CHUNK_SIZE, INTENT_CANDIDATE_PATH, INTENT_COLORS, INTENT_MODEL_PATH
+from .textproc import intent_terms, normalize_text, process_text
+from .utils import redact_pii
+
+# Percent of CSV rows held out for evaluation, by text hash
+HOLDOUT_PERCENT = 20
+# Passes over the new samples of a run
+DEFAULT_EPOCHS = 5
+# Corrections are the examples the model got wrong; they count extra
+CORRECTION_WEIGHT = 2.0
+HASH_FEATURES = 2 ** 18
+LABEL_COLUMN = "Label"
+
+Sample = Tuple[str, str, float]
+
+
+def new_pipeline() -> Pipeline:
+    return Pipeline([
+        ("features", HashingVectorizer(analyzer=intent_terms, n_features=HASH_FEATURES, alternate_sign=False)),
+        ("classifier", SGDClassifier(loss="log_loss", alpha=1e-4, random_state=0))
+    ])
+
+
+def is_holdout(text: str) -> bool:
+    return zlib.crc32(text.encode("utf-8")) % 100 < HOLDOUT_PERCENT
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_labeled_csv(path: str) -> Tuple[List[Sample], List[Sample]]:
+    """(training, held-out) samples from a CSV with Comment and Label columns"""
+    train, holdout = [], []
+    with open(path, newline="", encoding="utf-8", errors="ignore") as f:
+        for row in csv.DictReader(f):
+            label = (row.get(LABEL_COLUMN) or "").strip()
+            text = normalize_text(redact_pii((row.get("Comment") or "").strip()))
+            if not text or label not in INTENT_COLORS:
+                continue
+            (holdout if is_holdout(text) else train).append((text, label, 1.0))
+    return train, holdout
+
+
+def read_corrections(since: Optional[datetime] = None) -> Tuple[List[Sample], Optional[datetime]]:
+    """Corrections made after since, across all consultations, and the newest one's time"""
+    from .database import SessionLocal, create_tables
+    from .models import Correction
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        query = db.query(Correction.text, Correction.label, Correction.created_at)
+        if since is not None:
+            query = query.filter(Correction.created_at > since)
+        rows = query.order_by(Correction.created_at).all()
+    finally:
+        db.close()
+    samples = [(normalize_text(text), label, CORRECTION_WEIGHT) for text, label, _ in rows if label in INTENT_COLORS]
+    return samples, (rows[-1][2] if rows else since)
+
+
+def load_artifact(path: Path) -> Optional[Dict[str, Any]]:
+    """An artifact this module trained, or None (missing, or a model that cannot learn incrementally)"""
+    if not path.exists():
+        return None
+    artifact = joblib_load(path)
+    if "trained" not in artifact or not hasattr(artifact["pipeline"], "named_steps"):
+        return None
+    return artifact
+
+
+def save_artifact(artifact: Dict[str, Any], path: Path) -> None:
+    """Write next to the target and rename, so a loading server never sees half a file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    joblib_dump(artifact, tmp)
+    os.replace(tmp, path)
+
+
+def fit(pipeline: Pipeline, samples: List[Sample], epochs: int) -> None:
+    """Shuffled partial_fit passes; the vectorizer is stateless, so features are hashed once"""
+    texts, labels, weights = zip(*samples)
+    features = pipeline.named_steps["features"].transform(texts)
+    labels, weights = np.array(labels), np.array(weights)
+    classifier = pipeline.named_steps["classifier"]
+    classes = list(INTENT_COLORS)
+    for epoch in range(epochs):
+        order = np.random.RandomState(epoch).permutation(len(labels))
+        classifier.partial_fit(features[order], labels[order], classes=classes, sample_weight=weights[order])
+
+
+def accuracy(pipeline: Pipeline, samples: List[Sample]) -> Optional[float]:
+    if not samples:
+        return None
+    texts, labels, _ = zip(*samples)
+    return round(float(np.mean(pipeline.predict(list(texts)) == np.array(labels))), 4)
+
+
+def train(
+    csv_paths: List[str],
+    out_path: Path = INTENT_CANDIDATE_PATH,
+    full: bool = False,
+    corrections: bool = True,
+    epochs: int = DEFAULT_EPOCHS,
+    base_path: Optional[Path] = None
+) -> Dict[str, Any]:
+    """
+    Train or update the intent model at out_path; returns a report of what
+    was learned. Without an artifact at out_path, an update starts from
+    base_path (the CLI passes the served model).
+    """
+    artifact = None
+    if not full:
+        artifact = load_artifact(out_path)
+        if artifact is None and base_path is not None:
+            artifact = load_artifact(base_path)
+    if artifact is None:
+        artifact = {"pipeline": new_pipeline(), "trained": {"sources": {}, "corrections_since": None, "samples": 0}}
+    trained = artifact["trained"]
+
+    samples: List[Sample] = []
+    holdout: List[Sample] = []
+    for path in csv_paths:
+        digest = file_digest(path)
+        rows, held = read_labeled_csv(path)
+        holdout.extend(held)
+        if digest not in trained["sources"]:
+            samples.extend(rows)
+            trained["sources"][digest] = os.path.basename(path)
+    if corrections:
+        new, trained["corrections_since"] = read_corrections(trained["corrections_since"])
+        samples.extend(new)
+
+    started = time.perf_counter()
+    if samples:
+        fit(artifact["pipeline"], samples, epochs)
+    seconds = time.perf_counter() - started
+    trained["samples"] += len(samples)
+    fitted = hasattr(artifact["pipeline"].named_steps["classifier"], "classes_")
+
+    report = {
+        "mode": "full" if trained["samples"] == len(samples) else "incremental",
+        "new_samples": len(samples),
+        "total_samples": trained["samples"],
+        "train_seconds": round(seconds, 3),
+        "holdout_samples": len(holdout),
+        "holdout_accuracy": accuracy(artifact["pipeline"], holdout) if fitted else None
+    }
+    if samples:
+        artifact["labels"] = [str(c) for c in artifact["pipeline"].named_steps["classifier"].classes_]
+        artifact["trained_at"] = datetime.utcnow().isoformat()
+        artifact["report"] = report
+        save_artifact(artifact, out_path)
+    return report
+
+
+def latency_report(seconds: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max per comment, in milliseconds"""
+    ms = np.array(seconds) * 1000
+    report = {f"p{q}_ms": round(float(np.percentile(ms, q)), 3) for q in (50, 95, 99)}
+    report["max_ms"] = round(float(ms.max()), 3)
+    return report
+
+
+def timed_pass(texts: List[str], batch_size: int) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Classify texts one by one (batch_size 1, classify_intent) or in batches
+    (classify_intents). The text cache is cleared first so normalization
+    is paid for, as it is for a new comment.
+    """
+    process_text.cache_clear()
+    predicted: List[str] = []
+    latencies: List[float] = []
+    wall, cpu = time.perf_counter(), time.process_time()
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        began = time.perf_counter()
+        if batch_size == 1:
+            predicted.append(utils.classify_intent(batch[0])[0])
+        else:
+            predicted.extend(label for label, _, _ in utils.classify_intents(batch))
+        # Each comment of a batch waits for the whole batch
+        latencies.extend([time.perf_counter() - began] * len(batch))
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return predicted, {
+        "batch_size": batch_size,
+        **latency_report(latencies),
+        "comments_per_s": round(len(texts) / wall, 1) if wall else None,
+        "comments_per_cpu_s": round(len(texts) / cpu, 1) if cpu else None
+    }
+
+
+@contextmanager
+def serving(artifact: Optional[Dict[str, Any]]):
+    """Classify with artifact (None: the no-model fallback) instead of the loaded model"""
+    previous = utils.INTENT_MODEL
+    if artifact is not None:
+        artifact = dict(artifact)
+        utils.prepare_intent_model(artifact)
+        # Without the feature cache, so every pass pays for vectorizing
+        artifact["vectorizer_version"] = None
+    utils.INTENT_MODEL = artifact
+    try:
+        yield
+    finally:
+        utils.INTENT_MODEL = previous
+
+
+def evaluate_model(artifact: Optional[Dict[str, Any]], samples: List[Sample], batch_size: int) -> Dict[str, Any]:
+    """Accuracy and speed of one model artifact (None: the no-model fallback) on labeled samples"""
+    texts = [text for text, _, _ in samples]
+    gold = [label for _, label, _ in samples]
+    with serving(artifact):
+        single, single_speed = timed_pass(texts, 1)
+        batched, batch_speed = timed_pass(texts, max(2, batch_size))
+
+    labels = sorted(set(gold) | set(single))
+    precision, recall, f1, support = precision_recall_fscore_support(gold, single, labels=labels, zero_division=0)
+    return {
+        "comments": len(samples),
+        "accuracy": round(float(np.mean(np.array(single) == np.array(gold))), 4),
+        "batched_agrees": single == batched,
+        "labels": {
+            label: {
+                "precision": round(float(p), 4),
+                "recall": round(float(r), 4),
+                "f1": round(float(f), 4),
+                "support": int(n)
+            }
+            for label, p, r, f, n in zip(labels, precision, recall, f1, support)
+        },
+        # Rows are the true label, columns the predicted one, both in "labels" order
+        "confusion_matrix": {"labels": labels, "rows": confusion_matrix(gold, single, labels=labels).tolist()},
+        "single": single_speed,
+        "batched": batch_speed
+    }
+
+
+def evaluate(
+    csv_path: str,
+    model_paths: List[Path],
+    holdout_only: bool = False,
+    batch_size: int = ANALYSIS_CHUNK_SIZE
+) -> List[Dict[str, Any]]:
+    """One evaluation report per model on the same labeled CSV"""
+    train_rows, holdout = read_labeled_csv(csv_path)
+    samples = holdout if holdout_only else train_rows + holdout
+    if not samples:
+        raise ValueError(f"{csv_path} has no rows with a Comment and a known Label")
+    reports = []
+    for path in model_paths:
+        artifact = joblib_load(path) if path.exists() else None
+        if artifact is None:
+            raise ValueError(f"Model {path} not found")
+        reports.append({"model": str(path), **evaluate_model(artifact, samples, batch_size)})
+    return reports
+
+
+def served_accuracy(artifact: Dict[str, Any], samples: List[Sample]) -> float:
+    """Accuracy of an artifact through classify_intents(), as the app would serve it"""
+    with serving(artifact):
+        predicted = [label for label, _, _ in utils.classify_intents([text for text, _, _ in samples])]
+    return round(float(np.mean(np.array(predicted) == np.array([label for _, label, _ in samples]))), 4)
+
+
+def promote(
+    csv_paths: List[str],
+    candidate_path: Path = INTENT_CANDIDATE_PATH,
+    target_path: Path = INTENT_MODEL_PATH,
+    force: bool = False
+) -> Dict[str, Any]:
+    """
+    Replace the served model with the candidate if the candidate is more
+    accurate on the held-out rows of csv_paths, or unconditionally with
+    force. The replaced model is kept as target_path + ".bak".
+    """
+    if Path(candidate_path).resolve() == Path(target_path).resolve():
+        raise ValueError("The candidate is the served model; train with a different --out to promote")
+    candidate = joblib_load(candidate_path) if candidate_path.exists() else None
+    if candidate is None:
+        raise ValueError(f"Model {candidate_path} not found")
+    current = joblib_load(target_path) if target_path.exists() else None
+    holdout = [sample for path in csv_paths for sample in read_labeled_csv(path)[1]]
+
+    report: Dict[str, Any] = {
+        "holdout_samples": len(holdout),
+        "candidate_accuracy": served_accuracy(candidate, holdout) if holdout else None,
+        "current_accuracy": served_accuracy(current, holdout) if holdout and current is not None else None
+    }
+    if force or current is None:
+        promoted = True
+    elif not holdout:
+        raise ValueError("No held-out rows to compare the models on; pass labeled CSVs or --force")
+    else:
+        promoted = report["candidate_accuracy"] > report["current_accuracy"]
+    if promoted:
+        if current is not None:
+            shutil.copy2(target_path, target_path.with_name(target_path.name + ".bak"))
+        tmp = target_path.with_name(target_path.name + ".tmp")
+        shutil.copy2(candidate_path, tmp)
+        os.replace(tmp, target_path)
+    report["promoted"] = promoted
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.training", description="Intent model training")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("train", help="learn from labeled CSVs and stored corrections")
+    run.add_argument("csv", nargs="*", help="CSV files with Comment and Label columns")
+    run.add_argument("--out", type=Path, default=INTENT_CANDIDATE_PATH,
+                     help="candidate artifact to update or write (default: next to the served model)")
+    run.add_argument("--full", action="store_true", help="start from scratch instead of updating --out")
+    run.add_argument("--no-corrections", action="store_true", help="ignore corrections stored by /review")
+    run.add_argument("--epochs", type=int, default=DEFAULT_EPOCHS, help="passes over the new samples")
+    run.add_argument("--promote", action="store_true",
+                     help="serve the candidate if it beats the served model on the held-out rows")
+    run.add_argument("--force", action="store_true", help="with --promote, serve the candidate regardless")
+    check = commands.add_parser("evaluate", help="accuracy and latency of models on a labeled CSV")
+    check.add_argument("csv", help="CSV file with Comment and Label columns")
+    check.add_argument("--model", type=Path, action="append",
+                       help="model artifact; repeat to compare (default: the app's intent model)")
+    check.add_argument("--holdout", action="store_true", help="only the rows training holds out")
+    check.add_argument("--batch-size", type=int, default=ANALYSIS_CHUNK_SIZE, help="comments per batched call")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "evaluate":
+            report = evaluate(args.csv, args.model or [INTENT_MODEL_PATH], args.holdout, args.batch_size)
+        else:
+            report = train(
+                args.csv, args.out, args.full, not args.no_corrections, max(1, args.epochs),
+                base_path=INTENT_MODEL_PATH
+            )
+            if args.promote:
+                report["promotion"] = promote(args.csv, args.out, force=args.force)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    print(json.dumps(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
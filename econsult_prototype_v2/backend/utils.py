@@ -1,7 +1,12 @@
+import io
 import re
 import json
-import os
+import logging
+import threading
+from datetime import datetime
 from typing import Dict, List, Tuple, Optional
+import numpy as np
+import scipy.sparse as sp
 from joblib import load as joblib_load
 import yake
 from wordcloud import WordCloud
@@ -9,12 +14,20 @@ from .config import (
     PII_REGEX_PATTERN, 
     INTENT_MODEL_PATH, 
     SENTIMENT_MODEL_PATH,
-    STATIC_DIR,
+    DEFAULT_CONSULTATION_ID,
     WORDCLOUD_WIDTH,
     WORDCLOUD_HEIGHT,
     WORDCLOUD_BACKGROUND_COLOR,
-    WORDCLOUD_TOP_KEYWORDS
+    WORDCLOUD_TOP_KEYWORDS,
+    WORDCLOUD_SIZES,
+    WORDCLOUD_FORMATS,
+    WORDCLOUD_WEBP_QUALITY
 )
+from .features import feature_cache, vectorizer_version
+from .stores import artifact_store
+from .textproc import HINDI_STOP_WORDS, keyword_text, normalize_text, process_text
+
+logger = logging.getLogger(__name__)
 
 # Load models
 INTENT_MODEL = None
@@ -28,25 +41,30 @@ def load_models():
     try:
         if INTENT_MODEL_PATH.exists():
             INTENT_MODEL = joblib_load(INTENT_MODEL_PATH)
-            print("✅ Loaded intent_model.pkl")
+            logger.info("Loaded intent_model.pkl")
+            prepare_intent_model(INTENT_MODEL)
         else:
-            print("⚠️ Intent model not found")
+            logger.warning("Intent model not found")
     except Exception as e:
-        print("⚠️ Could not load intent model:", e)
+        logger.warning("Could not load intent model: %s", e)
     
     # Load sentiment model
     try:
         if SENTIMENT_MODEL_PATH.exists():
             SENTIMENT_MODEL = joblib_load(SENTIMENT_MODEL_PATH)
-            print("✅ Loaded sklearn_sentiment.pkl")
+            logger.info("Loaded sklearn_sentiment.pkl")
         else:
-            print("⚠️ Sentiment model not found")
+            logger.warning("Sentiment model not found")
     except Exception as e:
-        print("⚠️ Could not load sentiment model:", e)
+        logger.warning("Could not load sentiment model: %s", e)
 
 # Initialize models
 load_models()
 
+# Scripts whose comments need the Hindi stop words
+INDIC_SCRIPTS = ("devanagari", "mixed")
+_keyword_extractors = threading.local()
+
 # PII regex pattern
 PII_REGEX = re.compile(PII_REGEX_PATTERN)
 
@@ -56,8 +74,8 @@ def redact_pii(text: str) -> str:
 
 def simple_summarize(text: str, max_sentences: int = 2) -> str:
     """Create a simple summary by taking the first few sentences"""
-    sentences = re.split(r'(?<=[.!?])\s+', (text or "").strip())
-    return " ".join(sentences[:max_sentences]) if sentences else text
+    sentences = process_text(text or "").sentences
+    return " ".join(sentences[:max_sentences]) if sentences else (text or "")
 
 def classify_intent(text: str) -> Tuple[str, float]:
     """
@@ -70,13 +88,65 @@ def classify_intent(text: str) -> Tuple[str, float]:
     try:
         pipe = INTENT_MODEL["pipeline"]
         labels = INTENT_MODEL["labels"]
-        probs = pipe.predict_proba([text or ""])[0]
+        probs = pipe.predict_proba([normalize_text(text)])[0]
         idx = int(probs.argmax())
         return labels[idx], float(probs[idx])
     except Exception as e:
-        print(f"Error in intent classification: {e}")
+        logger.exception("Error in intent classification: %s", e)
         return "REQUEST_CLARIFICATION", 0.0
 
+def prepare_intent_model(model: Dict) -> None:
+    """One-time setup of a loaded intent model artifact for inference"""
+    pipeline = model["pipeline"]
+    model["vectorizer_version"] = vectorizer_version(pipeline)
+    head = pipeline[-1] if hasattr(pipeline, "steps") else pipeline
+    coef = getattr(head, "coef_", None)
+    if coef is not None and not sp.issparse(coef):
+        # sparse features @ coef_.T copies coef_ on every call unless coef_.T is contiguous
+        head.coef_ = np.asfortranarray(coef)
+
+def intent_probabilities(model: Dict, texts: List[str]):
+    """
+    predict_proba of the intent pipeline. Feature rows come from the
+    on-disk feature cache when the vectorizer has seen the text before,
+    so re-analysis only runs the classifier.
+    """
+    pipeline = model["pipeline"]
+    if "vectorizer_version" not in model:
+        prepare_intent_model(model)
+    cache = feature_cache(model["vectorizer_version"])
+    if cache is not None:
+        try:
+            features = cache.transform(pipeline[:-1], texts)
+        except OSError as e:
+            logger.warning("Feature cache unavailable: %s", e)
+            features = None
+        if features is not None:
+            return pipeline[-1].predict_proba(features)
+    return pipeline.predict_proba(texts)
+
+def classify_intents(texts: List[str]) -> List[Tuple[str, float, float]]:
+    """
+    classify_intent() for many comments with one vectorized model call.
+    Returns (intent_label, confidence_score, margin) where margin is the
+    gap between the two most likely labels.
+    """
+    if INTENT_MODEL is None or not texts:
+        return [("REQUEST_CLARIFICATION", 0.0, 0.0)] * len(texts)
+    
+    try:
+        labels = INTENT_MODEL["labels"]
+        probs = intent_probabilities(INTENT_MODEL, [process_text(text or "").normalized for text in texts])
+    except Exception:
+        # Find out which comment the model chokes on
+        return [(*classify_intent(text), 0.0) for text in texts]
+    results = []
+    for p in probs:
+        top = p.argsort()[-2:][::-1]
+        margin = float(p[top[0]] - p[top[1]]) if len(top) > 1 else float(p[top[0]])
+        results.append((labels[int(top[0])], float(p[top[0]]), margin))
+    return results
+
 def classify_sentiment(text: str) -> Tuple[str, float]:
     """
     Classify sentiment of a comment using the trained model
@@ -89,74 +159,191 @@ def classify_sentiment(text: str) -> Tuple[str, float]:
         pred = SENTIMENT_MODEL.predict([text or ""])[0]
         return pred, 0.0
     except Exception as e:
-        print(f"Error in sentiment classification: {e}")
+        logger.exception("Error in sentiment classification: %s", e)
         return "neutral", 0.0
 
+def comment_from_csv_row(row: Dict[str, Optional[str]]) -> Optional[Dict]:
+    """Comment fields from a row of an uploaded CSV, or None when it has no text"""
+    text = (row.get("Comment") or "").strip()
+    if not text:
+        return None
+    comment = {
+        "text": text,
+        "clause": row.get("Clause") or "overall",
+        "comment_id": row.get("comment_id"),
+        "targets_comment_id": row.get("targets_comment_id"),
+        "stakeholder_type": row.get("stakeholder_type")
+    }
+    date_str = (row.get("Date") or "").strip()
+    if date_str:
+        try:
+            comment["created_at"] = datetime.strptime(date_str, "%Y-%m-%d")
+        except ValueError:
+            pass  # Use default date
+    return comment
+
+def keyword_extractor(top: int, multilingual: bool = False) -> yake.KeywordExtractor:
+    """
+    YAKE extractor reused per thread. Hindi and mixed-script text also
+    drops Hindi stop words; YAKE ships no Hindi list.
+    """
+    extractors = getattr(_keyword_extractors, "cache", None)
+    if extractors is None:
+        extractors = _keyword_extractors.cache = {}
+    extractor = extractors.get((top, multilingual))
+    if extractor is None:
+        extractor = yake.KeywordExtractor(lan="en", n=1, top=top)
+        if multilingual:
+            extractor.stopword_set = set(extractor.stopword_set) | HINDI_STOP_WORDS
+        extractors[(top, multilingual)] = extractor
+    return extractor
+
+def comment_keywords(text: str, top: int = 5) -> List[str]:
+    """Top keywords of a single comment"""
+    features = process_text(text or "")
+    try:
+        extractor = keyword_extractor(top, features.script in INDIC_SCRIPTS)
+        return [k for k, _s in extractor.extract_keywords(keyword_text(text))]
+    except Exception:
+        return list(extract_keywords([text], topk=top))
+
 def extract_keywords(texts: List[str], topk: int = WORDCLOUD_TOP_KEYWORDS) -> Dict[str, float]:
     """Extract keywords from a list of texts using YAKE"""
     if not texts:
         return {"feedback": 1, "policy": 1, "comment": 1}
     
     try:
-        kw_extractor = yake.KeywordExtractor(lan="en", n=1, top=topk)
-        big_text = "\n".join(texts)
+        multilingual = any(process_text(t or "").script in INDIC_SCRIPTS for t in texts)
+        kw_extractor = keyword_extractor(topk, multilingual)
+        big_text = "\n".join(keyword_text(t) for t in texts)
         keywords = kw_extractor.extract_keywords(big_text)
         freqs = {k: max(1.0/(s+1e-6), 1.0) for k, s in keywords if len(k) > 2}
         return freqs
     except Exception as e:
-        print(f"Error extracting keywords: {e}")
+        logger.exception("Error extracting keywords: %s", e)
         return {"feedback": 1, "policy": 1, "comment": 1}
 
-def generate_wordcloud(freqs: Dict[str, float], out_path: Optional[str] = None) -> str:
-    """Generate wordcloud image from keyword frequencies"""
-    if out_path is None:
-        out_path = STATIC_DIR / "wordcloud.png"
-    
-    # Ensure static directory exists
-    STATIC_DIR.mkdir(exist_ok=True)
-    
+def wordcloud_key(consultation_id: int = DEFAULT_CONSULTATION_ID, size: str = "full", fmt: str = "png") -> str:
+    """Artifact key of a consultation's word cloud (the default keeps static/wordcloud.png)"""
+    stem = "wordcloud" if consultation_id == DEFAULT_CONSULTATION_ID else f"wordcloud_{consultation_id}"
+    if size != "full":
+        stem = f"{stem}_{size}"
+    return f"static/{stem}.{fmt}"
+
+def _new_wordcloud() -> WordCloud:
+    return WordCloud(
+        width=WORDCLOUD_WIDTH, 
+        height=WORDCLOUD_HEIGHT, 
+        background_color=WORDCLOUD_BACKGROUND_COLOR
+    )
+
+def compute_wordcloud_layout(freqs: Dict[str, float]) -> Dict:
+    """Run word placement once; the result renders PNG, WebP, SVG and the interactive map"""
     if not freqs:
         freqs = {"feedback": 1, "policy": 1, "comment": 1}
+    wc = _new_wordcloud().generate_from_frequencies(freqs)
+    return {
+        "width": wc.width,
+        "height": wc.height,
+        "layout": [
+            [[word, float(freq)], int(font_size), [int(position[0]), int(position[1])], orientation, color]
+            for (word, freq), font_size, position, orientation, color in wc.layout_
+        ]
+    }
+
+def _wordcloud_from_layout(layout: Dict, scale: float = 1.0) -> WordCloud:
+    """WordCloud ready to draw a stored layout without placing words again"""
+    wc = _new_wordcloud()
+    wc.width, wc.height, wc.scale = layout["width"], layout["height"], scale
+    wc.layout_ = [
+        ((word, freq), font_size, tuple(position), orientation, color)
+        for (word, freq), font_size, position, orientation, color in layout["layout"]
+    ]
+    return wc
+
+def save_wordcloud_layout(layout: Dict, key: str) -> None:
+    artifact_store.put(key, json.dumps(layout).encode("utf-8"))
+
+def load_wordcloud_layout(key: str) -> Optional[Dict]:
+    data = artifact_store.get(key)
+    if data is None:
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+def render_wordcloud_image(layout: Dict, key: str, scale: float = 1.0) -> bytes:
+    """Draw a stored layout as PNG or WebP (chosen by the key's suffix) and store it"""
+    img = _wordcloud_from_layout(layout, scale).to_image()
+    out = io.BytesIO()
+    if key.endswith(".webp"):
+        img.save(out, format="WEBP", quality=WORDCLOUD_WEBP_QUALITY, method=4)
+    else:
+        # Few distinct colours, so a palette PNG is several times smaller
+        img.quantize(colors=256).save(out, format="PNG")
+    data = out.getvalue()
+    artifact_store.put(key, data)
+    return data
+
+def render_wordcloud_svg(layout: Dict) -> str:
+    """Render a stored layout as SVG text"""
+    return _wordcloud_from_layout(layout).to_svg()
+
+def layout_words(layout: Dict) -> List[Dict]:
+    """Word positions of a stored layout for the interactive wordcloud"""
+    return [
+        {
+            "text": word,
+            "font_size": int(font_size),
+            "x": int(position[1]),
+            "y": int(position[0]),
+            "orientation": int(orientation or 0)
+        }
+        for (word, _freq), font_size, position, orientation, _color in layout["layout"]
+    ]
+
+def wordcloud_image(consultation_id: int = DEFAULT_CONSULTATION_ID, size: str = "full", fmt: str = "png") -> Optional[bytes]:
+    """
+    An image variant, drawn from the stored layout on first use.
     
+    Variants are rendered at a smaller scale from the same layout, which is
+    cheaper than placing words again and sharper than resizing the PNG.
+    """
+    key = wordcloud_key(consultation_id, size, fmt)
+    layout_key = wordcloud_key(consultation_id, fmt="json")
+    stamp, layout_stamp = artifact_store.stamp(key), artifact_store.stamp(layout_key)
+    if stamp is not None and (layout_stamp is None or stamp >= layout_stamp):
+        data = artifact_store.get(key)
+        if data is not None:
+            return data
+    layout = load_wordcloud_layout(layout_key)
+    if layout is None:
+        return artifact_store.get(key)
+    return render_wordcloud_image(layout, key, WORDCLOUD_SIZES[size] / layout["width"])
+
+def generate_wordcloud(freqs: Dict[str, float], consultation_id: int = DEFAULT_CONSULTATION_ID) -> Optional[Dict]:
+    """Lay out the wordcloud once, store the layout and draw the full-size PNG"""
     try:
-        wc = WordCloud(
-            width=WORDCLOUD_WIDTH, 
-            height=WORDCLOUD_HEIGHT, 
-            background_color=WORDCLOUD_BACKGROUND_COLOR
-        )
-        img = wc.generate_from_frequencies(freqs).to_image()
-        img.save(out_path)
-        return str(out_path)
+        layout = compute_wordcloud_layout(freqs)
+        save_wordcloud_layout(layout, wordcloud_key(consultation_id, fmt="json"))
+        render_wordcloud_image(layout, wordcloud_key(consultation_id))
+        return layout
     except Exception as e:
-        print(f"Error generating wordcloud: {e}")
-        return str(out_path)
+        logger.exception("Error generating wordcloud: %s", e)
+        return None
+
+def delete_wordcloud(consultation_id: int = DEFAULT_CONSULTATION_ID) -> None:
+    """Remove a consultation's stored layout and every image variant drawn from it"""
+    artifact_store.delete(wordcloud_key(consultation_id, fmt="json"))
+    for size in WORDCLOUD_SIZES:
+        for fmt in WORDCLOUD_FORMATS:
+            artifact_store.delete(wordcloud_key(consultation_id, size, fmt))
 
 def get_wordcloud_layout(freqs: Dict[str, float]) -> List[Dict]:
     """Get word positions for interactive wordcloud"""
     try:
-        wc = WordCloud(
-            width=WORDCLOUD_WIDTH, 
-            height=WORDCLOUD_HEIGHT, 
-            background_color=WORDCLOUD_BACKGROUND_COLOR
-        )
-        wc.generate_from_frequencies(freqs)
-        layout = getattr(wc, "layout_", []) or []
-        
-        words = []
-        for item in layout:
-            try:
-                (word, _freq), font_size, position, orientation, _color = item
-                x, y = position
-                words.append({
-                    "text": word,
-                    "font_size": int(font_size),
-                    "x": int(x),
-                    "y": int(y),
-                    "orientation": int(orientation or 0)
-                })
-            except Exception:
-                continue
-        return words
+        return layout_words(compute_wordcloud_layout(freqs))
     except Exception as e:
-        print(f"Error getting wordcloud layout: {e}")
+        logger.exception("Error getting wordcloud layout: %s", e)
         return []
@@ -0,0 +1,269 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .config import (
+    ANALYSIS_WORKERS,
+    ANALYSIS_CHUNK_SIZE,
+    ANALYSIS_MAX_IN_FLIGHT,
+    ANALYSIS_CHUNK_TIMEOUT,
+    ANALYSIS_CHUNK_RETRIES,
+    ANALYSIS_WORKER_MEMORY_MB,
+    ANALYSIS_WORKER_MAX_TASKS
+)
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+Item = Tuple[int, str]
+ChunkResult = Tuple[List[Dict[str, Any]], Dict[str, float]]
+
+# Stored for a comment that keeps failing or stalling on its own
+FALLBACK_RESULT = {
+    "sentiment": "REQUEST_CLARIFICATION",
+    "sentiment_score": 0.0,
+    "summary": "",
+    "keywords_json": "[]",
+    "margin": 0.0
+}
+
+
+class WorkerPoolError(RuntimeError):
+    """Raised when workers keep dying regardless of which chunk they run"""
+
+
+def _init_worker(memory_mb: int) -> None:
+    """Runs in each worker before the models are imported"""
+    # One BLAS thread per worker; the pool size is the parallelism knob
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    if memory_mb and resource is not None:
+        # Allocations past the cap raise MemoryError in this worker only
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def analyze_chunk(items: List[Item]) -> ChunkResult:
+    """Classify, summarize and extract keywords for (comment_id, text) pairs"""
+    # Imported here so _init_worker runs before numpy and the models load
+    from .utils import classify_intents, simple_summarize, comment_keywords
+
+    timings = {"classification": 0.0, "summarization": 0.0, "keywords": 0.0}
+    t0 = time.perf_counter()
+    predictions = classify_intents([text for _comment_id, text in items])
+    timings["classification"] = time.perf_counter() - t0
+    rows = []
+    for (comment_id, text), (label, score, margin) in zip(items, predictions):
+        t1 = time.perf_counter()
+        summary = simple_summarize(text)
+        t2 = time.perf_counter()
+        keywords = comment_keywords(text, top=5)
+        t3 = time.perf_counter()
+        timings["summarization"] += t2 - t1
+        timings["keywords"] += t3 - t2
+        rows.append({
+            "comment_id": comment_id,
+            "sentiment": label,
+            "sentiment_score": score,
+            "margin": margin,
+            "summary": summary,
+            "keywords_json": json.dumps(keywords)
+        })
+    return rows, timings
+
+
+def _terminate(executor: ProcessPoolExecutor) -> None:
+    """Kill the workers of a pool, including one stuck inside a task"""
+    terminate_workers = getattr(executor, "terminate_workers", None)
+    if terminate_workers is not None:  # Python 3.14+
+        terminate_workers()
+        return
+    for process in list((getattr(executor, "_processes", None) or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AnalysisPool:
+    """
+    Process pool that runs analysis chunks outside the web process.
+
+    A crashing, stalling or memory-hungry comment only takes down a worker:
+    the pool is replaced and the affected chunks are retried, then split in
+    half until the offending comment is isolated and stored with
+    FALLBACK_RESULT. The number of chunks in flight is capped across all
+    concurrent analyses, so big consultations queue instead of piling up
+    pickled work in memory. workers=0 runs chunks inline.
+    """
+
+    def __init__(
+        self,
+        workers: int = ANALYSIS_WORKERS,
+        chunk_size: int = ANALYSIS_CHUNK_SIZE,
+        max_in_flight: int = ANALYSIS_MAX_IN_FLIGHT,
+        timeout: float = ANALYSIS_CHUNK_TIMEOUT,
+        retries: int = ANALYSIS_CHUNK_RETRIES,
+        memory_mb: int = ANALYSIS_WORKER_MEMORY_MB,
+        max_tasks_per_child: int = ANALYSIS_WORKER_MAX_TASKS,
+        fn: Callable[[List[Item]], ChunkResult] = analyze_chunk
+    ):
+        self.workers = workers
+        self.chunk_size = max(1, chunk_size)
+        self.timeout = timeout
+        self.retries = retries
+        self.memory_mb = memory_mb
+        self.max_tasks_per_child = max_tasks_per_child or None
+        self.fn = fn
+        self._slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Enough failures of isolated chunks in a row to corner one bad
+        # comment; beyond that the workers themselves are broken
+        self.max_failure_streak = retries + 2 + self.chunk_size.bit_length()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a threaded server process is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.memory_mb,),
+                    max_tasks_per_child=self.max_tasks_per_child
+                )
+            return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """Replace a broken or stalled pool; the next submit starts fresh workers"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        _terminate(executor)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _requeue(
+        self,
+        queue: Deque[Tuple[List[Item], int]],
+        chunk: List[Item],
+        attempts: int,
+        error: BaseException
+    ) -> List[Dict[str, Any]]:
+        """Retry a failed chunk, bisect it, or give up on a single comment"""
+        if attempts < self.retries:
+            queue.append((chunk, attempts + 1))
+        elif len(chunk) > 1:
+            middle = len(chunk) // 2
+            # Halves get one attempt each so a bad comment is cornered quickly
+            queue.append((chunk[:middle], self.retries))
+            queue.append((chunk[middle:], self.retries))
+        else:
+            comment_id = chunk[0][0]
+            logger.warning("Analysis of comment %s failed, storing fallback: %r", comment_id, error)
+            return [{"comment_id": comment_id, **FALLBACK_RESULT}]
+        return []
+
+    def run(self, items: List[Item], inline: bool = False) -> Iterator[ChunkResult]:
+        """
+        Yield (rows, stage timings) per chunk as workers finish them, in any
+        order; inline runs them in this thread instead, e.g. to profile them.
+        """
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        if self.workers <= 0 or inline:
+            for chunk in chunks:
+                yield self.fn(chunk)
+            return
+
+        pending: Deque[Tuple[List[Item], int]] = deque((chunk, 0) for chunk in chunks)
+        # A dead worker fails every chunk running in its pool, so the culprit
+        # is unknown. Those chunks become suspects and run alone, one at a
+        # time, where a second failure can be blamed on the chunk itself.
+        suspects: Deque[Tuple[List[Item], int]] = deque()
+        in_flight: Dict[Future, Tuple[List[Item], int, bool, float, ProcessPoolExecutor]] = {}
+        failure_streak = 0
+        try:
+            while pending or suspects or in_flight:
+                isolating = any(entry[2] for entry in in_flight.values())
+                if suspects and not in_flight:
+                    self._slots.acquire()
+                    self._submit(suspects.popleft(), True, in_flight, suspects)
+                # Backpressure: only block for a slot when nothing of ours is running
+                while pending and not suspects and not isolating and self._slots.acquire(blocking=not in_flight):
+                    self._submit(pending.popleft(), False, in_flight, pending)
+                if not in_flight:
+                    continue
+
+                next_deadline = min(entry[3] for entry in in_flight.values())
+                done, _ = wait(
+                    list(in_flight),
+                    timeout=max(0.0, next_deadline - time.monotonic()),
+                    return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    chunk, attempts, suspect, _deadline, executor = in_flight.pop(future)
+                    self._slots.release()
+                    try:
+                        result = future.result()
+                    except (BrokenProcessPool, CancelledError) as e:
+                        self._discard(executor)
+                        if not suspect:
+                            suspects.append((chunk, attempts))
+                            continue
+                        failure_streak += 1
+                        if failure_streak > self.max_failure_streak:
+                            raise WorkerPoolError("Analysis workers keep failing; see worker logs") from e
+                        error = e
+                    except Exception as e:
+                        error = e
+                    else:
+                        failure_streak = 0
+                        yield result
+                        continue
+                    fallback = self._requeue(suspects if suspect else pending, chunk, attempts, error)
+                    if fallback:
+                        yield fallback, {}
+
+                now = time.monotonic()
+                for future, (chunk, attempts, suspect, deadline, executor) in list(in_flight.items()):
+                    if deadline <= now and not future.done():
+                        # Killing the workers fails every chunk of this pool
+                        # with BrokenProcessPool, which is handled above
+                        logger.warning("Analysis chunk of %d comments timed out, restarting workers", len(chunk))
+                        self._discard(executor)
+                        in_flight[future] = (chunk, attempts, suspect, now + self.timeout, executor)
+        finally:
+            for future in in_flight:
+                future.cancel()
+                self._slots.release()
+
+    def _submit(self, entry: Tuple[List[Item], int], suspect: bool, in_flight: Dict, queue: Deque) -> None:
+        """Send a chunk to the pool; the caller holds a slot for it"""
+        chunk, attempts = entry
+        executor = self._get_executor()
+        try:
+            future = executor.submit(self.fn, chunk)
+        except (BrokenProcessPool, RuntimeError):
+            # Pool broke between chunks; retry on a fresh one next round
+            self._slots.release()
+            self._discard(executor)
+            queue.appendleft(entry)
+            return
+        in_flight[future] = (chunk, attempts, suspect, time.monotonic() + self.timeout, executor)
+
+
+analysis_pool = AnalysisPool()
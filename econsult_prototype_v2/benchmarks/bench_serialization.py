@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for the large JSON endpoints
+
+Compares the default FastAPI path (jsonable_encoder + stdlib json) against
+FastJSONResponse (orjson, no re-encoding) and reports bytes on the wire
+uncompressed, gzipped and (when brotli is installed) brotli-compressed.
+
+    python benchmarks/bench_serialization.py --rows 20000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backend.config import GZIP_COMPRESSION_LEVEL, BROTLI_QUALITY, INTENT_COLORS
+from backend.responses import FastJSONResponse, orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+WORDS = (
+    "clause definition compliance disclosure auditor threshold transition "
+    "safe-harbour reporting related party transactions section board "
+    "ambiguity timeline stakeholders penalty exemption filing"
+).split()
+
+
+def make_comments_payload(rows: int, seed: int = 7) -> dict:
+    """Build a /comments-shaped payload of plain dicts"""
+    rng = random.Random(seed)
+    start = datetime(2025, 7, 1)
+    items = []
+    for i in range(rows):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))) + "."
+        items.append({
+            "id": 1000 + i,
+            "text": text,
+            "clause": f"Clause {rng.randint(1, 12)}({rng.choice('abcd')})",
+            "sentiment": rng.choice(list(INTENT_COLORS)),
+            "score": round(rng.random(), 3),
+            "summary": text[:160],
+            "keywords": rng.sample(WORDS, 5),
+            "created_at": (start + timedelta(days=rng.randint(0, 90))).isoformat()
+        })
+    return {"items": items}
+
+
+def time_call(fn, repeat: int) -> float:
+    """Best-of-N wall time in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def run(rows: int, repeat: int) -> dict:
+    payload = make_comments_payload(rows)
+
+    def default_path() -> bytes:
+        return JSONResponse(jsonable_encoder(payload)).body
+
+    def fast_path() -> bytes:
+        return FastJSONResponse(payload).body
+
+    before = default_path()
+    after = fast_path()
+    result = {
+        "rows": rows,
+        "orjson": orjson is not None,
+        "serialize_ms": {
+            "before": round(time_call(default_path, repeat), 2),
+            "after": round(time_call(fast_path, repeat), 2)
+        },
+        "bytes": {
+            "identity": len(after),
+            "gzip": len(gzip.compress(after, compresslevel=GZIP_COMPRESSION_LEVEL))
+        }
+    }
+    if brotli is not None:
+        result["bytes"]["br"] = len(brotli.compress(after, quality=BROTLI_QUALITY))
+    assert json.loads(before) == json.loads(after)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark result files
+
+    python -m benchmarks.compare baseline.json candidate.json --fail-above 10
+
+Exits non-zero when any benchmark regressed by more than --fail-above percent.
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+
+def headline(result: Dict[str, Any]) -> Tuple[str, Optional[float], bool]:
+    """Return (metric name, value, lower_is_better) for one benchmark entry"""
+    if "latency_ms" in result:
+        return "p95_ms", result["latency_ms"].get("p95"), True
+    if "rows_per_s" in result:
+        return "rows_per_s", result.get("rows_per_s"), False
+    return "seconds", result.get("seconds"), True
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any]):
+    base = {r["name"]: r for r in baseline.get("results", [])}
+    rows = []
+    for result in candidate.get("results", []):
+        name = result["name"]
+        metric, new, lower_is_better = headline(result)
+        old = headline(base[name])[1] if name in base else None
+        if not old or new is None:
+            rows.append((name, metric, old, new, None))
+            continue
+        change = (new - old) / old * 100.0
+        regression = change if lower_is_better else -change
+        rows.append((name, metric, old, new, regression))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--fail-above", type=float, default=None,
+                        help="exit 1 if any benchmark regresses by more than this percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline.get('commit', '?')[:12]}  rows={baseline.get('rows')}")
+    print(f"candidate {candidate.get('commit', '?')[:12]}  rows={candidate.get('rows')}")
+    print(f"{'benchmark':<22}{'metric':<12}{'baseline':>12}{'candidate':>12}{'regression':>12}")
+
+    worst = 0.0
+    for name, metric, old, new, regression in compare(baseline, candidate):
+        shown = "n/a" if regression is None else f"{regression:+.1f}%"
+        print(f"{name:<22}{metric:<12}{old if old is not None else '-':>12}{new if new is not None else '-':>12}{shown:>12}")
+        if regression is not None:
+            worst = max(worst, regression)
+
+    if args.fail_above is not None and worst > args.fail_above:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
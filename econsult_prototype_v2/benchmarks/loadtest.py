@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Concurrent mixed-workload load test
+
+Starts the API on a throwaway SQLite database (or targets --base-url),
+loads a synthetic consultation and analyzes it, then replays a scenario
+with an asyncio httpx driver for --duration seconds:
+
+- pollers: dashboard clients that alternately fetch /metrics and
+  /comments, revalidating with If-None-Match the way the browser does,
+  with a randomized pause between requests,
+- ingest bursts: every few seconds, a burst of concurrent /ingest_json
+  batches,
+- analyze: a periodic /analyze (409 while one is running is expected).
+
+The report gives throughput, latency percentiles, status counts and the
+error rate per operation. SQLite lock errors are counted three ways:
+responses saying the database is locked (503 from the API, or a route's
+own 500 error text), the server's econsult_db_lock_errors_total counter,
+which also sees background jobs, and "database is locked" lines in the
+server log.
+
+    python -m benchmarks.loadtest --scenario mixed --duration 30
+    python -m benchmarks.loadtest --scenario ingest_storm --out benchmarks/results/load.json
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000 --scenario dashboard
+
+Exits with status 1 if there were lock errors or the error rate exceeded
+--max-error-rate.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .run import latency_summary
+from .scaleout import start_nodes, stop_nodes, synthetic_items
+
+# Workload mixes: dashboard pollers, ingestion bursts and periodic analysis.
+# Intervals are seconds; an interval of 0 turns that part off.
+SCENARIOS = {
+    "dashboard": {
+        "pollers": 40, "poll_interval": 0.5,
+        "burst_interval": 0, "burst_requests": 0, "burst_rows": 0,
+        "analyze_interval": 0,
+    },
+    "ingest_storm": {
+        "pollers": 10, "poll_interval": 1.0,
+        "burst_interval": 1.0, "burst_requests": 20, "burst_rows": 50,
+        "analyze_interval": 0,
+    },
+    "analysis": {
+        "pollers": 20, "poll_interval": 1.0,
+        "burst_interval": 5.0, "burst_requests": 2, "burst_rows": 20,
+        "analyze_interval": 2.0,
+    },
+    "mixed": {
+        "pollers": 25, "poll_interval": 1.0,
+        "burst_interval": 3.0, "burst_requests": 8, "burst_rows": 25,
+        "analyze_interval": 5.0,
+    },
+}
+
+POLLED = ["/metrics", "/comments"]
+
+LOCK_MESSAGE = re.compile(r"database (table )?is locked")
+LOCK_COUNTER = re.compile(r"^econsult_db_lock_errors_total(?:\{[^}]*\})? (\S+)$", re.M)
+
+
+class Recorder:
+    """Latencies and outcomes per operation"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+        self.lock_errors: Dict[str, int] = {}
+
+    def record(self, name: str, elapsed_ms: float, outcome: str, failed: bool, locked: bool = False) -> None:
+        self.samples.setdefault(name, []).append(elapsed_ms)
+        statuses = self.statuses.setdefault(name, {})
+        statuses[outcome] = statuses.get(outcome, 0) + 1
+        if failed:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        if locked:
+            self.lock_errors[name] = self.lock_errors.get(name, 0) + 1
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, path: str,
+                      expected=(200,), **kwargs) -> Optional[httpx.Response]:
+        t0 = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.record(name, (time.perf_counter() - t0) * 1000.0, type(e).__name__, True)
+            return None
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        failed = response.status_code not in expected
+        locked = failed and bool(LOCK_MESSAGE.search(response.text))
+        self.record(name, elapsed, str(response.status_code), failed, locked)
+        return response
+
+
+async def poller(client: httpx.AsyncClient, recorder: Recorder, cid: int, interval: float,
+                 deadline: float, rng: random.Random) -> None:
+    """A dashboard: revalidates its last ETag per endpoint, like the browser"""
+    etags: Dict[str, str] = {}
+    turn = rng.randrange(len(POLLED))
+    # Spread the first requests out rather than starting every poller at once
+    await asyncio.sleep(rng.uniform(0, interval))
+    while time.monotonic() < deadline:
+        path = POLLED[turn % len(POLLED)]
+        turn += 1
+        headers = {"If-None-Match": etags[path]} if path in etags else {}
+        response = await recorder.request(
+            client, path.strip("/"), "GET", path, expected=(200, 304),
+            params={"consultation_id": cid}, headers=headers
+        )
+        if response is not None and "etag" in response.headers:
+            etags[path] = response.headers["etag"]
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * interval)
+
+
+async def ingest_bursts(client: httpx.AsyncClient, recorder: Recorder, cid: int, interval: float,
+                        requests: int, rows: int, deadline: float, items: List[Dict[str, str]]) -> None:
+    """Every interval, post requests batches of rows at once"""
+    sent = 0
+    while time.monotonic() + interval < deadline:
+        await asyncio.sleep(interval)
+        batches = []
+        for _ in range(requests):
+            batch = [dict(items[(sent + i) % len(items)], comment_id="") for i in range(rows)]
+            sent += rows
+            batches.append(batch)
+        await asyncio.gather(*(
+            recorder.request(client, "ingest_json", "POST", "/ingest_json",
+                             params={"consultation_id": cid}, json=batch)
+            for batch in batches
+        ))
+
+
+async def analyzer(client: httpx.AsyncClient, recorder: Recorder, cid: int, interval: float,
+                   deadline: float) -> None:
+    """Every interval, ask for an analysis of what has arrived since the last one"""
+    while time.monotonic() + interval < deadline:
+        await asyncio.sleep(interval)
+        await recorder.request(
+            client, "analyze", "POST", "/analyze", expected=(200, 409), params={"consultation_id": cid}
+        )
+
+
+async def server_lock_errors(client: httpx.AsyncClient) -> Optional[float]:
+    """The server's lock error counter summed over statements, or None if unavailable"""
+    try:
+        response = await client.get("/metrics/internal")
+    except httpx.HTTPError:
+        return None
+    if response.status_code != 200:
+        return None
+    return sum(float(value) for value in LOCK_COUNTER.findall(response.text))
+
+
+async def drive(base_url: str, scenario: Dict[str, Any], duration: float, rows: int, seed: int) -> Dict[str, Any]:
+    """Load a consultation, then run the scenario against it"""
+    rng = random.Random(seed)
+    items = synthetic_items(max(rows, 1), seed)
+    limits = httpx.Limits(max_connections=scenario["pollers"] + scenario["burst_requests"] + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        cid = (await client.post("/consultations", json={"name": "Load test"})).json()["id"]
+        t0 = time.perf_counter()
+        for start in range(0, rows, 500):
+            response = await client.post(
+                "/ingest_json", params={"consultation_id": cid}, json=items[start:start + 500]
+            )
+            response.raise_for_status()
+        (await client.post("/analyze", params={"consultation_id": cid})).raise_for_status()
+        setup = time.perf_counter() - t0
+
+        locks_before = await server_lock_errors(client)
+        recorder = Recorder()
+        deadline = time.monotonic() + duration
+        tasks = [
+            poller(client, recorder, cid, scenario["poll_interval"], deadline, random.Random(rng.random()))
+            for _ in range(scenario["pollers"])
+        ]
+        if scenario["burst_interval"] and scenario["burst_requests"]:
+            tasks.append(ingest_bursts(
+                client, recorder, cid, scenario["burst_interval"], scenario["burst_requests"],
+                scenario["burst_rows"], deadline, items
+            ))
+        if scenario["analyze_interval"]:
+            tasks.append(analyzer(client, recorder, cid, scenario["analyze_interval"], deadline))
+        t0 = time.perf_counter()
+        await asyncio.gather(*tasks)
+        seconds = time.perf_counter() - t0
+        locks_after = await server_lock_errors(client)
+
+    total = sum(len(s) for s in recorder.samples.values())
+    failed = sum(recorder.errors.values())
+    return {
+        "setup_seconds": round(setup, 3),
+        "seconds": round(seconds, 3),
+        "requests": total,
+        "requests_per_s": round(total / seconds, 1) if seconds else 0.0,
+        "error_rate": round(failed / total, 4) if total else 0.0,
+        "operations": {
+            name: {
+                "requests": len(samples),
+                "requests_per_s": round(len(samples) / seconds, 1) if seconds else 0.0,
+                "latency_ms": latency_summary(samples),
+                "statuses": recorder.statuses[name],
+                "errors": recorder.errors.get(name, 0),
+            }
+            for name, samples in sorted(recorder.samples.items())
+        },
+        "sqlite_lock_errors": {
+            "responses": recorder.lock_errors,
+            "server": None if locks_before is None or locks_after is None else locks_after - locks_before,
+        },
+    }
+
+
+def lock_errors_in_log(log: Path) -> int:
+    try:
+        return len(LOCK_MESSAGE.findall(log.read_text(errors="replace")))
+    except OSError:
+        return 0
+
+
+def run(scenario: str = "mixed", duration: float = 20.0, rows: int = 1000, seed: int = 42,
+        workers: int = 0, base_url: str = None, workdir: Path = None,
+        overrides: Dict[str, Any] = None) -> Dict[str, Any]:
+    if scenario not in SCENARIOS:
+        raise ValueError(f"scenario must be one of {', '.join(SCENARIOS)}, not {scenario!r}")
+    mix = {**SCENARIOS[scenario], **(overrides or {})}
+    report: Dict[str, Any] = {"scenario": scenario, "mix": mix, "duration": duration, "rows": rows}
+    started = []
+    if base_url is None:
+        workdir = Path(workdir or tempfile.mkdtemp(prefix="econsult-loadtest-"))
+        started = start_nodes(1, workdir, workers, "local")
+        base_url = started[0][1]
+        report["workdir"] = str(workdir)
+    try:
+        report.update(asyncio.run(drive(base_url, mix, duration, rows, seed)))
+    finally:
+        stop_nodes(started)
+    if started:
+        report["sqlite_lock_errors"]["log"] = lock_errors_in_log(workdir / "node0.log")
+    locks = report["sqlite_lock_errors"]
+    report["lock_errors"] = int(max(sum(locks["responses"].values()), locks["server"] or 0, locks.get("log", 0)))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay concurrent ingestion, analysis and dashboard reads")
+    parser.add_argument("--scenario", default="mixed", choices=sorted(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--rows", type=int, default=1000, help="synthetic comments loaded before the run")
+    parser.add_argument("--pollers", type=int, default=None, help="override the scenario's dashboard clients")
+    parser.add_argument("--workers", type=int, default=0, help="ANALYSIS_WORKERS of the started server")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--base-url", default=None, help="load a running server instead")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="fail above this fraction of errors")
+    parser.add_argument("--out", default=None, help="write JSON results to this path")
+    args = parser.parse_args()
+
+    overrides = {"pollers": args.pollers} if args.pollers is not None else None
+    report = run(
+        args.scenario, args.duration, args.rows, seed=args.seed, workers=args.workers,
+        base_url=args.base_url, overrides=overrides
+    )
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(text)
+        print(f"Wrote {args.out}")
+    else:
+        print(text)
+    sys.exit(1 if report["lock_errors"] or report["error_rate"] > args.max_error_rate else 0)
+
+
+if __name__ == "__main__":
+    main()
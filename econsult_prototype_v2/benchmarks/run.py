@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark suite
+
+Loads a synthetic consultation through /upload_csv, runs /analyze, then
+times the dashboard read endpoints, both building each response and
+serving it from the response cache (reported as <name>_cached). Results are written as JSON so runs can
+be compared across commits with benchmarks/compare.py.
+
+    python -m benchmarks.run --rows 5000 --out benchmarks/results/HEAD.json
+    python -m benchmarks.run --base-url http://127.0.0.1:8000
+
+In-process runs use a throwaway SQLite database and artifact directories,
+never ./comments.db or backend/static.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from .synthetic import csv_chunks
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Rows per /upload_csv request, under the API's INGEST_MAX_REQUEST_COMMENTS
+# (100000) and INGEST_MAX_UPLOAD_BYTES caps, so a 1M-row run is ten uploads
+UPLOAD_CHUNK_ROWS = 50000
+
+READ_ENDPOINTS = [
+    ("comments", "/comments", {}),
+    ("metrics", "/metrics", {}),
+    ("comments_by_keyword", "/comments_by_keyword", {"word": "clause"}),
+    ("wordcloud_map", "/wordcloud_map", {}),
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(samples_ms: List[float]) -> Dict[str, float]:
+    return {
+        "mean": round(sum(samples_ms) / len(samples_ms), 3) if samples_ms else 0.0,
+        "p50": round(percentile(samples_ms, 50), 3),
+        "p95": round(percentile(samples_ms, 95), 3),
+        "p99": round(percentile(samples_ms, 99), 3),
+        "max": round(max(samples_ms), 3) if samples_ms else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def timed(fn: Callable[[], Any]):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def make_client(base_url: str = None):
+    """HTTP client for a live server, or an in-process TestClient on a temp DB"""
+    if base_url:
+        import httpx
+        return httpx.Client(base_url=base_url, timeout=None)
+    tmpdir = tempfile.mkdtemp(prefix="econsult-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    # Word clouds, topic models, feature rows and profiles stay out of the source tree too
+    os.environ["ARTIFACTS_DIR"] = f"{tmpdir}/artifacts"
+    os.environ["FEATURE_CACHE_DIR"] = f"{tmpdir}/feature_cache"
+    # Repeated runs from one process must not be throttled
+    os.environ["INGEST_RATE_PER_SECOND"] = "0"
+    sys.path.insert(0, str(PROJECT_DIR))
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    return TestClient(app)
+
+
+def upload(client, body: bytes):
+    """POST one CSV, waiting out 429s from a live server's rate limit"""
+    while True:
+        response = client.post("/upload_csv", files={"file": ("synthetic.csv", body, "text/csv")})
+        if response.status_code != 429:
+            response.raise_for_status()
+            return response
+        time.sleep(float(response.headers.get("Retry-After", "1")))
+
+
+def bench_ingest(client, rows: int, seed: int) -> Dict[str, Any]:
+    ingested, size, seconds, requests = 0, 0, 0.0, 0
+    for body in csv_chunks(rows, seed=seed, chunk_rows=UPLOAD_CHUNK_ROWS):
+        response, elapsed = timed(lambda: upload(client, body))
+        ingested += response.json().get("ingested", 0)
+        size += len(body)
+        seconds += elapsed
+        requests += 1
+    return {
+        "name": "upload_csv",
+        "rows": ingested,
+        "requests": requests,
+        "bytes_in": size,
+        "seconds": round(seconds, 4),
+        "rows_per_s": round(ingested / seconds, 1) if seconds else 0.0,
+    }
+
+
+def bench_analyze(client) -> Dict[str, Any]:
+    response, seconds = timed(lambda: client.post("/analyze"))
+    response.raise_for_status()
+    processed = response.json().get("processed", 0)
+    return {
+        "name": "analyze",
+        "rows": processed,
+        "seconds": round(seconds, 4),
+        "rows_per_s": round(processed / seconds, 1) if seconds else 0.0,
+    }
+
+
+def _read_samples(client, path: str, requests: List[Dict[str, str]]):
+    samples = []
+    size = 0
+    for params in requests:
+        response, seconds = timed(lambda: client.get(path, params=params))
+        response.raise_for_status()
+        samples.append(seconds * 1000.0)
+        size = len(response.content)
+    return samples, size
+
+
+def _read_result(name: str, samples: List[float], size: int) -> Dict[str, Any]:
+    total = sum(samples) / 1000.0
+    return {
+        "name": name,
+        "requests": len(samples),
+        "bytes": size,
+        "latency_ms": latency_summary(samples),
+        "requests_per_s": round(len(samples) / total, 1) if total else 0.0,
+    }
+
+
+def bench_read(client, name: str, path: str, params: Dict[str, str], repeat: int) -> List[Dict[str, Any]]:
+    """
+    Time an endpoint twice: uncached, where a throwaway query parameter
+    makes every request miss the API's response cache and build the body,
+    and cached, where repeats of one URL are served from that cache.
+    """
+    client.get(path, params=params)  # warm-up
+    uncached, size = _read_samples(client, path, [{**params, "_bench": str(i)} for i in range(repeat)])
+    cached, _ = _read_samples(client, path, [params] * repeat)
+    return [_read_result(name, uncached, size), _read_result(f"{name}_cached", cached, size)]
+
+
+def run_suite(client, rows: int, repeat: int, seed: int) -> List[Dict[str, Any]]:
+    client.post("/clear")
+    results = [bench_ingest(client, rows, seed), bench_analyze(client)]
+    for name, path, params in READ_ENDPOINTS:
+        results.extend(bench_read(client, name, path, params, repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the endpoint benchmark suite")
+    parser.add_argument("--rows", type=int, default=2000, help="synthetic comments to ingest")
+    parser.add_argument("--repeat", type=int, default=20, help="requests per read endpoint")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--base-url", default=None, help="benchmark a running server instead")
+    parser.add_argument("--out", default=None, help="write JSON results to this path")
+    args = parser.parse_args()
+
+    client = make_client(args.base_url)
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "target": args.base_url or "in-process",
+        "rows": args.rows,
+        "seed": args.seed,
+        "results": run_suite(client, args.rows, args.repeat, args.seed),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(text)
+        print(f"Wrote {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Multi-node consistency and load test
+
+Starts several API processes on one throwaway SQLite database with
+STATE_BACKEND=database and a separate, empty ARTIFACTS_DIR each, the way
+nodes behind a load balancer run, then spreads every step over them:
+
+1. ingests synthetic comments in batches sent to the nodes in turn,
+2. posts /analyze to every node at once (only one may run),
+3. drives a mixed read/write load round-robin for --duration seconds,
+4. writes through one node and counts through the next, which must see it,
+5. fetches each read endpoint from every node, which must return the same
+   body and ETag,
+6. profiles an analysis on one node and downloads the profile from every
+   other node,
+7. streams /events from each node while writing through another, which
+   must deliver the write's event.
+
+    python -m benchmarks.scaleout --nodes 3 --rows 2000 --duration 10
+    python -m benchmarks.scaleout --out benchmarks/results/scaleout.json
+
+Exits with status 1 if any check finds an inconsistency.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from .run import PROJECT_DIR, latency_summary
+from .synthetic import generate_comments
+
+# Endpoints every node must answer identically once analysis is done
+CONSISTENT_READS = [
+    ("/metrics", {}),
+    ("/metrics/cube", {"dims": "clause,label"}),
+    ("/comments/count", {}),
+    ("/topics", {}),
+    ("/summary", {}),
+    ("/wordcloud_map", {}),
+    ("/wordcloud", {}),
+    ("/wordcloud", {"size": "thumb", "format": "webp"}),
+]
+
+# Mixed-load operations and their relative weights
+LOAD_MIX = [
+    ("metrics", "GET", "/metrics", 4),
+    ("count", "GET", "/comments/count", 3),
+    ("wordcloud_map", "GET", "/wordcloud_map", 2),
+    ("topics", "GET", "/topics", 1),
+    ("ingest", "POST", "/ingest_json", 2),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def node_env(workdir: Path, index: int, database_url: str, workers: int, state_backend: str) -> Dict[str, str]:
+    """Environment of one node: shared database, nothing else shared"""
+    local = workdir / f"node{index}"
+    return {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "STATE_BACKEND": state_backend,
+        "ARTIFACTS_DIR": str(local / "artifacts"),
+        "FEATURE_CACHE_DIR": str(local / "features"),
+        "ANALYSIS_WORKERS": str(workers),
+        "INGEST_RATE_PER_SECOND": "0",
+    }
+
+
+def wait_ready(process: subprocess.Popen, base_url: str, log: Path, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Node {base_url} exited:\n{log.read_text()[-2000:]}")
+        try:
+            if httpx.get(f"{base_url}/consultations", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Node {base_url} did not start within {timeout:.0f}s")
+
+
+def start_nodes(count: int, workdir: Path, workers: int, state_backend: str) -> List[Tuple[subprocess.Popen, str]]:
+    """Start count uvicorn processes; the first creates the tables before the rest start"""
+    database_url = f"sqlite:///{(workdir / 'shared.db').as_posix()}"
+    nodes = []
+    for index in range(count):
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        log = workdir / f"node{index}.log"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=PROJECT_DIR,
+            env=node_env(workdir, index, database_url, workers, state_backend),
+            stdout=open(log, "wb"),
+            stderr=subprocess.STDOUT,
+        )
+        nodes.append((process, base_url))
+        if index == 0:
+            wait_ready(process, base_url, log)
+    for index, (process, base_url) in enumerate(nodes):
+        wait_ready(process, base_url, workdir / f"node{index}.log")
+    return nodes
+
+
+def stop_nodes(nodes: List[Tuple[subprocess.Popen, str]]) -> None:
+    for process, _ in nodes:
+        process.terminate()
+    for process, _ in nodes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def synthetic_items(rows: int, seed: int) -> List[Dict[str, str]]:
+    return [
+        {
+            "comment_id": row["comment_id"],
+            "targets_comment_id": row["targets_comment_id"],
+            "text": row["Comment"],
+            "clause": row["Clause"] or "overall",
+            "stakeholder_type": row["stakeholder_type"],
+        }
+        for row in generate_comments(rows, seed=seed)
+    ]
+
+
+def ingest(clients: List[httpx.Client], cid: int, rows: int, seed: int, batch: int) -> Dict[str, Any]:
+    """Upload batches concurrently, each to the next node"""
+    items = synthetic_items(rows, seed)
+    batches = [items[start:start + batch] for start in range(0, len(items), batch)]
+
+    def send(index: int) -> int:
+        response = clients[index % len(clients)].post(
+            "/ingest_json", params={"consultation_id": cid}, json=batches[index]
+        )
+        response.raise_for_status()
+        return len(response.json()["ids"])
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients) * 2) as pool:
+        ingested = sum(pool.map(send, range(len(batches))))
+    seconds = time.perf_counter() - t0
+    return {"rows": ingested, "batches": len(batches), "seconds": round(seconds, 3),
+            "rows_per_s": round(ingested / seconds, 1) if seconds else 0.0}
+
+
+def analyze_race(clients: List[httpx.Client], cid: int) -> Dict[str, Any]:
+    """Post /analyze to every node at once; the job lock must let exactly one through"""
+    barrier = threading.Barrier(len(clients))
+
+    def analyze(client: httpx.Client) -> int:
+        barrier.wait()
+        return client.post("/analyze", params={"consultation_id": cid}).status_code
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        statuses = list(pool.map(analyze, clients))
+    return {"statuses": statuses, "seconds": round(time.perf_counter() - t0, 3),
+            "ok": statuses.count(200) == 1 and statuses.count(409) == len(clients) - 1}
+
+
+def mixed_load(clients: List[httpx.Client], cid: int, duration: float, concurrency: int, seed: int) -> Dict[str, Any]:
+    """Weighted reads and single-comment writes against the nodes in turn"""
+    samples: Dict[str, List[float]] = {name: [] for name, _, _, _ in LOAD_MIX}
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    weights = [weight for *_, weight in LOAD_MIX]
+
+    def worker(worker_id: int) -> None:
+        rng = random.Random(seed + worker_id)
+        turn = worker_id
+        while time.monotonic() < deadline:
+            name, method, path, _ = rng.choices(LOAD_MIX, weights)[0]
+            client = clients[turn % len(clients)]
+            turn += 1
+            body = [{"text": f"Load test comment {worker_id}-{turn} on the filing threshold.", "clause": "Load"}]
+            t0 = time.perf_counter()
+            try:
+                if method == "POST":
+                    response = client.post(path, params={"consultation_id": cid}, json=body)
+                else:
+                    response = client.get(path, params={"consultation_id": cid})
+                failed = response.status_code >= 400
+                key = str(response.status_code)
+            except httpx.HTTPError as e:
+                failed, key = True, type(e).__name__
+            elapsed = (time.perf_counter() - t0) * 1000.0
+            with lock:
+                samples[name].append(elapsed)
+                if failed:
+                    errors[f"{name}:{key}"] = errors.get(f"{name}:{key}", 0) + 1
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - t0
+    total = sum(len(s) for s in samples.values())
+    return {
+        "seconds": round(seconds, 3),
+        "requests": total,
+        "requests_per_s": round(total / seconds, 1) if seconds else 0.0,
+        "latency_ms": {name: latency_summary(s) for name, s in samples.items() if s},
+        "errors": errors,
+    }
+
+
+def read_your_writes(clients: List[httpx.Client], cid: int, checks: int) -> Dict[str, Any]:
+    """Write through one node and count through the next; every count must include the write"""
+    stale = 0
+    for i in range(checks):
+        writer, reader = clients[i % len(clients)], clients[(i + 1) % len(clients)]
+        before = reader.get("/comments/count", params={"consultation_id": cid}).json()["count"]
+        writer.post(
+            "/ingest_json", params={"consultation_id": cid}, json=[{"text": f"Consistency check {i}.", "clause": "Check"}]
+        ).raise_for_status()
+        after = reader.get("/comments/count", params={"consultation_id": cid}).json()["count"]
+        stale += after != before + 1
+    return {"checks": checks, "stale_reads": stale}
+
+
+def compare_nodes(clients: List[httpx.Client], cid: int) -> List[Dict[str, Any]]:
+    """Endpoints whose body or ETag differs between nodes"""
+    mismatches = []
+    for path, params in CONSISTENT_READS:
+        seen = set()
+        for client in clients:
+            response = client.get(path, params={"consultation_id": cid, **params})
+            seen.add((response.status_code, hashlib.sha256(response.content).hexdigest(), response.headers.get("etag")))
+        if len(seen) > 1:
+            mismatches.append({"path": path, "params": params, "variants": len(seen)})
+    return mismatches
+
+
+def shared_profiles(clients: List[httpx.Client], profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Fetch a profile taken on one node from every node; all must serve the same bytes"""
+    served = set()
+    for client in clients:
+        summary, download = client.get(profile["summary_url"]), client.get(profile["download_url"])
+        listed = any(item["id"] == profile["id"] for item in client.get("/profiles").json()["items"])
+        if summary.status_code == download.status_code == 200 and listed:
+            served.add(hashlib.sha256(download.content).hexdigest())
+        else:
+            served.add(None)
+    return {"id": profile["id"], "ok": len(served) == 1 and None not in served}
+
+
+def shared_events(clients: List[httpx.Client], cid: int, timeout: float = 10.0) -> Dict[str, Any]:
+    """Write through each node while streaming /events from the next; every stream must get the write"""
+    missed = 0
+    for i in range(len(clients)):
+        writer, reader = clients[i], clients[(i + 1) % len(clients)]
+        received = False
+        try:
+            with reader.stream("GET", "/events", timeout=timeout) as stream:
+                lines = stream.iter_lines()
+                # The first line arrives once the node has subscribed this stream
+                next(lines)
+                ids = writer.post(
+                    "/ingest_json", params={"consultation_id": cid},
+                    json=[{"text": f"Event check {i}.", "clause": "Check"}]
+                ).json()["ids"]
+                for line in lines:
+                    if line.startswith("data:") and json.loads(line[5:]).get("ids") == ids:
+                        received = True
+                        break
+        except httpx.HTTPError:
+            pass
+        missed += not received
+    return {"checks": len(clients), "missed": missed}
+
+
+def run(nodes: int, rows: int, duration: float, concurrency: int, seed: int = 42,
+        batch: int = 200, workers: int = 0, checks: int = 20, state_backend: str = "database",
+        workdir: Path = None) -> Dict[str, Any]:
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="econsult-scaleout-"))
+    started = start_nodes(nodes, workdir, workers, state_backend)
+    clients = [httpx.Client(base_url=base_url, timeout=300) for _, base_url in started]
+    try:
+        cid = clients[0].post("/consultations", json={"name": "Scale-out test"}).json()["id"]
+        report: Dict[str, Any] = {
+            "nodes": nodes, "rows": rows, "state_backend": state_backend, "workdir": str(workdir)
+        }
+        report["ingest"] = ingest(clients, cid, rows, seed, batch)
+        report["analyze"] = analyze_race(clients, cid)
+        report["mixed_load"] = mixed_load(clients, cid, duration, concurrency, seed)
+        report["read_your_writes"] = read_your_writes(clients, cid, checks)
+        # Fold the load's new comments into the analysis so all nodes have the same word cloud to serve
+        analysis = clients[-1].post("/analyze", params={"consultation_id": cid, "profile": "true"})
+        analysis.raise_for_status()
+        report["mismatches"] = compare_nodes(clients, cid)
+        report["profiles"] = shared_profiles(clients, analysis.json()["profile"])
+        report["events"] = shared_events(clients, cid)
+        report["consistent"] = (
+            report["analyze"]["ok"]
+            and not report["read_your_writes"]["stale_reads"]
+            and not report["mismatches"]
+            and report["profiles"]["ok"]
+            and not report["events"]["missed"]
+        )
+        return report
+    finally:
+        for client in clients:
+            client.close()
+        stop_nodes(started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check consistency and throughput of several API nodes")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=2000, help="synthetic comments to ingest")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of mixed load")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients during the mixed load")
+    parser.add_argument("--workers", type=int, default=0, help="ANALYSIS_WORKERS per node")
+    parser.add_argument(
+        "--state-backend", default="database", help="STATE_BACKEND of the nodes; 'local' shows what goes wrong without sharing"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="write JSON results to this path")
+    args = parser.parse_args()
+
+    report = run(
+        args.nodes, args.rows, args.duration, args.concurrency,
+        seed=args.seed, workers=args.workers, state_backend=args.state_backend
+    )
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(text)
+        print(f"Wrote {args.out}")
+    else:
+        print(text)
+    sys.exit(0 if report["consistent"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Synthetic consultation generator
+
+Produces comments shaped like mca_intent_dataset_850.csv (comment_id, Comment,
+Label, Clause, targets_comment_id, Date, stakeholder_type). Sentence templates
+and the label/clause/stakeholder mix are learned from the sample dataset, and
+replies are threaded onto recent root comments of the same clause. Rows are
+generated lazily, so writing 1M rows needs constant memory.
+
+    python -m benchmarks.synthetic --rows 1000000 --out synthetic_1m.csv
+"""
+
+import argparse
+import csv
+import random
+import re
+from collections import defaultdict, deque
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional
+
+SAMPLE_DATASET = Path(__file__).resolve().parent.parent.parent / "mca_intent_dataset_850.csv"
+
+FIELDNAMES = ["comment_id", "Comment", "Label", "Clause", "targets_comment_id", "Date", "stakeholder_type"]
+
+# Used when the sample dataset is not available
+FALLBACK_TEMPLATES = {
+    "AGREE": ["Support the approach under {clause}."],
+    "DISAGREE": ["Oppose the current wording in {clause}."],
+    "SUGGEST_CHANGE": ["Suggest introducing a safe-harbour threshold under {clause}."],
+    "REQUEST_CLARIFICATION": ["Kindly specify the effective date for {clause}."],
+    "CLAUSE_FEEDBACK": ["{clause} appears ambiguous regarding its definitions."],
+}
+FALLBACK_TAILS = ["This will directly impact stakeholders.", "More clarification is needed."]
+FALLBACK_CLAUSES = ["Clause 1", "Clause 2", "Clause 3", "Clause 4(b)", "Clause 5"]
+FALLBACK_STAKEHOLDERS = ["Auditor", "Company", "Consultant", "Individual", "Startup"]
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+
+class ConsultationModel:
+    """Templates and category weights learned from a labeled sample CSV"""
+
+    def __init__(self, sample_path: Optional[Path] = SAMPLE_DATASET):
+        self.templates: Dict[str, List[str]] = defaultdict(list)
+        self.tails: List[str] = []
+        self.labels: List[str] = []
+        self.clauses: List[str] = []
+        self.stakeholders: List[str] = []
+        self.reply_rate = 0.3
+        if sample_path is not None and Path(sample_path).exists():
+            self._learn(Path(sample_path))
+        else:
+            self.templates.update(FALLBACK_TEMPLATES)
+            self.tails = list(FALLBACK_TAILS)
+            self.labels = list(FALLBACK_TEMPLATES)
+            self.clauses = list(FALLBACK_CLAUSES)
+            self.stakeholders = list(FALLBACK_STAKEHOLDERS)
+
+    def _learn(self, path: Path) -> None:
+        tails = set()
+        replies = 0
+        with open(path, encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            label = row.get("Label") or "CLAUSE_FEEDBACK"
+            clause = row.get("Clause") or ""
+            sentences = SENTENCE_SPLIT.split((row.get("Comment") or "").strip())
+            head = sentences[0].replace(clause or "Overall", "{clause}")
+            if "{clause}" in head:
+                self.templates[label].append(head)
+            tails.update(s for s in sentences[1:] if clause not in s or not clause)
+            # Keep the sampled lists weighted by their observed frequency
+            self.labels.append(label)
+            self.clauses.append(clause or "overall")
+            self.stakeholders.append(row.get("stakeholder_type") or "Individual")
+            replies += bool(row.get("targets_comment_id"))
+        self.tails = sorted(tails)
+        self.reply_rate = replies / max(len(rows), 1)
+        for label in set(self.labels) - set(self.templates):
+            self.templates[label] = list(FALLBACK_TEMPLATES.get(label, FALLBACK_TEMPLATES["CLAUSE_FEEDBACK"]))
+
+
+def generate_comments(
+    rows: int,
+    seed: int = 42,
+    start_id: int = 1001,
+    start_date: date = date(2025, 7, 20),
+    days: int = 60,
+    model: Optional[ConsultationModel] = None
+) -> Iterator[Dict[str, str]]:
+    """Yield `rows` synthetic comments in the sample dataset's column layout"""
+    rng = random.Random(seed)
+    model = model or ConsultationModel()
+    # Recent thread roots per clause, so replies stay on-topic
+    roots: Dict[str, Deque[int]] = defaultdict(lambda: deque(maxlen=50))
+
+    for i in range(rows):
+        comment_id = start_id + i
+        clause = rng.choice(model.clauses)
+        target = ""
+        if roots[clause] and rng.random() < model.reply_rate:
+            target = str(rng.choice(roots[clause]))
+            label = rng.choice(("AGREE", "AGREE", "DISAGREE", "REQUEST_CLARIFICATION"))
+        else:
+            label = rng.choice(model.labels)
+            roots[clause].append(comment_id)
+
+        templates = model.templates.get(label) or FALLBACK_TEMPLATES["CLAUSE_FEEDBACK"]
+        sentences = [rng.choice(templates).format(clause=clause if clause != "overall" else "Overall")]
+        for _ in range(rng.choice((0, 0, 1, 1, 2))):
+            sentences.append(rng.choice(model.tails))
+
+        yield {
+            "comment_id": str(comment_id),
+            "Comment": " ".join(sentences),
+            "Label": label,
+            "Clause": "" if clause == "overall" else clause,
+            "targets_comment_id": target,
+            "Date": (start_date + timedelta(days=rng.randrange(days))).isoformat(),
+            "stakeholder_type": rng.choice(model.stakeholders),
+        }
+
+
+def write_csv(path, rows: int, seed: int = 42) -> int:
+    """Stream synthetic comments to a CSV file; returns the row count"""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for row in generate_comments(rows, seed=seed):
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def to_csv_bytes(rows: int, seed: int = 42) -> bytes:
+    """Render synthetic comments as an in-memory CSV upload body"""
+    import io
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=FIELDNAMES)
+    writer.writeheader()
+    writer.writerows(generate_comments(rows, seed=seed))
+    return buf.getvalue().encode("utf-8")
+
+
+def csv_chunks(rows: int, seed: int = 42, chunk_rows: int = 50000) -> Iterator[bytes]:
+    """The rows of to_csv_bytes as several upload bodies of at most chunk_rows each"""
+    import io
+    comments = generate_comments(rows, seed=seed)
+    for start in range(0, rows, chunk_rows):
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(next(comments) for _ in range(min(chunk_rows, rows - start)))
+        yield buf.getvalue().encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic consultation CSV")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="synthetic_comments.csv")
+    args = parser.parse_args()
+    count = write_csv(args.out, args.rows, seed=args.seed)
+    print(f"Wrote {count} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,18 @@ class EConsultationDashboard {
         this.totalPages = 1;
         this.currentView = 'card'; // 'card' or 'table'
         this.filteredComments = [];
+        // Full comments fetched by viewComment; list rows only carry a preview
+        this.commentDetails = new Map();
+        // The table renders only the rows in view; each row is this tall (see .virtual-row)
+        this.tableRowHeight = 52;
+        this.tableWindow = null;
+        this.tableFrame = null;
+        this.searchRequest = 0;
+        this.metricsCache = null;
+        this.eventSource = null;
+        this.liveUpdates = false;
+        // ?consultation=<id> selects which consultation the dashboard shows
+        this.consultationId = new URLSearchParams(window.location.search).get('consultation') || '1';
         this.init();
     }
 
@@ -20,6 +32,7 @@ class EConsultationDashboard {
         this.setupDragAndDrop();
         this.setupKeyboardShortcuts();
         this.setupAutoRefresh();
+        this.setupEventStream();
         this.setupSearchSuggestions();
     }
 
@@ -203,7 +216,7 @@ class EConsultationDashboard {
             
             document.getElementById('bulkText').value = '';
             this.handleTextInput({ target: { value: '' } });
-            await this.loadInitialData();
+            if (!this.liveUpdates) await this.loadInitialData();
             
         } catch (error) {
             this.showStatusMessage('uploadMsg', 'Failed to ingest comments: ' + error.message, 'error');
@@ -247,7 +260,7 @@ class EConsultationDashboard {
             
             fileInput.value = '';
             document.getElementById('csvBtn').disabled = true;
-            await this.loadInitialData();
+            if (!this.liveUpdates) await this.loadInitialData();
             
         } catch (error) {
             this.showStatusMessage('csvMsg', 'CSV upload failed: ' + error.message, 'error');
@@ -272,8 +285,10 @@ class EConsultationDashboard {
             this.showStatusMessage('analyzeMsg', `Analysis complete: ${result.processed || 0} comments processed`, 'success');
             this.showToast(`Analysis complete: ${result.processed || 0} comments processed`, 'success');
             
-            this.refreshWordCloud();
-            await this.loadInitialData();
+            if (!this.liveUpdates) {
+                this.refreshWordCloud();
+                await this.loadInitialData();
+            }
             
         } catch (error) {
             if (error.message.includes('500')) {
@@ -306,12 +321,7 @@ class EConsultationDashboard {
             this.showStatusMessage('clearMsg', result.message || 'All data cleared successfully', 'success');
             this.showToast('All data cleared successfully', 'success');
             
-            await this.loadInitialData();
-            
-            const wordCloudImg = document.getElementById('wordCloudImg');
-            const wordCloudPlaceholder = document.getElementById('wordCloudPlaceholder');
-            if (wordCloudImg) wordCloudImg.style.display = 'none';
-            if (wordCloudPlaceholder) wordCloudPlaceholder.style.display = 'block';
+            if (!this.liveUpdates) await this.applyClear();
             
         } catch (error) {
             this.showStatusMessage('clearMsg', 'Failed to clear data: ' + error.message, 'error');
@@ -366,12 +376,20 @@ class EConsultationDashboard {
         this.applyFilters();
     }
 
+    async applyClear() {
+        await this.loadInitialData();
+        
+        const wordCloudImg = document.getElementById('wordCloudImg');
+        const wordCloudPlaceholder = document.getElementById('wordCloudPlaceholder');
+        if (wordCloudImg) wordCloudImg.style.display = 'none';
+        if (wordCloudPlaceholder) wordCloudPlaceholder.style.display = 'block';
+    }
+
     async loadInitialData() {
         try {
             await Promise.all([
                 this.loadMetrics(),
-                this.loadComments(),
-                this.loadClauseOptions()
+                this.loadComments()
             ]);
             // Load word cloud if it exists
             this.refreshWordCloud();
@@ -388,20 +406,32 @@ class EConsultationDashboard {
             const response = await this.apiCall('/metrics');
             const data = await response.json();
             
-            this.updateStats(data);
-            this.createSentimentChart(data.overall || {});
+            this.applyMetrics(data);
             
         } catch (error) {
             console.error('Failed to load metrics:', error);
         }
     }
 
+    applyMetrics(data) {
+        this.metricsCache = data;
+        this.updateStats(data);
+        this.createSentimentChart(data.overall || {});
+        this.loadClauseOptions();
+
+        const clauseSelect = document.getElementById('clauseSelect');
+        if (clauseSelect && clauseSelect.value) {
+            this.loadClauseIntent(clauseSelect.value);
+        }
+    }
+
     async loadComments() {
         try {
             const response = await this.apiCall('/comments');
             const data = await response.json();
             
             this.commentsCache = data;
+            this.commentDetails.clear();
             this.filteredComments = data.items || [];
             this.updatePagination();
             this.renderComments();
@@ -411,14 +441,23 @@ class EConsultationDashboard {
         }
     }
 
+    async getMetrics() {
+        // Served from the cache kept current by loadMetrics and /events
+        if (!this.metricsCache) {
+            const response = await this.apiCall('/metrics');
+            this.metricsCache = await response.json();
+        }
+        return this.metricsCache;
+    }
+
     async loadClauseOptions() {
         try {
-            const response = await this.apiCall('/metrics');
-            const data = await response.json();
+            const data = await this.getMetrics();
             const byClause = data.by_clause || {};
             
             const clauseSelect = document.getElementById('clauseSelect');
             if (clauseSelect) {
+                const selected = clauseSelect.value;
                 clauseSelect.innerHTML = '<option value="">Select Clause</option>';
                 
                 Object.keys(byClause)
@@ -430,6 +469,9 @@ class EConsultationDashboard {
                         option.textContent = clause;
                         clauseSelect.appendChild(option);
                     });
+                if (selected && byClause[selected]) {
+                    clauseSelect.value = selected;
+                }
             }
             
         } catch (error) {
@@ -439,8 +481,7 @@ class EConsultationDashboard {
 
     async loadClauseIntent(clause) {
         try {
-            const response = await this.apiCall('/metrics');
-            const data = await response.json();
+            const data = await this.getMetrics();
             const byClause = data.by_clause || {};
             const clauseData = byClause[clause] || {};
             
@@ -792,7 +833,7 @@ class EConsultationDashboard {
         `).join('');
     }
 
-    applyFilters() {
+    async applyFilters() {
         if (!this.commentsCache) return;
 
         const searchTerm = document.getElementById('searchInput').value.toLowerCase();
@@ -802,10 +843,21 @@ class EConsultationDashboard {
         let filteredComments = this.commentsCache.items || [];
 
         if (searchTerm) {
-            filteredComments = filteredComments.filter(comment => {
-                const searchText = `${comment.text} ${comment.summary} ${comment.clause}`.toLowerCase();
-                return searchText.includes(searchTerm);
-            });
+            // Rows only hold a preview, so the server searches the full text
+            const request = ++this.searchRequest;
+            try {
+                const response = await this.apiCall(`/comments?q=${encodeURIComponent(searchTerm)}`);
+                const matches = new Set(((await response.json()).items || []).map(comment => comment.id));
+                if (request !== this.searchRequest) return;
+                filteredComments = filteredComments.filter(comment =>
+                    matches.has(comment.id) || (comment.clause || '').toLowerCase().includes(searchTerm)
+                );
+            } catch (error) {
+                console.error('Search failed:', error);
+                return;
+            }
+        } else {
+            this.searchRequest++;
         }
 
         if (sentimentFilter) {
@@ -941,6 +993,11 @@ class EConsultationDashboard {
             if (tableViewBtn) tableViewBtn.classList.add('active');
         }
         
+        // The table scrolls through every row, so paging only applies to cards
+        document.querySelectorAll('.pagination-controls, .pagination-footer, #pageSizeSelect').forEach(element => {
+            element.style.display = view === 'card' ? '' : 'none';
+        });
+        
         this.renderComments();
     }
 
@@ -1004,7 +1061,7 @@ class EConsultationDashboard {
                 ` : ''}
                 
                 <div class="comment-text">
-                    ${comment.text || 'No text available'}
+                    ${comment.preview || 'No text available'}
                 </div>
                 
                 <div class="comment-meta">
@@ -1035,25 +1092,56 @@ class EConsultationDashboard {
             return;
         }
 
-        const startIndex = (this.currentPage - 1) * this.pageSize;
-        const endIndex = startIndex + this.pageSize;
-        const pageComments = this.filteredComments.slice(startIndex, endIndex);
+        const wrapper = tbody.closest('.table-wrapper');
+        if (wrapper && !wrapper.dataset.virtual) {
+            wrapper.dataset.virtual = 'true';
+            wrapper.addEventListener('scroll', () => this.scheduleTableWindow(), { passive: true });
+        }
+        this.tableWindow = null;
+        this.renderTableWindow();
+    }
 
-        tbody.innerHTML = pageComments.map(comment => `
-            <tr>
+    scheduleTableWindow() {
+        if (this.tableFrame) return;
+        this.tableFrame = requestAnimationFrame(() => {
+            this.tableFrame = null;
+            this.renderTableWindow();
+        });
+    }
+
+    renderTableWindow() {
+        // Virtualized: only the rows in view (plus some overscan) are in the DOM,
+        // with spacer rows standing in for the rest, so the table scrolls through
+        // every filtered comment at the cost of a screenful of rows
+        const tbody = document.getElementById('commentsTableBody');
+        const wrapper = tbody && tbody.closest('.table-wrapper');
+        if (!wrapper || this.currentView !== 'table' || this.filteredComments.length === 0) return;
+
+        const overscan = 10;
+        const total = this.filteredComments.length;
+        const first = Math.max(0, Math.floor(wrapper.scrollTop / this.tableRowHeight) - overscan);
+        const last = Math.min(total, first + Math.ceil(wrapper.clientHeight / this.tableRowHeight) + 2 * overscan);
+        if (this.tableWindow && this.tableWindow[0] === first && this.tableWindow[1] === last) return;
+        this.tableWindow = [first, last];
+
+        const spacer = height => height > 0
+            ? `<tr class="virtual-spacer" style="height: ${height}px"><td colspan="7"></td></tr>`
+            : '';
+        tbody.innerHTML = spacer(first * this.tableRowHeight) + this.filteredComments.slice(first, last).map(comment => `
+            <tr class="virtual-row" onclick="dashboard.viewComment(${comment.id})">
                 <td>${comment.id}</td>
                 <td>${comment.clause || 'N/A'}</td>
                 <td><span class="pill ${comment.sentiment?.toLowerCase()}">${comment.sentiment || 'N/A'}</span></td>
                 <td><span class="pill ${comment.intent}">${comment.intent || 'N/A'}</span></td>
-                <td>${comment.summary || 'N/A'}</td>
-                <td>${this.truncateText(comment.text || 'N/A', 100)}</td>
+                <td>${comment.score ?? 'N/A'}</td>
+                <td>${comment.preview || 'N/A'}</td>
                 <td>
-                    <button class="btn-icon" onclick="dashboard.viewComment(${comment.id})" title="View full comment">
+                    <button class="btn-icon" onclick="event.stopPropagation(); dashboard.viewComment(${comment.id})" title="View full comment">
                         <i class="fas fa-eye"></i>
                     </button>
                 </td>
             </tr>
-        `).join('');
+        `).join('') + spacer((total - last) * this.tableRowHeight);
     }
 
     updateSearchInfo(count, searchTerm, sentimentFilter, intentFilter) {
@@ -1091,7 +1179,7 @@ class EConsultationDashboard {
             wordCloudImg.style.display = 'none';
             
             // Load the word cloud image
-            wordCloudImg.src = `/wordcloud?ts=${Date.now()}`;
+            wordCloudImg.src = this.scopedUrl(`/wordcloud?format=webp&ts=${Date.now()}`);
             
             // Handle successful load
             wordCloudImg.onload = () => {
@@ -1250,8 +1338,13 @@ class EConsultationDashboard {
         return icons[type] || 'info-circle';
     }
 
+    scopedUrl(url) {
+        const separator = url.includes('?') ? '&' : '?';
+        return `${url}${separator}consultation_id=${encodeURIComponent(this.consultationId)}`;
+    }
+
     async apiCall(url, options = {}) {
-        const response = await fetch(url, {
+        const response = await fetch(this.scopedUrl(url), {
             ...options,
             headers: {
                 // Only set Content-Type for non-FormData requests
@@ -1284,21 +1377,29 @@ class EConsultationDashboard {
         return text.substring(0, maxLength) + '...';
     }
 
-    viewComment(commentId) {
-        if (!this.filteredComments || this.filteredComments.length === 0) {
-            this.showToast('No comments loaded', 'warning');
-            return;
-        }
-        
-        const comment = this.filteredComments.find(c => c.id === commentId);
+    async viewComment(commentId) {
+        // List rows carry a preview; the full comment is loaded on first view
+        let comment = this.commentDetails.get(commentId);
         if (!comment) {
-            this.showToast('Comment not found', 'error');
-            return;
+            try {
+                const response = await this.apiCall(`/comments/${commentId}`);
+                comment = await response.json();
+                this.commentDetails.set(commentId, comment);
+            } catch (error) {
+                this.showToast('Comment not found', 'error');
+                return;
+            }
         }
         
         this.showCommentModal(comment);
     }
 
+    async loadFullComments() {
+        // Exports need text, summary and keywords, which the list rows leave out
+        const response = await this.apiCall('/comments?full=true');
+        return (await response.json()).items || [];
+    }
+
     showCommentModal(comment) {
         // Create modal if it doesn't exist
         let modal = document.getElementById('commentModal');
@@ -1456,16 +1557,23 @@ class EConsultationDashboard {
     }
 
     // Export functionality
-    handleExportData() {
+    async handleExportData() {
         if (!this.commentsCache || !this.commentsCache.items) {
             this.showToast('No data to export', 'warning');
             return;
         }
         
+        let comments;
+        try {
+            comments = await this.loadFullComments();
+        } catch (error) {
+            this.showToast('Failed to export data', 'error');
+            return;
+        }
         const data = {
             exportDate: new Date().toISOString(),
-            totalComments: this.commentsCache.items.length,
-            comments: this.commentsCache.items.map(comment => ({
+            totalComments: comments.length,
+            comments: comments.map(comment => ({
                 id: comment.id,
                 clause: comment.clause,
                 sentiment: comment.sentiment,
@@ -1480,13 +1588,21 @@ class EConsultationDashboard {
         this.showToast('Data exported successfully', 'success');
     }
 
-    handleExportComments() {
+    async handleExportComments() {
         if (!this.filteredComments || this.filteredComments.length === 0) {
             this.showToast('No data to export', 'warning');
             return;
         }
         
-        const csvContent = this.convertToCSV(this.filteredComments);
+        let comments;
+        try {
+            const shown = new Set(this.filteredComments.map(comment => comment.id));
+            comments = (await this.loadFullComments()).filter(comment => shown.has(comment.id));
+        } catch (error) {
+            this.showToast('Failed to export comments', 'error');
+            return;
+        }
+        const csvContent = this.convertToCSV(comments);
         this.downloadCSV(csvContent, 'comments_export.csv');
         this.showToast('Comments exported as CSV', 'success');
     }
@@ -1589,14 +1705,73 @@ class EConsultationDashboard {
 
     // Auto-refresh functionality
     setupAutoRefresh() {
-        // Refresh data every 30 seconds if user is active
+        // Refresh data every 30 seconds if user is active and /events is not connected
         setInterval(() => {
-            if (!document.hidden && this.commentsCache) {
+            if (!document.hidden && this.commentsCache && !this.liveUpdates) {
                 this.loadInitialData();
             }
         }, 30000);
     }
 
+    // Live updates pushed by the server over /events
+    setupEventStream() {
+        if (!window.EventSource) return;
+
+        const source = new EventSource('/events');
+        this.eventSource = source;
+
+        source.onopen = () => {
+            this.liveUpdates = true;
+        };
+        source.onerror = () => {
+            // EventSource reconnects by itself; poll in the meantime
+            this.liveUpdates = false;
+        };
+
+        const on = (name, handler) => {
+            source.addEventListener(name, (e) => {
+                try {
+                    const data = JSON.parse(e.data || '{}');
+                    // The stream is shared by all consultations
+                    if (data.consultation_id !== undefined && String(data.consultation_id) !== this.consultationId) return;
+                    handler(data);
+                } catch (error) {
+                    console.error(`Failed to handle ${name} event:`, error);
+                }
+            });
+        };
+
+        on('comments', (data) => {
+            // New comments have no predictions yet, so only the counters move
+            if (!this.metricsCache) return;
+            this.metricsCache.total_comments = (this.metricsCache.total_comments || 0) + (data.count || 0);
+            this.updateStats(this.metricsCache);
+        });
+
+        on('metrics', (data) => {
+            this.applyMetrics(data);
+            this.updateInsights();
+        });
+
+        on('analysis', (data) => {
+            if (data.status === 'running') {
+                this.showStatusMessage('analyzeMsg', `Running AI analysis... ${data.processed}/${data.total}`, 'info');
+            } else if (data.status === 'done') {
+                this.loadComments();
+                this.refreshWordCloud();
+            }
+        });
+
+        on('clear', () => {
+            this.applyClear();
+        });
+
+        on('resync', () => {
+            this.metricsCache = null;
+            this.loadInitialData();
+        });
+    }
+
     // Enhanced search with suggestions
     setupSearchSuggestions() {
         const searchInput = document.getElementById('searchInput');
@@ -1834,7 +2009,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
 // Handle page visibility changes
 document.addEventListener('visibilitychange', () => {
-    if (!document.hidden && window.dashboard) {
+    if (!document.hidden && window.dashboard && !window.dashboard.liveUpdates) {
         window.dashboard.loadInitialData();
     }
 });
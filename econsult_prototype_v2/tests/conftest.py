@@ -0,0 +1,11 @@
+import os
+
+import pytest
+
+@pytest.hookimpl(trylast=True)
+def pytest_configure(config):
+    """Point the database and every artifact directory at a throwaway location before backend is imported"""
+    root = config._tmp_path_factory.mktemp("state")
+    os.environ["DATABASE_URL"] = f"sqlite:///{(root / 'comments.db').as_posix()}"
+    os.environ["ARTIFACTS_DIR"] = str(root / "artifacts")
+    os.environ["FEATURE_CACHE_DIR"] = str(root / "feature_cache")
@@ -1,6 +1,10 @@
+import pstats
+import sqlite3
+
 import pytest
 from fastapi.testclient import TestClient
 from backend.main import app
+from backend.stores import artifact_store
 
 client = TestClient(app)
 
@@ -34,6 +38,24 @@ def test_ingest_json():
     assert data["ok"] is True
     assert "ids" in data
 
+def test_ingest_json_validates_items():
+    """Test that malformed comments are rejected with 422 and dates are parsed"""
+    assert client.post("/ingest_json", json=[{"text": 5}]).status_code == 422
+    assert client.post("/ingest_json", json=[{"text": "ok", "stakeholder_type": 3}]).status_code == 422
+    assert client.post("/ingest_json", json=[{"clause": "overall"}]).status_code == 422
+    
+    cid = client.post("/consultations", json={"name": "Dated ingest"}).json()["id"]
+    response = client.post(f"/ingest_json?consultation_id={cid}", json=[
+        {"text": "Dated comment.", "created_at": "2024-01-01"},
+        {"text": "Offset comment.", "created_at": "2024-01-02T05:30:00+05:30", "comment_id": 7}
+    ])
+    assert response.status_code == 200
+    count = client.get("/comments/count", params={
+        "consultation_id": cid, "since": "2024-01-01T00:00:00Z", "until": "2024-01-02T00:00:01Z"
+    })
+    assert count.json()["count"] == 2
+    client.delete(f"/consultations/{cid}")
+
 def test_metrics_endpoint():
     """Test metrics endpoint"""
     response = client.get("/metrics")
@@ -51,6 +73,33 @@ def test_comments_endpoint():
     assert "items" in data
     assert isinstance(data["items"], list)
 
+def test_comments_by_keyword():
+    """Test keyword matches, the empty-word response and a query count independent of matches"""
+    from backend.instrumentation import DB_QUERIES
+    cid = client.post("/consultations", json={"name": "Keyword test"}).json()["id"]
+    
+    def queries(word):
+        before = DB_QUERIES.value()
+        response = client.get("/comments_by_keyword", params={"word": word, "consultation_id": cid})
+        assert response.status_code == 200
+        return response.json(), DB_QUERIES.value() - before
+    
+    counts = []
+    for total in (2, 12):
+        client.post(f"/ingest_json?consultation_id={cid}", json=[
+            {"text": f"Turnover threshold comment {i}.", "clause": "overall"} for i in range(total - len(counts) * 2)
+        ])
+        client.post(f"/analyze?consultation_id={cid}")
+        data, count = queries("TURNOVER")
+        assert data["count"] == total and all("turnover" in item["text"].lower() for item in data["items"])
+        counts.append(count)
+    assert counts[0] == counts[1]
+    
+    empty = client.get("/comments_by_keyword", params={"word": " "})
+    assert empty.json() == {"items": [], "word": " ", "count": 0}
+    assert empty.headers["content-type"] == client.get("/comments_by_keyword", params={"word": "x"}).headers["content-type"]
+    client.delete(f"/consultations/{cid}")
+
 def test_clear_endpoint():
     """Test clear endpoint"""
     response = client.post("/clear")
@@ -58,3 +107,296 @@ def test_clear_endpoint():
     data = response.json()
     assert data["ok"] is True
     assert "message" in data
+
+def test_large_responses_are_compressed():
+    """Test that large JSON bodies are gzip-encoded for clients that accept it"""
+    client.post("/ingest_json", json=[{"text": f"Compression test comment {i}", "clause": "overall"} for i in range(50)])
+    client.post("/analyze")
+    response = client.get("/comments", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == "gzip"
+    assert len(response.json()["items"]) >= 50
+
+def test_internal_metrics_endpoint():
+    """Test Prometheus-format request and analysis timings"""
+    client.post("/ingest", data={"text": "Instrumentation test comment", "clause": "overall"})
+    client.post("/analyze")
+    response = client.get("/metrics/internal")
+    assert response.status_code == 200
+    assert "text/plain" in response.headers["content-type"]
+    body = response.text
+    assert '# TYPE econsult_http_request_duration_seconds histogram' in body
+    assert 'econsult_http_requests_total{method="POST",route="/ingest",status="200"}' in body
+    assert 'econsult_db_queries_per_request_count{route="/analyze"}' in body
+    assert 'econsult_analysis_stage_duration_seconds_count{stage="classification"}' in body
+
+def test_analyze_with_profile(tmp_path):
+    """Test opt-in profiling of an analysis run"""
+    client.post("/ingest", data={"text": "Profiling test comment", "clause": "overall"})
+    response = client.post("/analyze", params={"profile": "true"})
+    assert response.status_code == 200
+    profile = response.json()["profile"]
+    summary = client.get(profile["summary_url"])
+    assert summary.status_code == 200
+    assert summary.json()["functions"]
+    download = client.get(profile["download_url"])
+    assert download.status_code == 200
+    # The chunks ran where the profiler could see them, not in worker processes
+    (tmp_path / "analyze.prof").write_bytes(download.content)
+    functions = {func for _file, _line, func in pstats.Stats(str(tmp_path / "analyze.prof")).stats}
+    assert {"analyze_chunk", "classify_intents"} <= functions
+    # Stored where every node can serve it
+    assert f"profiles/{profile['id']}.prof" in artifact_store.keys("profiles/")
+    assert client.get("/profiles").json()["items"][0]["id"] == profile["id"]
+    assert client.get("/profiles/..%2Fconfig").status_code == 404
+
+def test_clause_summary_cached_until_analysis():
+    """Test clause digest and its invalidation on new predictions"""
+    client.post("/ingest_json", json=[
+        {"text": "Raise the threshold for small companies. It is too low.", "clause": "Clause 99"},
+        {"text": "The threshold for small companies must be raised. Timelines are tight.", "clause": "Clause 99"},
+    ])
+    client.post("/analyze")
+    first = client.get("/summary", params={"clause": "Clause 99"}).json()
+    assert first["comments"] == 2 and first["summary"]
+    assert client.get("/summary", params={"clause": "Clause 99"}).json()["cached"] is True
+    client.post("/analyze")
+    assert client.get("/summary", params={"clause": "Clause 99"}).json()["cached"] is False
+    assert client.get("/summary", params={"method": "bogus"}).status_code == 400
+
+def test_topics_endpoints():
+    """Test topic clustering through analysis and the topic endpoints"""
+    client.post("/ingest_json", json=[{"text": f"Topic test about audit rotation rules {i}", "clause": "overall"} for i in range(20)])
+    client.post("/analyze")
+    topics = client.get("/topics").json()["items"]
+    assert topics and all("top_terms" in t for t in topics)
+    response = client.get(f"/topics/{topics[0]['id']}/comments", params={"limit": 5})
+    assert response.status_code == 200
+    assert 0 < response.json()["count"] <= 5
+
+def test_reply_threads_from_csv():
+    """Test that targets_comment_id links uploaded comments into threads"""
+    csv_body = (
+        "comment_id,Comment,Label,Clause,targets_comment_id,Date\n"
+        "T1,Clause 4(b) is ambiguous.,CLAUSE_FEEDBACK,Clause 4(b),,2025-07-23\n"
+        "T2,Agree with the draft.,AGREE,Clause 4(b),T1,2025-07-25\n"
+        "T3,Oppose the wording.,DISAGREE,Clause 4(b),T1,2025-07-26\n"
+        "T4,Reply to the reply.,AGREE,Clause 4(b),T2,2025-07-27\n"
+    )
+    client.post("/upload_csv", files={"file": ("threads.csv", csv_body, "text/csv")})
+    client.post("/analyze")
+    contested = client.get("/threads/contested", params={"limit": 100}).json()["items"]
+    root = next(t for t in contested if t["text"] == "Clause 4(b) is ambiguous.")
+    assert root["size"] == 4 and root["max_depth"] == 2
+    thread = client.get(f"/threads/{root['root_id']}").json()
+    assert [c["depth"] for c in thread["items"]] == [0, 1, 1, 2]
+    assert thread["items"][0]["descendants"] == 3
+
+def test_metrics_cube():
+    """Test stakeholder x clause slices from the precomputed cube"""
+    client.post("/ingest_json", json=[
+        {"text": "Cube test from an auditor.", "clause": "Clause Cube", "stakeholder_type": "Auditor"},
+        {"text": "Cube test from another auditor.", "clause": "Clause Cube", "stakeholder_type": "Auditor"},
+        {"text": "Cube test from a startup.", "clause": "Clause Cube", "stakeholder_type": "Startup"},
+    ])
+    client.post("/analyze")
+    response = client.get("/metrics/cube", params={"dims": "stakeholder", "clause": "Clause Cube"})
+    assert response.status_code == 200
+    cells = {c["stakeholder"]: c["count"] for c in response.json()["cells"]}
+    assert cells == {"Auditor": 2, "Startup": 1}
+    share = client.get("/metrics/cube", params={"dims": "stakeholder", "clause": "Clause Cube", "measure": "share"}).json()
+    assert abs(sum(c["value"] for c in share["cells"]) - 1.0) < 1e-3
+    assert client.get("/metrics/cube", params={"dims": "bogus"}).status_code == 400
+
+def test_consultations_are_isolated():
+    """Test that comments and analysis are scoped to their consultation"""
+    response = client.post("/consultations", json={"name": "Draft rules 2025"})
+    assert response.status_code == 200
+    cid = response.json()["id"]
+    
+    client.post("/clear")
+    client.post(f"/ingest_json?consultation_id={cid}", json=[
+        {"text": "I support this clause strongly.", "clause": "Section 1"},
+        {"text": "This provision is unclear and should be removed.", "clause": "Section 2"}
+    ])
+    client.post("/ingest_json", json=[{"text": "Default consultation comment.", "clause": "overall"}])
+    assert client.post(f"/analyze?consultation_id={cid}").status_code == 200
+    
+    metrics = client.get(f"/metrics?consultation_id={cid}").json()
+    assert metrics["total_comments"] == 2
+    assert metrics["analyzed_comments"] == 2
+    assert client.get("/metrics").json()["total_comments"] == 1
+    
+    listed = {c["id"]: c for c in client.get("/consultations").json()["items"]}
+    assert listed[cid]["comments"] == 2
+    
+    # Clearing one consultation leaves the other untouched
+    client.post("/clear")
+    assert client.get(f"/metrics?consultation_id={cid}").json()["total_comments"] == 2
+    
+    assert client.delete(f"/consultations/{cid}").status_code == 200
+    assert client.get(f"/metrics?consultation_id={cid}").status_code == 404
+    assert client.delete("/consultations/1").status_code == 400
+
+def test_clear_hides_rows_then_purges_them():
+    """Test that /clear switches epochs and the background purge removes old rows"""
+    from backend.database import SessionLocal
+    from backend.models import Comment
+    
+    client.post("/ingest_json", json=[{"text": f"Purge test comment {i}.", "clause": "Purge"} for i in range(5)])
+    client.post("/analyze")
+    assert client.get("/metrics").json()["total_comments"] > 0
+    
+    response = client.post("/clear")
+    assert response.status_code == 200
+    assert client.get("/metrics").json()["total_comments"] == 0
+    assert client.get("/comments").json()["items"] == []
+    
+    # TestClient runs background tasks before returning, so old rows are gone
+    db = SessionLocal()
+    try:
+        assert db.query(Comment).filter(Comment.clause == "Purge").count() == 0
+    finally:
+        db.close()
+
+@pytest.mark.skipif(not hasattr(sqlite3.Connection, "setlimit"), reason="needs Python 3.11+")
+def test_purge_within_sqlite_parameter_limit():
+    """Test that purge batches larger than SQLite's old 999-variable limit still delete"""
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import Session
+    from backend.database import engine
+    from backend.models import Comment
+    from backend.services import CommentService, ConsultationService
+    
+    cid = client.post("/consultations", json={"name": "Purge limit"}).json()["id"]
+    client.post(f"/ingest_json?consultation_id={cid}", json=[
+        {"text": f"Limit test comment {i}.", "clause": "Limit"} for i in range(1200)
+    ])
+    
+    # A connection that behaves like SQLite before 3.32
+    limited = create_engine(engine.url, connect_args={"check_same_thread": False})
+    event.listen(limited, "connect", lambda conn, _record: conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999))
+    db = Session(bind=limited)
+    try:
+        CommentService(db, cid).clear_all_data()
+        assert ConsultationService(db).purge_stale_data(cid, batch_size=5000, pause=0) == 1200
+        assert db.query(Comment).filter(Comment.consultation_id == cid).count() == 0
+    finally:
+        db.close()
+        limited.dispose()
+    client.delete(f"/consultations/{cid}")
+
+def test_wordcloud_variants():
+    """Test wordcloud formats and sizes drawn from one layout"""
+    client.post("/ingest_json", json=[{"text": "Wordcloud variant test about compliance burden.", "clause": "overall"}])
+    client.post("/analyze")
+    
+    png = client.get("/wordcloud")
+    assert png.status_code == 200
+    assert png.headers["content-type"] == "image/png"
+    webp = client.get("/wordcloud", params={"format": "webp", "size": "thumb"})
+    assert webp.headers["content-type"] == "image/webp"
+    assert len(webp.content) < len(png.content)
+    svg = client.get("/wordcloud", params={"format": "svg"})
+    assert svg.headers["content-type"].startswith("image/svg+xml")
+    assert client.get("/wordcloud", params={"size": "huge"}).status_code == 400
+    
+    words = client.get("/wordcloud_map").json()["words"]
+    assert words and all("x" in w and "font_size" in w for w in words)
+
+def test_clear_removes_wordcloud():
+    """Test that cleared comments no longer show up in the stored wordcloud"""
+    client.post("/clear")
+    client.post("/ingest_json", json=[{"text": "Zeppelinium quotas burden exporters heavily.", "clause": "overall"}])
+    client.post("/analyze")
+    assert "zeppelinium" in {w["text"].lower() for w in client.get("/wordcloud_map").json()["words"]}
+    assert client.get("/wordcloud", params={"size": "thumb", "format": "webp"}).status_code == 200
+    
+    client.post("/clear")
+    assert "zeppelinium" not in {w["text"].lower() for w in client.get("/wordcloud_map").json()["words"]}
+    assert client.get("/wordcloud").status_code == 400
+    assert client.get("/wordcloud", params={"size": "thumb", "format": "webp"}).status_code == 400
+
+def test_ingest_rate_limited(monkeypatch):
+    """Test that ingestion past the client's rate returns 429 with Retry-After"""
+    import backend.ingestion as ingestion
+    monkeypatch.setattr(ingestion, "ingest_limiter", ingestion.RateLimiter(rate=1, burst=1))
+    assert client.post("/ingest", data={"text": "first", "clause": "overall"}).status_code == 200
+    response = client.post("/ingest", data={"text": "second", "clause": "overall"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+def test_comments_count():
+    """Test counting comments by clause and label"""
+    client.post("/clear")
+    client.post("/ingest_json", json=[
+        {"text": "Count test one.", "clause": "Clause Count"},
+        {"text": "Count test two.", "clause": "Clause Count"},
+        {"text": "Count test three.", "clause": "overall"}
+    ])
+    assert client.get("/comments/count", params={"clause": "Clause Count"}).json()["count"] == 2
+    assert client.get("/comments/count", params={"label": "AGREE"}).json()["count"] == 0
+    assert client.get("/comments/count", params={"since": "2000-01-01T00:00:00Z"}).json()["count"] == 3
+
+def test_read_endpoints_revalidate_on_data_version():
+    """Test ETag / 304 handling and that writes change the ETag"""
+    client.post("/ingest_json", json=[{"text": "ETag test comment.", "clause": "overall"}])
+    first = client.get("/metrics")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"') and first.headers["cache-control"] == "no-cache"
+    assert "Accept-Encoding" in first.headers["vary"]
+    
+    unchanged = client.get("/metrics", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    assert "Accept-Encoding" in unchanged.headers["vary"]
+    # Served from the response cache: same body, same tag
+    again = client.get("/metrics")
+    assert again.json() == first.json() and again.headers["etag"] == etag
+    # Each route and query has its own tag
+    assert client.get("/comments").headers["etag"] != etag
+    
+    client.post("/ingest_json", json=[{"text": "ETag test comment two.", "clause": "overall"}])
+    changed = client.get("/metrics", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["total_comments"] == first.json()["total_comments"] + 1
+
+def test_etag_is_weak_across_content_encodings():
+    """Test that identity and gzip bodies of one response share a weak ETag that revalidates either"""
+    client.post("/ingest_json", json=[{"text": f"Encoding test comment {i}.", "clause": "overall"} for i in range(40)])
+    client.post("/analyze")
+    plain = client.get("/comments", params={"full": "true"}, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/comments", params={"full": "true"}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in plain.headers and gzipped.headers["content-encoding"] == "gzip"
+    assert plain.headers["etag"] == gzipped.headers["etag"] and plain.headers["etag"].startswith('W/"')
+    assert gzipped.headers["vary"].count("Accept-Encoding") >= 1
+    revalidated = client.get(
+        "/comments", params={"full": "true"}, headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+
+def test_comment_rows_and_detail():
+    """Test slim list rows, text search, the full listing and the detail endpoint"""
+    client.post("/clear")
+    long_text = ("Lowering the threshold to 50% would help small firms. " * 5).strip()
+    client.post("/ingest_json", json=[
+        {"text": long_text, "clause": "Section 3"},
+        {"text": "Short comment on filing.", "clause": "Section 4"}
+    ])
+    assert client.post("/analyze").status_code == 200
+    
+    rows = client.get("/comments").json()["items"]
+    assert len(rows) == 2
+    assert set(rows[0]) == {"id", "clause", "sentiment", "score", "preview"}
+    assert rows[0]["preview"].endswith("…") and len(rows[0]["preview"]) <= 101
+    assert rows[1]["preview"] == "Short comment on filing."
+    
+    matched = client.get("/comments", params={"q": "50%"}).json()["items"]
+    assert [row["id"] for row in matched] == [rows[0]["id"]]
+    
+    full = client.get("/comments", params={"full": "true"}).json()["items"]
+    assert full[0]["text"] == long_text and "summary" in full[0] and "keywords" in full[0]
+    
+    detail = client.get(f"/comments/{rows[0]['id']}")
+    assert detail.status_code == 200 and detail.json()["text"] == long_text
+    assert client.get("/comments/999999").status_code == 404
+    assert client.get("/comments/count").json()["count"] == 2
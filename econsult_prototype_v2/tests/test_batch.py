@@ -0,0 +1,25 @@
+import json
+
+from backend.batch import analyze, main
+
+def test_batch_analyze_csv(tmp_path):
+    """Test that the CLI analyzes a CSV in input order, redacted, without the database"""
+    source = tmp_path / "comments.csv"
+    source.write_text(
+        "comment_id,Comment,Clause,Date\n"
+        "1,I support Clause 1. Mail me at someone@example.com,Clause 1,2025-08-01\n"
+        "2,,Clause 2,\n"
+        "3,Please clarify the threshold in Clause 2.,Clause 2,not a date\n"
+        "4,Remove this provision.,,\n"
+    )
+    out = tmp_path / "results.jsonl"
+    stats = analyze(str(source), str(out), workers=0, chunk_size=2, block_size=2, quiet=True)
+    assert stats["comments"] == 3
+    
+    rows = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [r["row"] for r in rows] == [0, 2, 3]
+    assert "[REDACTED]" in rows[0]["text"] and rows[0]["created_at"] == "2025-08-01"
+    assert rows[1]["created_at"] is None and rows[2]["clause"] == "overall"
+    assert all(r["sentiment"] and isinstance(r["keywords"], list) for r in rows)
+    
+    assert main(["analyze", str(source), "--out", str(tmp_path / "results.txt"), "--workers", "0"]) == 2
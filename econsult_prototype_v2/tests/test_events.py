@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+from sqlalchemy import create_engine
+
+from backend.events import DatabaseEventBroker, EventBroker, format_sse
+from backend.models import Event
+
+def test_format_sse():
+    """Test SSE message framing"""
+    assert format_sse(3, "comments", {"count": 1}) == 'id: 3\nevent: comments\ndata: {"count":1}\n\n'
+
+def test_publish_from_worker_thread():
+    """Test that events published from a threadpool thread reach subscribers"""
+    broker = EventBroker()
+
+    async def consume():
+        stream = broker.subscribe()
+        assert (await stream.__anext__()).startswith("retry:")
+        waiter = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        threading.Thread(target=broker.publish, args=("comments", {"ids": [1], "count": 1})).start()
+        message = await asyncio.wait_for(waiter, timeout=2)
+        await stream.aclose()
+        return message
+
+    message = asyncio.run(consume())
+    assert "event: comments" in message
+    assert broker.subscriber_count == 0
+
+def test_replay_and_resync():
+    """Test Last-Event-ID replay and resync once history has been dropped"""
+    broker = EventBroker(replay_size=2)
+    for i in range(4):
+        broker.publish("comments", {"count": i})
+    assert [m[0] for m in broker._replay(2)] == [3, 4]
+    assert broker._replay(0)[0][1] == "resync"
+
+def test_database_events_reach_other_nodes(tmp_path):
+    """Test that an event published on one node streams on another, and replays by id on any node"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}", connect_args={"check_same_thread": False})
+    Event.__table__.create(engine)
+    publisher = DatabaseEventBroker(engine, replay_size=3, poll=0.01)
+    subscriber = DatabaseEventBroker(engine, replay_size=3, poll=0.01)
+    first = publisher.publish("comments", {"count": 0})
+
+    async def consume():
+        stream = subscriber.subscribe(first)
+        assert (await stream.__anext__()).startswith("retry:")
+        replayed = await stream.__anext__()
+        waiter = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        threading.Thread(target=publisher.publish, args=("metrics", {"count": 1})).start()
+        message = await asyncio.wait_for(waiter, timeout=2)
+        await stream.aclose()
+        return replayed, message
+
+    publisher.publish("comments", {"count": 2})
+    replayed, message = asyncio.run(consume())
+    assert replayed == format_sse(first + 1, "comments", {"count": 2})
+    assert message == format_sse(first + 2, "metrics", {"count": 1})
+
+    for i in range(3):
+        publisher.publish("comments", {"count": i})
+    assert subscriber._replay(first)[0][1] == "resync"
+    assert [m[0] for m in subscriber._replay(first + 3)] == [first + 4, first + 5]
+    subscriber.close()
+    engine.dispose()
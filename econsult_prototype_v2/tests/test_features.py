@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from backend import utils
+from backend.features import FeatureCache, vectorizer_version
+import backend.features as features
+
+TEXTS = [
+    "I support the disclosure threshold.",
+    "Please clarify Clause 4(b).",
+    "This clause should be removed.",
+    "Raise the threshold for small companies.",
+]
+LABELS = ["AGREE", "REQUEST_CLARIFICATION", "DISAGREE", "SUGGEST_CHANGE"]
+
+class CountingVectorizer:
+    """Wraps a fitted vectorizer and records how many texts it was asked to transform"""
+
+    def __init__(self, vectorizer):
+        self.vectorizer = vectorizer
+        self.calls = []
+
+    def transform(self, texts):
+        self.calls.append(len(texts))
+        return self.vectorizer.transform(texts)
+
+def test_cached_rows_match_vectorizer(tmp_path):
+    """Test that cached rows equal fresh ones, in order, and hits skip the vectorizer"""
+    vectorizer = CountingVectorizer(TfidfVectorizer().fit(TEXTS))
+    cache = FeatureCache(tmp_path, "v1", max_segments=2)
+    batch = [TEXTS[2], TEXTS[0], TEXTS[2]]
+    expected = vectorizer.vectorizer.transform(batch).toarray()
+    assert np.allclose(cache.transform(vectorizer, batch).toarray(), expected)
+    
+    vectorizer.calls.clear()
+    mixed = [TEXTS[1], TEXTS[0], TEXTS[2]]
+    assert np.allclose(cache.transform(vectorizer, mixed).toarray(), vectorizer.vectorizer.transform(mixed).toarray())
+    assert vectorizer.calls == [1]
+    
+    # A third segment exceeds max_segments and the smaller ones are merged
+    cache.transform(vectorizer, [TEXTS[3]])
+    assert len(cache._segment_names()) <= 2
+    vectorizer.calls.clear()
+    fresh = FeatureCache(tmp_path, "v1")
+    assert np.allclose(fresh.transform(vectorizer, TEXTS).toarray(), vectorizer.vectorizer.transform(TEXTS).toarray())
+    assert vectorizer.calls == [1]  # only the width probe of a new process
+
+def test_classify_intents_with_feature_cache(tmp_path, monkeypatch):
+    """Test that predictions are the same with and without cached features"""
+    pipeline = Pipeline([("tfidf", TfidfVectorizer()), ("clf", LogisticRegression())]).fit(TEXTS, LABELS)
+    model = {"pipeline": pipeline, "labels": list(pipeline.classes_)}
+    monkeypatch.setattr(utils, "INTENT_MODEL", model)
+    monkeypatch.setattr(features, "FEATURE_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(features, "FEATURE_CACHE_ENABLED", False)
+    uncached = utils.classify_intents(TEXTS)
+    
+    monkeypatch.setattr(features, "FEATURE_CACHE_ENABLED", True)
+    assert utils.classify_intents(TEXTS) == uncached
+    assert utils.classify_intents(TEXTS) == uncached
+    assert (tmp_path / model["vectorizer_version"]).is_dir()
+    assert vectorizer_version(pipeline) == model["vectorizer_version"]
+    assert vectorizer_version(LogisticRegression()) is None
+
+def test_version_follows_text_processing_code(monkeypatch):
+    """Test that a change to the tokenization code gives the vectorizer a new cache version"""
+    pipeline = Pipeline([("tfidf", TfidfVectorizer()), ("clf", LogisticRegression())]).fit(TEXTS, LABELS)
+    before = vectorizer_version(pipeline)
+    monkeypatch.setattr(features, "text_processing_version", lambda: "edited")
+    assert vectorizer_version(pipeline) != before
+
+def test_cache_stays_within_bounds(tmp_path, monkeypatch):
+    """Test that old segments are evicted past max_bytes and old versions are removed"""
+    vectorizer = CountingVectorizer(TfidfVectorizer().fit(TEXTS))
+    cache = FeatureCache(tmp_path, "v1", max_segments=100, max_bytes=1)
+    for text in TEXTS:
+        cache.transform(vectorizer, [text])
+    assert len(cache._segment_names()) == 1
+    # Rows of evicted segments are vectorized again, and still correct
+    assert np.allclose(cache.transform(vectorizer, TEXTS).toarray(), vectorizer.vectorizer.transform(TEXTS).toarray())
+    
+    for age, version in enumerate(("v3", "v2", "v1")):
+        (tmp_path / version).mkdir(exist_ok=True)
+        os.utime(tmp_path / version, (1e9 - age, 1e9 - age))
+    monkeypatch.setattr(features, "FEATURE_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(features, "FEATURE_CACHE_ENABLED", True)
+    monkeypatch.setattr(features, "_caches", {})
+    features.feature_cache("v4")
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == ["v3", "v4"]
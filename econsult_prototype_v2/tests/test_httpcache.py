@@ -0,0 +1,23 @@
+from backend.httpcache import ResponseCache, _etag_matches
+
+def test_response_cache_evicts_least_recently_used():
+    """Test the byte budget, LRU order and the oversized-body bypass"""
+    cache = ResponseCache(max_bytes=100)
+    cache.set(("a",), b"x" * 20, {})
+    cache.set(("b",), b"x" * 20, {})
+    cache.get(("a",))
+    cache.set(("c",), b"x" * 20, {})
+    cache.set(("d",), b"x" * 20, {})
+    cache.set(("e",), b"x" * 25, {})
+    assert cache.size <= 100
+    assert cache.get(("b",)) is None and cache.get(("a",)) is not None
+    cache.set(("huge",), b"x" * 60, {})
+    assert cache.get(("huge",)) is None
+
+def test_if_none_match_comparison():
+    assert _etag_matches('"abc"', '"abc"')
+    assert _etag_matches('"x", W/"abc"', '"abc"')
+    assert _etag_matches("*", '"abc"')
+    assert not _etag_matches('"abcd"', '"abc"')
+    assert not _etag_matches(None, '"abc"')
+    assert _etag_matches('"abc"', 'W/"abc"') and _etag_matches('W/"abc"', 'W/"abc"')
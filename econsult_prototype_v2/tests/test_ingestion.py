@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from backend.database import SessionLocal
+from backend.ingestion import IngestQueue, IngestRejectedError, RateLimiter
+
+class _CountingSession:
+    """SessionLocal wrapper that counts commits"""
+    commits = 0
+
+    def __init__(self):
+        self._db = SessionLocal()
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def commit(self):
+        type(self).commits += 1
+        self._db.commit()
+
+def test_rate_limiter_rejects_with_retry_after():
+    """Test that a client past its burst is told how long to wait"""
+    limiter = RateLimiter(rate=10, burst=5)
+    limiter.acquire("a", 5)
+    with pytest.raises(IngestRejectedError) as excinfo:
+        limiter.acquire("a", 2)
+    assert excinfo.value.reason == "rate limited"
+    assert 0 < excinfo.value.retry_after <= 0.2
+    limiter.acquire("b", 5)  # other clients have their own bucket
+
+def test_queue_group_commits_concurrent_submissions():
+    """Test that submissions queued together share one commit"""
+    queue = IngestQueue(capacity=1000, max_batch=1000, linger=0, session_factory=_CountingSession)
+    release = threading.Event()
+    original = queue._take_batch
+
+    def take_batch_after_release():
+        release.wait(5)
+        return original()
+
+    queue._take_batch = take_batch_after_release
+    futures = [queue.submit(1, [{"text": f"group commit {i}", "clause": "overall"}]) for i in range(20)]
+    release.set()
+    ids = [future.result(timeout=10) for future in futures]
+    assert len({i for batch in ids for i in batch}) == 20
+    assert _CountingSession.commits == 1
+
+def test_queue_full_rejects():
+    """Test that a full queue rejects new submissions instead of growing"""
+    queue = IngestQueue(capacity=3, session_factory=_CountingSession)
+    queue._writer = threading.current_thread()  # keep the writer from draining
+    queue.submit(1, [{"text": "one"}, {"text": "two"}])
+    with pytest.raises(IngestRejectedError) as excinfo:
+        queue.submit(1, [{"text": "three"}, {"text": "four"}])
+    assert excinfo.value.reason == "queue full"
+    assert queue.depth == 2
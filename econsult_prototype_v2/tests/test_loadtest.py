@@ -0,0 +1,41 @@
+import asyncio
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from backend.instrumentation import DB_LOCK_ERRORS, instrument_engine
+from backend.main import database_error
+from benchmarks.loadtest import run
+
+def test_lock_errors_are_counted_and_reported_as_503(tmp_path):
+    """Test that a write blocked by another connection's lock is counted and answered with a 503"""
+    path = tmp_path / "locked.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 0})
+    instrument_engine(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+    
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN EXCLUSIVE")
+    before = DB_LOCK_ERRORS.value("INSERT")
+    with pytest.raises(OperationalError) as raised:
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+    holder.execute("COMMIT")
+    holder.close()
+    engine.dispose()
+    assert DB_LOCK_ERRORS.value("INSERT") == before + 1
+    
+    response = asyncio.run(database_error(None, raised.value))
+    assert response.status_code == 503 and response.headers["retry-after"] == "1"
+
+def test_mixed_load_runs_clean(tmp_path):
+    """Test a short mixed scenario against a started server"""
+    report = run("mixed", duration=3, rows=200, workdir=tmp_path, overrides={
+        "pollers": 4, "burst_interval": 1.0, "burst_requests": 2, "burst_rows": 5, "analyze_interval": 1.5
+    })
+    assert {"metrics", "comments", "ingest_json", "analyze"} <= set(report["operations"])
+    assert report["error_rate"] == 0, report["operations"]
+    assert report["lock_errors"] == 0, report["sqlite_lock_errors"]
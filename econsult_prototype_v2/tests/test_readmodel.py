@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.database import SessionLocal, create_tables
+from backend.models import Prediction
+from backend.readmodel import ReadModel, read_models
+from backend.services import AnalysisService, CommentService, ConsultationService, purge_stale_data
+
+@pytest.fixture
+def consultation():
+    create_tables()
+    db = SessionLocal()
+    cid = ConsultationService(db).create_consultation("Read model test").id
+    try:
+        yield db, cid
+    finally:
+        ConsultationService(db).delete_consultation(cid)
+        db.close()
+        purge_stale_data([cid])
+
+def _add_comments(db, cid, rows):
+    return CommentService(db, cid).create_comments_bulk([
+        {"text": f"Read model comment {i}.", "clause": clause, "stakeholder_type": stakeholder}
+        for i, (clause, stakeholder) in enumerate(rows)
+    ])
+
+def _predict(db, cid, ids, labels):
+    service = CommentService(db, cid)
+    clauses = {c.id: c.clause for c in service.get_all_comments()}
+    db.query(Prediction).filter(service._scope(Prediction)).delete(synchronize_session=False)
+    db.add_all([
+        Prediction(
+            consultation_id=cid, epoch=service.epoch, comment_id=i, clause=clauses[i], sentiment=label, sentiment_score=0.5
+        )
+        for i, label in zip(ids, labels)
+    ])
+    db.commit()
+
+def test_read_model_matches_database(consultation, monkeypatch):
+    """Test that metrics, cube slices and counts agree with the ORM path"""
+    db, cid = consultation
+    ids = _add_comments(db, cid, [("Clause 1", "Auditor"), ("Clause 1", None), ("Clause 2", "Startup"), ("Clause 2", "Auditor")])
+    _predict(db, cid, ids[:3], ["AGREE", "DISAGREE", "AGREE"])
+    
+    service = AnalysisService(db, cid)
+    fast = (
+        service.get_metrics(),
+        service.query_cube(["clause", "label"], "avg_score", {"stakeholder": "Auditor"}),
+        service.count_comments({"clause": "Clause 2"}),
+        service.count_comments({"label": "AGREE"}),
+        service.count_comments(until=datetime.utcnow() - timedelta(days=1))
+    )
+    monkeypatch.setattr(read_models, "enabled", False)
+    assert fast[0] == service.get_metrics()
+    assert fast[2:] == (2, 2, 0)
+    assert fast[3] == service.count_comments({"label": "AGREE"})
+    # The cube table is only written by /analyze, so compare against counts
+    assert {(c["clause"], c["label"]): c["count"] for c in fast[1]["cells"]} == {("Clause 1", "AGREE"): 1}
+
+def test_read_model_refreshes_incrementally(consultation):
+    """Test that new comments are appended and rewritten predictions reloaded"""
+    db, cid = consultation
+    ids = _add_comments(db, cid, [("A", None), ("B", None)])
+    _predict(db, cid, ids, ["AGREE", "AGREE"])
+    model = ReadModel(cid, CommentService(db, cid).epoch)
+    model.refresh(db)
+    assert model.metrics()["overall"] == {"AGREE": 2}
+    
+    ids += _add_comments(db, cid, [("A", None)])
+    model.refresh(db, max_age=60)
+    assert model.size == 2  # fresh enough, not reloaded
+    model.dirty = True
+    model.refresh(db, max_age=60)
+    assert model.size == 3
+    
+    _predict(db, cid, ids, ["DISAGREE", "DISAGREE", "AGREE"])
+    model.dirty = True
+    model.refresh(db)
+    assert model.metrics()["overall"] == {"DISAGREE": 2, "AGREE": 1}
+    assert model.count({"clause": "A"}) == 2
+    assert model.count({"clause": "missing"}) == 0
@@ -0,0 +1,112 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from backend.database import SessionLocal, create_tables, engine
+from backend.main import app
+from backend.models import Correction, Prediction
+from backend.services import CommentService, ConsultationService, ReviewService, purge_stale_data, review_priority
+
+client = TestClient(app)
+
+@pytest.fixture
+def consultation():
+    create_tables()
+    db = SessionLocal()
+    cid = ConsultationService(db).create_consultation("Review test").id
+    try:
+        yield db, cid
+    finally:
+        ConsultationService(db).delete_consultation(cid)
+        db.close()
+        purge_stale_data([cid])
+
+def _predict(db, cid, rows):
+    """rows of (text, label, score, margin)"""
+    service = CommentService(db, cid)
+    ids = service.create_comments_bulk([{"text": t, "clause": "Review"} for t, _, _, _ in rows])
+    db.add_all([
+        Prediction(
+            consultation_id=cid, epoch=service.epoch, comment_id=i, clause="Review", sentiment=label,
+            sentiment_score=score, margin=margin, review_priority=review_priority(score, margin)
+        )
+        for i, (_, label, score, margin) in zip(ids, rows)
+    ])
+    db.commit()
+    return ids
+
+def test_review_priority():
+    """Test that low confidence or a small top-2 margin queues a prediction"""
+    assert review_priority(0.95, 0.9) is None
+    assert review_priority(0.4, 0.3) == 0.3
+    assert review_priority(0.7, 0.05) == 0.05
+
+def test_queue_least_certain_first(consultation):
+    """Test queue order, label filter and that a correction dequeues the comment"""
+    db, cid = consultation
+    ids = _predict(db, cid, [
+        ("Confident agreement.", "AGREE", 0.95, 0.9),
+        ("Unsure one.", "AGREE", 0.45, 0.2),
+        ("Coin flip.", "DISAGREE", 0.4, 0.01),
+        ("Narrow call.", "SUGGEST_CHANGE", 0.7, 0.08)
+    ])
+    service = ReviewService(db, cid)
+    assert [item["id"] for item in service.get_queue()] == [ids[2], ids[3], ids[1]]
+    assert [item["id"] for item in service.get_queue(label="AGREE")] == [ids[1]]
+    assert service.pending_count() == 3
+
+    with pytest.raises(ValueError):
+        service.correct(ids[2], "MAYBE")
+    assert service.correct(10 ** 9, "AGREE") is None
+    correction = service.correct(ids[2], "AGREE", note="sarcasm", reviewer="analyst")
+    assert correction["predicted_label"] == "DISAGREE"
+    assert correction["text"] == "Coin flip."
+    # Correcting again updates the same row
+    service.correct(ids[2], "SUGGEST_CHANGE")
+    assert [c["label"] for c in service.list_corrections()] == ["SUGGEST_CHANGE"]
+    assert [item["id"] for item in service.get_queue()] == [ids[3], ids[1]]
+
+def test_queue_reads_the_partial_index(consultation):
+    """Test that the queue is served from the review index without a sort"""
+    db, cid = consultation
+    _predict(db, cid, [("Index test.", "AGREE", 0.4, 0.1)])
+    sql = (
+        "EXPLAIN QUERY PLAN SELECT id FROM predictions WHERE consultation_id = :cid AND epoch = 0 "
+        "AND review_priority IS NOT NULL ORDER BY review_priority LIMIT 50"
+    )
+    with engine.connect() as conn:
+        plan = " ".join(str(row[-1]) for row in conn.execute(text(sql), {"cid": cid}))
+    assert "ix_predictions_review_queue" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_review_endpoints(consultation):
+    """Test /review listing and corrections over HTTP"""
+    db, cid = consultation
+    ids = _predict(db, cid, [("Endpoint test.", "AGREE", 0.3, 0.05)])
+    data = client.get("/review", params={"consultation_id": cid, "limit": 10}).json()
+    assert data["pending"] == 1 and data["items"][0]["id"] == ids[0]
+
+    url = f"/review/{ids[0]}?consultation_id={cid}"
+    assert client.post(url, json={"label": "bogus"}).status_code == 400
+    assert client.post(f"/review/{10 ** 9}?consultation_id={cid}", json={"label": "AGREE"}).status_code == 404
+    assert client.post(url, json={"label": "DISAGREE", "reviewer": "qa"}).status_code == 200
+    assert client.get("/review", params={"consultation_id": cid}).json()["pending"] == 0
+    corrections = client.get("/review/corrections", params={"consultation_id": cid}).json()["items"]
+    assert corrections[0]["label"] == "DISAGREE"
+
+def test_deleted_consultation_id_is_not_reused(consultation):
+    """Test that deleting a consultation drops its corrections and a new one gets a fresh id"""
+    db, cid = consultation
+    ids = _predict(db, cid, [("Unclear either way.", "AGREE", 0.4, 0.05)])
+    ReviewService(db, cid).correct(ids[0], "DISAGREE")
+    
+    service = ConsultationService(db)
+    deleted = service.create_consultation("Deleted").id
+    assert ReviewService(db, deleted).correct(_predict(db, deleted, [("Unsure.", "AGREE", 0.4, 0.05)])[0], "AGREE")
+    service.delete_consultation(deleted)
+    assert db.query(Correction).filter(Correction.consultation_id == deleted).count() == 0
+    assert db.query(Correction).filter(Correction.consultation_id == cid).count() == 1
+    
+    fresh = service.create_consultation("Fresh").id
+    assert fresh > deleted
+    service.delete_consultation(fresh)
@@ -0,0 +1,12 @@
+from benchmarks.scaleout import run
+
+def test_nodes_on_shared_state_agree(tmp_path):
+    """Test that two API processes sharing the database and state store behave as one"""
+    report = run(nodes=2, rows=200, duration=2, concurrency=4, checks=6, workdir=tmp_path)
+    assert report["ingest"]["rows"] == 200
+    assert report["analyze"]["ok"], report["analyze"]
+    assert not report["mixed_load"]["errors"]
+    assert report["read_your_writes"]["stale_reads"] == 0
+    assert report["mismatches"] == []
+    assert report["profiles"]["ok"]
+    assert report["events"]["missed"] == 0
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+
+from backend import topics
+from backend.models import Artifact, JobLease
+from backend.stores import DatabaseArtifactStore, DatabaseJobLocks, LocalArtifactStore, LocalJobLocks
+
+@pytest.fixture
+def shared_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'shared.db'}", connect_args={"check_same_thread": False})
+    Artifact.__table__.create(engine)
+    JobLease.__table__.create(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(params=["local", "database"])
+def store(request, tmp_path, shared_engine):
+    if request.param == "local":
+        return LocalArtifactStore(tmp_path / "artifacts")
+    return DatabaseArtifactStore(shared_engine)
+
+def test_artifact_store_round_trip(store):
+    """Test put, get, stamp and delete on both artifact stores"""
+    assert store.get("static/missing.png") is None and store.stamp("static/missing.png") is None
+    store.put("static/a.png", b"first")
+    first = store.stamp("static/a.png")
+    store.put("static/a.png", b"second")
+    assert store.get("static/a.png") == b"second"
+    assert store.stamp("static/a.png") >= first
+    store.delete("static/a.png")
+    store.delete("static/a.png")
+    assert store.get("static/a.png") is None
+
+def test_artifact_store_keys(store):
+    """Test listing keys by prefix on both artifact stores"""
+    assert store.keys("profiles/") == []
+    for key in ("profiles/b.json", "profiles/a.prof", "profiles_old/c.json", "static/d.png"):
+        store.put(key, b"x")
+    assert store.keys("profiles/") == ["profiles/a.prof", "profiles/b.json"]
+    store.delete("profiles/a.prof")
+    assert store.keys("profiles/") == ["profiles/b.json"]
+
+def test_database_artifacts_are_shared(shared_engine):
+    """Test that a second node on the same database reads what the first wrote"""
+    DatabaseArtifactStore(shared_engine).put("models/topic_model_7.pkl", b"model")
+    assert DatabaseArtifactStore(shared_engine).get("models/topic_model_7.pkl") == b"model"
+
+def test_local_job_locks():
+    """Test that a held lock is refused until released, and that blocking waits"""
+    locks = LocalJobLocks()
+    lease = locks.acquire("analysis:1")
+    assert lease is not None and locks.acquire("analysis:1") is None
+    assert locks.acquire("analysis:2") is not None
+    threading.Timer(0.05, lease.release).start()
+    assert locks.acquire("analysis:1", blocking=True) is not None
+
+def test_database_job_locks_expire_and_renew(shared_engine):
+    """Test exclusion across nodes, takeover of an expired lease and renewal"""
+    node_a = DatabaseJobLocks(shared_engine, ttl=60)
+    node_b = DatabaseJobLocks(shared_engine, ttl=60)
+    lease = node_a.acquire("analysis:1")
+    assert lease is not None and node_b.acquire("analysis:1") is None
+    lease.release()
+    with node_b.acquire("analysis:1", blocking=True) as held:
+        assert node_a.acquire("analysis:1") is None
+    assert held.token
+
+    # A node that died holding a lease frees it once it expires
+    short = DatabaseJobLocks(shared_engine, ttl=-1)
+    stale = short.acquire("topics:1")
+    assert node_a.acquire("topics:1") is not None
+    stale.release()  # no longer the owner, so the new holder keeps it
+    assert node_b.acquire("topics:1") is None
+
+def test_topic_model_reloads_when_another_node_saves(tmp_path, monkeypatch):
+    """Test that a node's cached topic model follows saves made elsewhere"""
+    store = LocalArtifactStore(tmp_path)
+    monkeypatch.setattr(topics, "artifact_store", store)
+    texts = [f"clause {i % 3} threshold compliance startup filing {i}" for i in range(40)]
+    model = topics.get_topic_model(9001)
+    model.partial_fit(texts)
+    topics.save_topic_model(9001)
+    assert topics.get_topic_model(9001) is model
+
+    # Another node saves after fitting more comments
+    key = topics.topic_model_key(9001)
+    store.put(key, store.get(key))
+    reloaded = topics.get_topic_model(9001)
+    assert reloaded is not model and reloaded.fitted
+
+    # Another node resets the consultation: the stored model disappears
+    store.delete(key)
+    assert not topics.get_topic_model(9001).fitted
+    topics.reset_topic_model(9001)
@@ -0,0 +1,55 @@
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from benchmarks import run
+from benchmarks.synthetic import FIELDNAMES, csv_chunks, generate_comments, to_csv_bytes
+
+def test_generate_comments_shape():
+    """Test that synthetic rows follow the sample dataset layout"""
+    rows = list(generate_comments(200, seed=1))
+    assert len(rows) == 200
+    assert all(list(row) == FIELDNAMES for row in rows)
+    assert all(row["Comment"] for row in rows)
+    assert rows[0]["comment_id"] == "1001"
+
+def test_generate_comments_threads():
+    """Test that replies target earlier comments of the same clause"""
+    rows = list(generate_comments(500, seed=2))
+    by_id = {row["comment_id"]: row for row in rows}
+    replies = [row for row in rows if row["targets_comment_id"]]
+    assert replies
+    for reply in replies:
+        root = by_id[reply["targets_comment_id"]]
+        assert int(root["comment_id"]) < int(reply["comment_id"])
+        assert root["Clause"] == reply["Clause"]
+
+def test_generate_comments_deterministic():
+    """Test that the same seed yields the same corpus"""
+    assert list(generate_comments(50, seed=3)) == list(generate_comments(50, seed=3))
+
+def test_csv_chunks_split_the_same_rows():
+    """Test that chunked upload bodies hold exactly the rows of one big body"""
+    chunks = list(csv_chunks(25, seed=4, chunk_rows=10))
+    assert len(chunks) == 3
+    header, *rows = to_csv_bytes(25, seed=4).decode("utf-8").splitlines()
+    lines = [line for chunk in chunks for line in chunk.decode("utf-8").splitlines()]
+    assert [line for line in lines if line != header] == rows
+
+def test_bench_ingest_splits_uploads(monkeypatch):
+    """Test that the benchmark stays under the per-request cap by uploading in chunks"""
+    monkeypatch.setattr(run, "UPLOAD_CHUNK_ROWS", 40)
+    client = TestClient(app)
+    client.post("/clear")
+    result = run.bench_ingest(client, 100, seed=5)
+    assert result["rows"] == 100 and result["requests"] == 3
+    client.post("/clear")
+
+def test_bench_read_separates_cached_latency():
+    """Test that uncached reads miss the response cache and cached ones hit it"""
+    from backend.instrumentation import RESPONSE_CACHE
+    client = TestClient(app)
+    misses, hits = RESPONSE_CACHE.value("/metrics", "miss"), RESPONSE_CACHE.value("/metrics", "hit")
+    uncached, cached = run.bench_read(client, "metrics", "/metrics", {}, repeat=4)
+    assert (uncached["name"], cached["name"]) == ("metrics", "metrics_cached")
+    assert RESPONSE_CACHE.value("/metrics", "miss") - misses >= 4
+    assert RESPONSE_CACHE.value("/metrics", "hit") - hits >= 4
@@ -0,0 +1,37 @@
+import unicodedata
+
+from backend.textproc import process_text, split_sentences, topic_terms, keyword_text, intent_terms
+from backend.utils import simple_summarize
+
+HINDI = "यह नियम स्पष्ट नहीं है। कृपया धारा 7 की सीमा स्पष्ट करें।"
+
+def test_devanagari_words_stay_whole():
+    """Test that vowel signs and viramas do not split Hindi words"""
+    features = process_text(HINDI)
+    assert "स्पष्ट" in features.tokens and "नियम" in features.tokens
+    # Stop words of both languages are dropped from terms
+    assert "है" not in features.terms and "की" not in features.terms
+    assert features.script == "devanagari"
+    assert process_text("Clause 7 नियम").script == "mixed"
+
+def test_sentences_split_on_danda():
+    """Test that the danda ends a sentence, with or without a following space"""
+    assert split_sentences(HINDI) == ["यह नियम स्पष्ट नहीं है।", "कृपया धारा 7 की सीमा स्पष्ट करें।"]
+    assert split_sentences("पहला वाक्य।Second one. Third!") == ["पहला वाक्य।", "Second one.", "Third!"]
+    assert simple_summarize(HINDI, max_sentences=1) == "यह नियम स्पष्ट नहीं है।"
+    assert keyword_text(HINDI).count(".") == 2
+
+def test_normalization_is_shared():
+    """Test that decomposed and zero-width variants normalize to one form"""
+    decomposed = unicodedata.normalize("NFD", "क़ानून") + "\u200d  text"
+    assert process_text(decomposed).normalized == "क़ानून text"
+    assert topic_terms("Section 12 needs clarity, section_x") == ("section", "needs", "clarity")
+    # The intent model keeps stop words, which carry negation
+    assert intent_terms("Do not agree") == ["do", "not", "agree", "do not", "not agree"]
+    
+    text = "Cached comment about the disclosure threshold."
+    process_text(text)
+    hits = process_text.cache_info().hits
+    simple_summarize(text)
+    topic_terms(text)
+    assert process_text.cache_info().hits >= hits + 2
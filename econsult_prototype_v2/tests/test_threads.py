@@ -0,0 +1,23 @@
+from backend.threads import compute_thread_layout, contested_score
+
+def test_compute_thread_layout():
+    """Test depth, root and descendant counts of a reply forest"""
+    layout = compute_thread_layout({1: None, 2: 1, 3: 1, 4: 2, 5: None, 6: 99})
+    assert layout[1] == (1, 0, 3)
+    assert layout[2] == (1, 1, 1)
+    assert layout[4] == (1, 2, 0)
+    assert layout[5] == (5, 0, 0)
+    # Parent missing from the index: treated as a root
+    assert layout[6] == (6, 0, 0)
+
+def test_compute_thread_layout_breaks_cycles():
+    """Test that cyclic reply links still yield one tree per node"""
+    layout = compute_thread_layout({1: 2, 2: 1, 3: 2})
+    assert layout[1] == (1, 0, 2)
+    assert layout[2][0] == 1 and layout[3][0] == 1
+
+def test_contested_score():
+    """Test that balanced threads outrank one-sided ones"""
+    assert contested_score(0, 0) == 0.0
+    assert contested_score(5, 5) > contested_score(9, 1)
+    assert contested_score(10, 10) > contested_score(2, 2)
@@ -0,0 +1,17 @@
+from backend.topics import IncrementalTopicModel
+
+def test_incremental_topic_model():
+    """Test that partial fits separate themes and label them with terms"""
+    model = IncrementalTopicModel(n_topics=2, n_features=2 ** 12, batch_size=8)
+    privacy = [f"Data privacy safeguards for shareholder records item {i}" for i in range(10)]
+    timeline = [f"Transition timeline deadline extension for filings item {i}" for i in range(10)]
+    model.partial_fit(privacy[:5] + timeline[:5])
+    # A later batch is absorbed without refitting earlier comments
+    model.partial_fit(privacy[5:] + timeline[5:])
+
+    labels, distances = model.assign(privacy[:3] + timeline[:3])
+    assert len(set(labels[:3])) == 1 and len(set(labels[3:])) == 1
+    assert labels[0] != labels[3]
+    assert (distances >= 0).all()
+    assert "privacy" in model.top_terms(int(labels[0]))
+    assert "timeline" in model.top_terms(int(labels[3]))
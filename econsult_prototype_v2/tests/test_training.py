@@ -0,0 +1,110 @@
+import pytest
+from joblib import load as joblib_load
+
+from backend import utils
+from backend.database import SessionLocal, create_tables
+from backend.models import Correction
+from backend.config import INTENT_MODEL_PATH
+from backend.training import evaluate, is_holdout, main, promote, train
+
+ROWS = [
+    ("I fully support Clause {i}; it is well drafted.", "AGREE"),
+    ("I strongly disagree with Clause {i}; it should be withdrawn.", "DISAGREE"),
+    ("Please clarify what Clause {i} means for small firms.", "REQUEST_CLARIFICATION"),
+    ("Clause {i} should be amended to raise the threshold.", "SUGGEST_CHANGE"),
+    ("The wording of Clause {i} overlaps with Section {i} of the Act.", "CLAUSE_FEEDBACK"),
+]
+
+def _write_csv(path, count, start=0, shift=0):
+    lines = ["comment_id,Comment,Label"]
+    for i in range(start, start + count):
+        text, label = ROWS[i % len(ROWS)][0], ROWS[(i + shift) % len(ROWS)][1]
+        lines.append(f'{i},"{text.format(i=i)}",{label}')
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+def test_train_then_update_incrementally(tmp_path):
+    """Test full training, skipping seen files, and learning only new rows"""
+    out = tmp_path / "intent_model.pkl"
+    first = _write_csv(tmp_path / "first.csv", 200)
+    report = train([first], out, corrections=False)
+    assert report["mode"] == "full"
+    assert report["new_samples"] + report["holdout_samples"] == 200
+    assert report["holdout_accuracy"] > 0.8
+
+    artifact = joblib_load(out)
+    assert sorted(artifact["labels"]) == sorted(label for _, label in ROWS)
+    probs = artifact["pipeline"].predict_proba(["I strongly disagree with Clause 3; it should be withdrawn."])
+    assert artifact["labels"][probs.argmax()] == "DISAGREE"
+
+    again = train([first], out, corrections=False)
+    assert again["new_samples"] == 0 and again["total_samples"] == report["total_samples"]
+
+    second = _write_csv(tmp_path / "second.csv", 50, start=200)
+    update = train([first, second], out, corrections=False)
+    assert update["mode"] == "incremental"
+    assert update["new_samples"] == sum(
+        not is_holdout(ROWS[i % len(ROWS)][0].format(i=i)) for i in range(200, 250)
+    )
+
+def test_train_learns_corrections_once(tmp_path):
+    """Test that stored corrections are trained on once, then skipped"""
+    create_tables()
+    db = SessionLocal()
+    correction = Correction(consultation_id=0, epoch=0, comment_id=-1, text="Training test correction.", label="AGREE")
+    db.add(correction)
+    db.commit()
+    try:
+        out = tmp_path / "intent_model.pkl"
+        assert train([], out)["new_samples"] >= 1
+        assert train([], out)["new_samples"] == 0
+    finally:
+        db.delete(correction)
+        db.commit()
+        db.close()
+
+    assert main(["train", str(tmp_path / "missing.csv"), "--out", str(out)]) == 2
+
+def test_evaluate_reports_accuracy_and_latency(tmp_path):
+    """Test per-label metrics, confusion matrix and latency for a trained model"""
+    out = tmp_path / "intent_model.pkl"
+    source = _write_csv(tmp_path / "labeled.csv", 100)
+    train([source], out, corrections=False)
+    model = utils.INTENT_MODEL
+
+    [report] = evaluate(source, [out], batch_size=16)
+    assert utils.INTENT_MODEL is model
+    assert report["comments"] == 100 and report["batched_agrees"]
+    assert report["labels"]["AGREE"]["support"] == 20
+    assert sum(map(sum, report["confusion_matrix"]["rows"])) == 100
+    assert report["single"]["p50_ms"] <= report["single"]["p99_ms"]
+    assert report["batched"]["batch_size"] == 16 and report["batched"]["comments_per_s"] > 0
+
+    assert main(["evaluate", source, "--model", str(tmp_path / "missing.pkl")]) == 2
+
+def test_promote_only_a_better_candidate(tmp_path):
+    """Test that training writes a candidate and promotion keeps the served model unless beaten or forced"""
+    served = tmp_path / "intent_model.pkl"
+    labeled = _write_csv(tmp_path / "labeled.csv", 200)
+    good, bad = tmp_path / "good.pkl", tmp_path / "bad.pkl"
+    train([labeled], good, corrections=False)
+    # Trained on wrong labels for the same comments
+    train([_write_csv(tmp_path / "mislabeled.csv", 200, shift=1)], bad, corrections=False)
+    
+    first = promote([labeled], good, served)
+    assert first["promoted"] and first["current_accuracy"] is None
+    assert not (tmp_path / "intent_model.pkl.bak").exists()
+    
+    worse = promote([labeled], bad, served)
+    assert not worse["promoted"]
+    assert worse["candidate_accuracy"] < worse["current_accuracy"]
+    assert served.read_bytes() == good.read_bytes()
+    
+    assert promote([labeled], bad, served, force=True)["promoted"]
+    assert served.read_bytes() == bad.read_bytes()
+    assert (tmp_path / "intent_model.pkl.bak").read_bytes() == good.read_bytes()
+    
+    assert promote([labeled], good, served)["promoted"]
+    with pytest.raises(ValueError):
+        promote([labeled], served, served)
+    assert train.__defaults__[0] != INTENT_MODEL_PATH
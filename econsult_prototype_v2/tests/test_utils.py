@@ -1,4 +1,5 @@
 import pytest
+import json
 from backend.utils import redact_pii, simple_summarize, extract_keywords
 
 def test_redact_pii():
@@ -44,3 +45,50 @@ def test_extract_keywords():
     empty_keywords = extract_keywords([])
     assert isinstance(empty_keywords, dict)
     assert "feedback" in empty_keywords  # Default fallback
+
+def test_summarize_texts():
+    """Test extractive summarization across many comments"""
+    from backend.summarizer import summarize_texts
+    texts = [
+        "Clause 4 threshold is too low. Please raise the threshold for small companies.",
+        "The threshold in Clause 4 should be raised for small companies. Festival season matters.",
+        "Raise the Clause 4 threshold for small companies.",
+        "Unrelated remark about formatting.",
+    ]
+    for method in ("tfidf", "textrank"):
+        sentences = summarize_texts(texts, max_sentences=2, method=method, ids=[10, 11, 12, 13])
+        assert 1 <= len(sentences) <= 2
+        assert "threshold" in sentences[0]["text"].lower()
+        assert sentences[0]["source"] in (10, 11, 12)
+    
+    # Short input is returned as-is
+    assert summarize_texts(["One sentence."])[0]["text"] == "One sentence."
+    assert summarize_texts([]) == []
+
+def test_wordcloud_layout_round_trip():
+    """Test that a stored layout renders images and map data without re-placing words"""
+    from backend.utils import compute_wordcloud_layout, render_wordcloud_svg, layout_words
+    
+    layout = compute_wordcloud_layout({"policy": 5.0, "compliance": 3.0, "startup": 1.0})
+    layout = json.loads(json.dumps(layout))
+    
+    words = layout_words(layout)
+    assert {w["text"] for w in words} == {"policy", "compliance", "startup"}
+    assert all(0 <= w["x"] < layout["width"] and 0 <= w["y"] < layout["height"] for w in words)
+    assert "<svg" in render_wordcloud_svg(layout)
+
+def test_classify_intents_matches_single(monkeypatch):
+    """Test that batched classification agrees with one-at-a-time classification"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from backend import utils
+    
+    texts = ["I fully support this", "I strongly oppose this", "Please clarify the threshold", "Support the change"]
+    labels = ["AGREE", "DISAGREE", "REQUEST_CLARIFICATION", "AGREE"]
+    pipe = make_pipeline(TfidfVectorizer(), LogisticRegression()).fit(texts, labels)
+    monkeypatch.setattr(utils, "INTENT_MODEL", {"pipeline": pipe, "labels": list(pipe.classes_)})
+    results = utils.classify_intents(texts)
+    assert [r[:2] for r in results] == [utils.classify_intent(t) for t in texts]
+    assert all(0.0 <= margin <= score for _label, score, margin in results)
+    assert utils.classify_intents([]) == []
@@ -0,0 +1,44 @@
+import os
+import time
+
+from backend.workers import AnalysisPool, FALLBACK_RESULT, analyze_chunk
+
+def _fragile_chunk(items):
+    """Stand-in for analyze_chunk with comments that crash, stall or raise"""
+    rows = []
+    for comment_id, text in items:
+        if text == "crash":
+            os._exit(1)
+        if text == "stall":
+            time.sleep(60)
+        if text == "error":
+            raise ValueError(text)
+        rows.append({"comment_id": comment_id, "sentiment": "OK"})
+    return rows, {}
+
+def test_analyze_chunk_inline():
+    """Test that inline analysis returns one prediction row per comment"""
+    pool = AnalysisPool(workers=0, chunk_size=2)
+    results = list(pool.run([(1, "I support this clause."), (2, "Please clarify section 3."), (3, "Remove it.")]))
+    rows = [row for chunk_rows, _timings in results for row in chunk_rows]
+    assert [row["comment_id"] for row in rows] == [1, 2, 3]
+    assert set(results[0][1]) == {"classification", "summarization", "keywords"}
+    assert analyze_chunk([(7, "")])[0][0]["comment_id"] == 7
+
+def test_bad_comments_are_isolated():
+    """Test that crashing, stalling and failing comments only lose themselves"""
+    texts = ["ok"] * 12
+    texts[2], texts[6], texts[9] = "crash", "stall", "error"
+    pool = AnalysisPool(workers=2, chunk_size=3, timeout=2, retries=1, fn=_fragile_chunk)
+    try:
+        results = {}
+        for rows, _timings in pool.run(list(enumerate(texts))):
+            for row in rows:
+                results[row["comment_id"]] = row["sentiment"]
+    finally:
+        pool.shutdown()
+    
+    assert len(results) == len(texts)
+    failed = {i for i, label in results.items() if label != "OK"}
+    assert failed == {2, 6, 9}
+    assert results[2] == FALLBACK_RESULT["sentiment"]